@@ -1,8 +1,21 @@
-from .controllers import LikeController, MediaController, TweetController, UserController
+from .controllers import (
+    IdempotencyController,
+    LikeController,
+    MediaController,
+    PartitionController,
+    SnowflakeController,
+    SuggestionController,
+    TweetController,
+    UserController,
+)
 
 __all__ = [
     "TweetController",
     "LikeController",
     "UserController",
+    "SuggestionController",
     "MediaController",
+    "IdempotencyController",
+    "PartitionController",
+    "SnowflakeController",
 ]
@@ -1,9 +1,16 @@
+import asyncio
 import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from heapq import nsmallest
 from logging import getLogger
 from pathlib import Path
 from queue import Queue
 from threading import Event
-from typing import Dict, List, Sequence
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Sequence, Set, Tuple
 from uuid import uuid4
 
 from fastapi import UploadFile, status
@@ -11,32 +18,293 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.datastructures import FormData
 
 from exceptions import APIException, AuthenticationError, NotFoundError, ValidationError
-from models.managers import LikeManager, MediaManager, TweetManager, UserManager
+from models.managers import (
+    AccountDeletionManager,
+    ArchivedTweetManager,
+    IdempotencyKeyManager,
+    LikeManager,
+    MediaManager,
+    PartitionManager,
+    SnowflakeWorkerManager,
+    TweetManager,
+    UserManager,
+    UserSuggestionManager,
+    db_session_manager,
+)
 from models.models import CrateTweetModel
-from models.schemas import Like, Media, Tweet, TweetMedia, User
+from models.schemas import AccountDeletion, ArchivedTweet, Like, Media, Tweet, User
 from settings import settings
+from utils.batching import Batcher
+from utils.bloom import BloomFilter
+from utils.cache import LRUCache, TaggedLRUCache
+from utils.counters import CounterShards
+from utils.entities import normalize_tag
+from utils.follow_graph import FollowGraphIndex, follow_graph
+from utils.partitions import PARTITIONED_TABLES, Partition, partition_scheme
+from utils.snowflake import snowflake
+from utils.tasks import PeriodicTask
 from utils.threads import ReadThread, WriteThread
 
 logger = getLogger(__name__)
 
 
 class LikeController:
+    """
+    Likes are written in one statement each, or, with `LIKES_WRITE_BEHIND`, kept
+    in a bounded in-memory buffer and flushed in batches by a background task.
+
+    Buffered calls are validated only against pending likes: liking a missing
+    tweet or a tweet liked before the last flush is acknowledged and dropped
+    on flush.
+
+    Like counts are kept in sharded counter rows; tweets whose like writes get
+    slow are spread over more shards.
+
+    With `LIKED_FILTER`, tweets liked by a user are also kept in a per-user Bloom
+    filter, so `liked_by` only queries tweets the user may have liked. Likes made
+    by other processes become visible once the filter expires.
+    """
+
+    _shards: CounterShards = CounterShards(
+        settings.LIKES_COUNTER_MAX_SHARDS,
+        settings.LIKES_COUNTER_CONTENTION_LATENCY / 1000,
+    )
+    _counts_cache: LRUCache = LRUCache(
+        settings.LIKES_COUNT_CACHE_SIZE,
+        settings.LIKES_COUNT_CACHE_TTL,
+    )
+    _liked_filters: LRUCache = LRUCache(
+        settings.LIKED_FILTER_CACHE_SIZE,
+        settings.LIKED_FILTER_TTL,
+    )
+
+    __pending: Dict[Tuple[int, int], bool] = {}  # (user_id, tweet_id): liked
+    __task: PeriodicTask | None = None
+    __stats: Dict[str, int | float | None] = {
+        "flushes": 0,
+        "flushed": 0,
+        "skipped": 0,
+        "last_latency": None,
+        "max_latency": 0.0,
+    }
+
     def __init__(self) -> None:
         self.like_manager: LikeManager = LikeManager()
-        self.tweet_manager: TweetManager = TweetManager()
 
-    async def __check_tweet_exists(
+    @classmethod
+    def start_task(cls) -> None:
+        cls.__task = PeriodicTask(
+            "LikesFlushTask",
+            cls.flush,
+            settings.LIKES_FLUSH_INTERVAL / 1000,
+        )
+        cls.__task.start()
+
+    @classmethod
+    async def stop_task(cls) -> None:
+        if cls.__task is not None:
+            await cls.__task.stop()
+            cls.__task = None
+
+        try:
+            await cls.flush()
+        except Exception:  # noqa
+            logger.exception(
+                "Final likes flush failed, %s likes lost",
+                len(cls.__pending),
+            )
+
+    @classmethod
+    def stats(cls) -> Dict[str, int | float | None]:
+        return {"pending": len(cls.__pending), **cls.__stats}
+
+    @classmethod
+    def __buffer(cls, user_id: int, tweet_id: int, liked: bool) -> bool:
+        if cls.__task is None:
+            return False
+
+        key = (user_id, tweet_id)
+        pending = cls.__pending.get(key)
+
+        if pending is liked:
+            raise APIException("Tweet already liked" if liked else "This tweet not liked")
+
+        if pending is None and len(cls.__pending) >= settings.LIKES_BUFFER_SIZE:
+            return False
+
+        cls.__pending[key] = liked
+
+        if len(cls.__pending) >= settings.LIKES_FLUSH_SIZE:
+            cls.__task.wake()
+
+        return True
+
+    @classmethod
+    async def flush(cls) -> int:
+        if not cls.__pending:
+            return 0
+
+        batch, cls.__pending = list(cls.__pending.items()), {}
+        chunk_size = settings.LIKES_FLUSH_SIZE
+        flushed = 0
+
+        for start in range(0, len(batch), chunk_size):
+            end = start + chunk_size
+            chunk = batch[start:end]
+            likes = [key for key, liked in chunk if liked]
+            unlikes = [key for key, liked in chunk if not liked]
+            shards = {
+                tweet_id: cls._shards.shard(tweet_id) for _, tweet_id in likes + unlikes
+            }
+
+            started_at = perf_counter()
+
+            try:
+                async with db_session_manager.session() as async_session:
+                    applied = await LikeManager().apply_batch(
+                        async_session,
+                        likes,
+                        unlikes,
+                        shards,
+                    )
+            except Exception:
+                # Newer pending changes of the same like win, the rest that does
+                # not fit into the buffer is dropped
+                dropped = 0
+
+                for key, liked in batch[start:]:
+                    if key in cls.__pending:
+                        continue
+
+                    if len(cls.__pending) >= settings.LIKES_BUFFER_SIZE:
+                        dropped += 1
+                    else:
+                        cls.__pending[key] = liked
+
+                if dropped:
+                    logger.warning("Likes buffer is full, %s likes dropped", dropped)
+
+                raise
+
+            latency = perf_counter() - started_at
+            skipped = len(chunk) - applied
+            flushed += len(chunk)
+
+            for tweet_id in shards:
+                cls._counts_cache.pop(tweet_id)
+
+            cls.__stats["flushes"] += 1
+            cls.__stats["flushed"] += len(chunk)
+            cls.__stats["skipped"] += skipped
+            cls.__stats["last_latency"] = latency
+            cls.__stats["max_latency"] = max(cls.__stats["max_latency"], latency)
+
+            logger.debug("Likes flushed: %s items, %.4f s", len(chunk), latency)
+
+            if skipped:
+                # Acknowledged likes of removed tweets or users, repeated likes
+                # and unlikes of missing likes
+                logger.warning("Likes flush skipped %s of %s items", skipped, len(chunk))
+
+            if latency * 1000 > settings.LIKES_FLUSH_INTERVAL:
+                logger.warning(
+                    "Likes flush took %.4f s, longer than flush interval",
+                    latency,
+                )
+
+        return flushed
+
+    async def likes_count(
+        self,
+        async_session: AsyncSession,
+        tweet_ids: Iterable[int],
+    ) -> Dict[int, int]:
+        """Batched tweet id -> likes count lookup through the in-process LRU cache."""
+        counts, missing_ids = {}, []
+
+        for tweet_id in tweet_ids:
+            count = self._counts_cache.get(tweet_id)
+
+            if count is None:
+                missing_ids.append(tweet_id)
+            else:
+                counts[tweet_id] = count
+
+        if missing_ids:
+            loaded = await self.like_manager.get_likes_count(async_session, missing_ids)
+
+            for tweet_id in missing_ids:
+                count = loaded.get(tweet_id, 0)
+                self._counts_cache.set(tweet_id, count)
+                counts[tweet_id] = count
+
+        return counts
+
+    async def __liked_filter(
         self,
         async_session: AsyncSession,
+        user_id: int,
+    ) -> BloomFilter:
+        bloom = self._liked_filters.get(user_id)
+
+        if bloom is None:
+            bloom = BloomFilter.from_items(
+                await self.like_manager.get_liked_tweet_ids(async_session, user_id),
+                settings.LIKED_FILTER_ERROR_RATE,
+            )
+            self._liked_filters.set(user_id, bloom)
+
+        return bloom
+
+    async def liked_by(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        tweet_ids: Iterable[int],
+    ) -> Set[int]:
+        """Ids of `tweet_ids` liked by user, including pending buffered likes."""
+        tweet_ids = list(tweet_ids)
+        candidates = tweet_ids
+
+        if settings.LIKED_FILTER:
+            bloom = await self.__liked_filter(async_session, user_id)
+            candidates = [tweet_id for tweet_id in tweet_ids if tweet_id in bloom]
+
+        liked = set()
+
+        if candidates:
+            liked = await self.like_manager.get_liked(async_session, user_id, candidates)
+
+        for tweet_id in tweet_ids:
+            pending = LikeController.__pending.get((user_id, tweet_id))
+
+            if pending is True:
+                liked.add(tweet_id)
+            elif pending is False:
+                liked.discard(tweet_id)
+
+        return liked
+
+    async def __write(
+        self,
+        write: Callable,
         tweet_id: int,
-    ) -> None:
-        tweet_exists = await self.tweet_manager.exists(
+        user_id: int,
+        async_session: AsyncSession,
+    ) -> Tuple[bool, int | None]:
+        started_at = perf_counter()
+
+        result = await write(
             async_session,
-            [Tweet.id == tweet_id],
+            user_id,
+            tweet_id,
+            self._shards.shard(tweet_id),
         )
 
-        if not tweet_exists:
-            raise NotFoundError(f"Tweet with id `{tweet_id}` not found")
+        self._shards.report(tweet_id, perf_counter() - started_at)
+        self._counts_cache.pop(tweet_id)
+
+        return result
 
     async def add_like(
         self,
@@ -44,19 +312,31 @@ class LikeController:
         user_id: int,
         async_session: AsyncSession,
     ) -> Like:
-        await self.__check_tweet_exists(async_session, tweet_id)
-        like = await self.like_manager.exists(
+        bloom = self._liked_filters.get(user_id)
+
+        if self.__buffer(user_id, tweet_id, True):
+            if bloom is not None:
+                bloom.add(tweet_id)
+
+            return Like(user_id=user_id, tweet_id=tweet_id)
+
+        tweet_exists, like_id = await self.__write(
+            self.like_manager.like,
+            tweet_id,
+            user_id,
             async_session,
-            [Like.tweet_id == tweet_id, Like.user_id == user_id],
         )
 
-        if like:
+        if not tweet_exists:
+            raise NotFoundError(f"Tweet with id `{tweet_id}` not found")
+
+        if like_id is None:
             raise APIException("Tweet already liked")
 
-        return await self.like_manager.add(
-            async_session,
-            Like(user_id=user_id, tweet_id=tweet_id),
-        )
+        if bloom is not None:
+            bloom.add(tweet_id)
+
+        return Like(id=like_id, user_id=user_id, tweet_id=tweet_id)
 
     async def delete_like(
         self,
@@ -64,38 +344,494 @@ class LikeController:
         user_id: int,
         async_session: AsyncSession,
     ) -> bool:
-        await self.__check_tweet_exists(async_session, tweet_id)
+        if self.__buffer(user_id, tweet_id, False):
+            return True
 
-        like = await self.like_manager.delete(
+        tweet_exists, like_id = await self.__write(
+            self.like_manager.unlike,
+            tweet_id,
+            user_id,
             async_session,
-            [Like.tweet_id == tweet_id, Like.user_id == user_id],
         )
 
-        if not like:
+        if not tweet_exists:
+            raise NotFoundError(f"Tweet with id `{tweet_id}` not found")
+
+        if like_id is None:
             raise APIException("This tweet not liked")
 
         return True
 
 
 class TweetController:
+    """
+    Deleted tweets are hidden at once by `deleted_at` and removed later by the
+    purge task: likes and attachments (with media files) go first, in committed
+    batches of `TWEETS_PURGE_ROWS` rows with a pause between them, then the
+    tweet rows themselves. With `TWEETS_RETENTION`, the task also deletes
+    tweets older than that number of days.
+
+    With `TWEETS_GROUP_COMMIT`, tweets without media created within
+    `TWEETS_GROUP_COMMIT_WINDOW` are saved together with one INSERT and one
+    commit, so a burst of tweets does not cost a commit (WAL flush) each.
+
+    With `TWEETS_ARCHIVE`, tweets older than `TWEETS_ARCHIVE_AFTER` days are
+    moved to `archived_tweets` with frozen likes, which keeps `tweets`, `likes`
+    and `tweet_media` small. The feed reads the archive only when recent tweets
+    do not fill the page; archived tweets can be deleted but not liked.
+
+    Hashtags and mentions are written to `tweet_tags` and `tweet_mentions` in
+    the transaction that saves the tweet. Rows go with the tweet when it is
+    purged or archived, so archived tweets are not found by tag.
+    """
+
+    __purge_task: PeriodicTask | None = None
+    __archive_task: PeriodicTask | None = None
+    __group_commit: Batcher[Tuple[int, str], int] | None = None
+
     def __init__(self) -> None:
         self.tweet_manager: TweetManager = TweetManager()
+        self.archived_tweet_manager: ArchivedTweetManager = ArchivedTweetManager()
         self.media_manager: MediaManager = MediaManager()
 
+    @classmethod
+    def start_purge_task(cls) -> None:
+        cls.__purge_task = PeriodicTask(
+            "TweetsPurgeTask",
+            cls.__purge,
+            settings.TWEETS_PURGE_INTERVAL,
+        )
+        cls.__purge_task.start()
+
+    @classmethod
+    async def stop_purge_task(cls) -> None:
+        if cls.__purge_task is not None:
+            await cls.__purge_task.stop()
+            cls.__purge_task = None
+
+    @classmethod
+    async def __purge(cls) -> None:
+        await cls().purge()
+
+    @classmethod
+    def start_archive_task(cls) -> None:
+        cls.__archive_task = PeriodicTask(
+            "TweetsArchiveTask",
+            cls.__archive,
+            settings.TWEETS_ARCHIVE_INTERVAL,
+        )
+        cls.__archive_task.start()
+
+    @classmethod
+    async def stop_archive_task(cls) -> None:
+        if cls.__archive_task is not None:
+            await cls.__archive_task.stop()
+            cls.__archive_task = None
+
+    @classmethod
+    async def __archive(cls) -> None:
+        await cls().archive()
+
+    @classmethod
+    def start_group_commit(cls) -> None:
+        cls.__group_commit = Batcher(
+            "TweetsGroupCommit",
+            cls.__add_batch,
+            settings.TWEETS_GROUP_COMMIT_WINDOW / 1000,
+            settings.TWEETS_GROUP_COMMIT_SIZE,
+        )
+
+    @classmethod
+    async def stop_group_commit(cls) -> None:
+        if cls.__group_commit is not None:
+            group_commit, cls.__group_commit = cls.__group_commit, None
+            await group_commit.stop()
+
+    @classmethod
+    def group_commit_stats(cls) -> Dict[str, int | float | None]:
+        if cls.__group_commit is None:
+            return {}
+
+        return cls.__group_commit.stats()
+
+    @classmethod
+    async def __add_batch(cls, rows: List[Tuple[int, str]]) -> List[int]:
+        async with db_session_manager.session() as async_session:
+            return await TweetManager().add_batch(async_session, rows)
+
+    async def purge_tweets(
+        self,
+        async_session: AsyncSession,
+        tweet_ids: Sequence[int],
+        max_batches: int,
+    ) -> Tuple[int, int]:
+        """
+        Remove soft deleted `tweet_ids` with their likes and media in at most
+        `max_batches` batches (empty ones are not counted). Tweets left
+        unfinished are kept for the next call. Returns numbers of removed tweet
+        rows and of used batches.
+        """
+        rows = settings.TWEETS_PURGE_ROWS
+        pause = settings.TWEETS_PURGE_PAUSE / 1000
+        batches = 0
+
+        while batches < max_batches:
+            deleted = await self.tweet_manager.purge_likes(
+                async_session,
+                tweet_ids,
+                rows,
+            )
+
+            if not deleted:
+                break
+
+            batches += 1
+
+            if deleted < rows:
+                break
+
+            await asyncio.sleep(pause)
+
+        while batches < max_batches:
+            detached, files = await self.tweet_manager.purge_media(
+                async_session,
+                tweet_ids,
+                rows,
+            )
+
+            if not detached:
+                break
+
+            batches += 1
+
+            # Media still attached to other tweets are kept with their files
+            await asyncio.to_thread(MediaController.remove_files, files)
+
+            if detached < rows:
+                break
+
+            await asyncio.sleep(pause)
+
+        purged = await self.tweet_manager.delete_purged(async_session, tweet_ids)
+        return purged, batches
+
+    async def purge(self, max_batches: int | None = None) -> int:
+        """
+        Run purge batches (at most `TWEETS_PURGE_MAX_BATCHES`) for the oldest
+        deleted tweets. Returns number of removed tweet rows.
+        """
+        if max_batches is None:
+            max_batches = settings.TWEETS_PURGE_MAX_BATCHES
+
+        async with db_session_manager.session() as async_session:
+            if settings.TWEETS_RETENTION:
+                expired = await self.tweet_manager.expire_tweets(
+                    async_session,
+                    timedelta(days=settings.TWEETS_RETENTION),
+                    settings.TWEETS_PURGE_BATCH_SIZE,
+                )
+                logger.debug("Tweets expired: %s", expired)
+
+            tweet_ids = await self.tweet_manager.get_deleted_ids(
+                async_session,
+                settings.TWEETS_PURGE_BATCH_SIZE,
+            )
+
+            if not tweet_ids:
+                return 0
+
+            purged, batches = await self.purge_tweets(
+                async_session,
+                tweet_ids,
+                max_batches,
+            )
+
+        logger.debug("Tweets purged: %s, batches: %s", purged, batches)
+        return purged
+
+    async def archive(self, max_batches: int | None = None) -> int:
+        """
+        Move tweets older than `TWEETS_ARCHIVE_AFTER` days to the archive in
+        batches (at most `TWEETS_ARCHIVE_MAX_BATCHES`). With `TWEETS_RETENTION`,
+        expired archived tweets are deleted too. Returns number of moved tweets.
+        """
+        if max_batches is None:
+            max_batches = settings.TWEETS_ARCHIVE_MAX_BATCHES
+
+        batch_size = settings.TWEETS_ARCHIVE_BATCH_SIZE
+        archived = 0
+
+        async with db_session_manager.session() as async_session:
+            for batch in range(max_batches):
+                if batch:
+                    await asyncio.sleep(settings.TWEETS_ARCHIVE_PAUSE / 1000)
+
+                moved = await self.archived_tweet_manager.archive(
+                    async_session,
+                    timedelta(days=settings.TWEETS_ARCHIVE_AFTER),
+                    batch_size,
+                )
+                archived += moved
+
+                if moved < batch_size:
+                    break
+
+            if settings.TWEETS_RETENTION:
+                expired_at = datetime.now(timezone.utc) - timedelta(
+                    days=settings.TWEETS_RETENTION,
+                )
+                expired, files = await self.archived_tweet_manager.delete_tweets(
+                    async_session,
+                    [ArchivedTweet.created_at < expired_at],
+                    batch_size,
+                )
+                logger.debug("Archived tweets expired: %s", expired)
+
+                if files:
+                    await asyncio.to_thread(MediaController.remove_files, files)
+
+        logger.debug("Tweets archived: %s", archived)
+        return archived
+
     async def get_tweets(
         self,
         async_session: AsyncSession,
         as_dict: bool = False,
+        user_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
     ) -> Sequence[Tweet] | List[Dict]:
-        tweets = await self.tweet_manager.get_tweets(async_session)
+        """Tweets created in [`since`, `until`), naive datetimes are taken as UTC."""
+        since, until = (
+            value.replace(tzinfo=timezone.utc)
+            if value is not None and value.tzinfo is None
+            else value
+            for value in (since, until)
+        )
 
-        if as_dict:
-            tweets = self._for_result_model(tweets)
+        if since is not None and until is not None and since >= until:
+            raise ValidationError("`since` must be earlier than `until`")
 
-        return tweets
+        min_id, legacy_upper = None, 0
+
+        if since is not None:
+            # Ids follow creation time up to clock skew, so older partitions are skipped
+            slack = timedelta(seconds=settings.TWEETS_PARTITION_PRUNE_SLACK)
+            min_id = snowflake.min_id(int((since - slack).timestamp() * 1000))
+            legacy_upper = await PartitionController.legacy_upper(async_session)
+
+        tweets = await self.tweet_manager.get_tweets(
+            async_session,
+            since=since,
+            until=until,
+            min_id=min_id,
+            legacy_upper=legacy_upper,
+        )
+        archived = []
+
+        # Archive is read only if recent tweets do not fill the page
+        if len(tweets) < self.tweet_manager.default_limit:
+            archived = await self.archived_tweet_manager.get_tweets(
+                async_session,
+                self.tweet_manager.default_limit - len(tweets),
+                since=since,
+                until=until,
+            )
+
+        if not as_dict:
+            return [*tweets, *archived]
+
+        return [
+            *await self.__with_likes(async_session, tweets, user_id),
+            *await self._archived_for_result_model(async_session, archived, user_id),
+        ]
+
+    async def search_tweets(
+        self,
+        async_session: AsyncSession,
+        query: str,
+        user_id: int | None = None,
+        cursor: str | None = None,
+    ) -> Tuple[List[Dict], str | None]:
+        """
+        Page of tweets matching `query` (web search syntax), best ranked first,
+        and cursor of the next page (None on the last one).
+        """
+        after = None if cursor is None else self.decode_search_cursor(cursor)
+        page_size = settings.TWEETS_SEARCH_PAGE_SIZE
+
+        found = await self.tweet_manager.search(async_session, query, page_size, after)
+        next_cursor = None
+
+        if len(found) == page_size:
+            last_tweet, last_rank = found[-1]
+            next_cursor = self.encode_search_cursor(last_rank, last_tweet.id)
+
+        tweets = await self.__with_likes(
+            async_session,
+            [tweet for tweet, _ in found],
+            user_id,
+        )
+        return tweets, next_cursor
+
+    async def get_tagged_tweets(
+        self,
+        async_session: AsyncSession,
+        tag: str,
+        user_id: int | None = None,
+        cursor: str | None = None,
+    ) -> Tuple[List[Dict], str | None]:
+        """
+        Page of tweets with hashtag `tag` (`#` is optional, case is ignored),
+        newest first, and cursor of the next page (None on the last one).
+        """
+        normalized = normalize_tag(tag)
+
+        if normalized is None:
+            raise ValidationError("Invalid tag")
+
+        page_size = settings.TWEETS_ENTITIES_PAGE_SIZE
+        tweets = await self.tweet_manager.get_tagged(
+            async_session,
+            normalized,
+            page_size,
+            self.decode_id_cursor(cursor),
+        )
+        return await self.__page(async_session, tweets, page_size, user_id)
+
+    async def get_mentions(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        cursor: str | None = None,
+    ) -> Tuple[List[Dict], str | None]:
+        """Page of tweets mentioning `user_id`, newest first, and next cursor."""
+        page_size = settings.TWEETS_ENTITIES_PAGE_SIZE
+        tweets = await self.tweet_manager.get_mentioning(
+            async_session,
+            user_id,
+            page_size,
+            self.decode_id_cursor(cursor),
+        )
+        return await self.__page(async_session, tweets, page_size, user_id)
+
+    async def __page(
+        self,
+        async_session: AsyncSession,
+        tweets: Sequence[Tweet],
+        page_size: int,
+        user_id: int | None,
+    ) -> Tuple[List[Dict], str | None]:
+        next_cursor = None
+
+        if len(tweets) == page_size:
+            next_cursor = str(tweets[-1].id)
+
+        return await self.__with_likes(async_session, tweets, user_id), next_cursor
+
+    @staticmethod
+    def decode_id_cursor(cursor: str | None) -> int | None:
+        """Pages ordered by tweet id continue below the last id of the previous one."""
+        if cursor is None:
+            return None
+
+        try:
+            return int(cursor)
+        except ValueError as exc:
+            raise ValidationError("Invalid cursor") from exc
+
+    @staticmethod
+    def encode_search_cursor(rank: float, tweet_id: int) -> str:
+        # repr keeps the exact float, ranks are compared as stored
+        return urlsafe_b64encode(f"{rank!r}:{tweet_id}".encode()).decode()
+
+    @staticmethod
+    def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+        try:
+            rank, tweet_id = urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return float(rank), int(tweet_id)
+        except ValueError as exc:
+            raise ValidationError("Invalid cursor") from exc
+
+    async def __with_likes(
+        self,
+        async_session: AsyncSession,
+        tweets: Sequence[Tweet],
+        user_id: int | None = None,
+    ) -> List[Dict]:
+        like_controller = LikeController()
+        tweet_ids = [tweet.id for tweet in tweets]
+
+        likes_count = await like_controller.likes_count(async_session, tweet_ids)
+        liked = set()
+
+        if user_id is not None:
+            liked = await like_controller.liked_by(async_session, user_id, tweet_ids)
+
+        return self._for_result_model(tweets, likes_count, liked)
+
+    async def _archived_for_result_model(
+        self,
+        async_session: AsyncSession,
+        tweets_db: Sequence[ArchivedTweet],
+        user_id: int | None = None,
+    ) -> List[Dict]:
+        if not tweets_db:
+            return []
+
+        names = await UserController().resolve_names(
+            async_session,
+            {liker_id for tweet in tweets_db for liker_id in tweet.liker_ids},
+        )
+        media_ids = [media_id for tweet in tweets_db for media_id in tweet.media_ids]
+        files = {}
+
+        if media_ids:
+            media = await self.media_manager.get_media(
+                async_session,
+                media_ids,
+                limit=len(media_ids),
+            )
+            files = {media_item.id: media_item.file for media_item in media}
+
+        return [
+            {
+                "id": tweet.id,
+                "content": tweet.content,
+                "attachments": [
+                    files[media_id] for media_id in tweet.media_ids if media_id in files
+                ],
+                "author": {
+                    "id": tweet.author.id,
+                    "name": tweet.author.name,
+                },
+                # Deleted likers have no name and are skipped
+                "likes": [
+                    {
+                        "user_id": liker_id,
+                        "name": names[liker_id],
+                    }
+                    for liker_id in tweet.liker_ids
+                    if liker_id in names
+                ],
+                "likes_count": tweet.likes_count,
+                "liked_by_me": user_id in tweet.liker_ids,
+            }
+            for tweet in tweets_db
+        ]
 
     @staticmethod
-    def _for_result_model(tweets_db: Sequence[Tweet]) -> List[Dict]:
+    def _for_result_model(
+        tweets_db: Sequence[Tweet],
+        likes_count: Dict[int, int] | None = None,
+        liked: Set[int] | None = None,
+    ) -> List[Dict]:
+        if likes_count is None:
+            likes_count = {}
+
+        if liked is None:
+            liked = set()
+
         tweets = []
 
         for tweet in tweets_db:
@@ -116,6 +852,8 @@ class TweetController:
                     }
                     for like in tweet.likers
                 ],
+                "likes_count": likes_count.get(tweet.id, len(tweet.likers)),
+                "liked_by_me": tweet.id in liked,
             }
 
             tweets.append(twt)
@@ -127,27 +865,50 @@ class TweetController:
         tweet: CrateTweetModel,
         user: User,
         async_session: AsyncSession,
-    ) -> Tweet:
-        attachments = []
+    ) -> int:
+        """
+        Tweet is saved only if all media can be attached: they exist, belong to
+        the user and are not attached to another tweet.
+        """
+        if self.__group_commit is not None and not tweet.tweet_media_ids:
+            return await self.__group_commit.submit((user.id, tweet.tweet_data))
+
+        tweet_id, rejected_ids = await self.tweet_manager.add_with_media(
+            async_session,
+            user.id,
+            tweet.tweet_data,
+            tweet.tweet_media_ids,
+        )
 
-        if tweet.tweet_media_ids:
-            media = await self.media_manager.get_media(
-                async_session,
-                tweet.tweet_media_ids,
-            )
+        if rejected_ids:
+            raise NotFoundError(f"Media with ID {rejected_ids} not found")
+
+        return tweet_id
+
+    async def create_tweets(
+        self,
+        tweets: List[CrateTweetModel],
+        user: User,
+        async_session: AsyncSession,
+    ) -> List[int]:
+        """All or nothing, media are checked as in `create_tweet`."""
+        max_size = settings.MAX_TWEETS_BATCH_SIZE
 
-            for media_item in media:
-                attachments.append(TweetMedia(media_item=media_item))
+        if not tweets:
+            raise ValidationError("Empty tweets batch")
 
-            async_session.add_all(attachments)
+        if len(tweets) > max_size:
+            raise ValidationError(f"Too many tweets, max `{max_size}`")
 
-        twt = Tweet(
-            author=user,
-            content=tweet.tweet_data,
-            attachments=attachments,
+        tweet_ids, rejected_ids = await self.tweet_manager.add_many(
+            async_session,
+            [(user.id, tweet.tweet_data, tweet.tweet_media_ids) for tweet in tweets],
         )
 
-        return await self.tweet_manager.add(async_session, twt)
+        if rejected_ids:
+            raise NotFoundError(f"Media with ID {rejected_ids} not found")
+
+        return tweet_ids
 
     async def delete_tweet(
         self,
@@ -155,32 +916,125 @@ class TweetController:
         user: User,
         async_session: AsyncSession,
     ) -> bool:
-        tweet = await self.tweet_manager.get_tweet_with_author_id(async_session, tweet_id)
+        if await self.tweet_manager.delete_own_tweet(async_session, tweet_id, user.id):
+            return True
 
-        if tweet.author.id != user.id:
+        if await self.tweet_manager.exists(
+            async_session,
+            [Tweet.id == tweet_id, Tweet.deleted_at.is_(None)],
+        ):
             raise AuthenticationError("Wrong owner", status.HTTP_403_FORBIDDEN)
 
-        res = await self.tweet_manager.delete(async_session, [Tweet.id == tweet_id])
+        deleted, files = await self.archived_tweet_manager.delete_tweets(
+            async_session,
+            [ArchivedTweet.id == tweet_id, ArchivedTweet.author_id == user.id],
+            1,
+        )
 
-        if not res:
-            raise NotFoundError(f"Tweet with id `{tweet_id}` not found")
+        if deleted:
+            await asyncio.to_thread(MediaController.remove_files, files)
+            return True
 
-        return res
+        if await self.archived_tweet_manager.exists(
+            async_session,
+            [ArchivedTweet.id == tweet_id],
+        ):
+            raise AuthenticationError("Wrong owner", status.HTTP_403_FORBIDDEN)
+
+        raise NotFoundError(f"Tweet with id `{tweet_id}` not found")
 
 
 class UserController:
+    """
+    Deleted accounts are tombstoned at once (`users.deleted_at` is set, token is
+    dropped) and removed by the deletion task stage by stage: tweets (with their
+    likes and media), archived tweets (with their media), unattached uploads,
+    likes of the user, follow edges, the user row. Batches are committed one by
+    one and idempotent, the stage is saved in `account_deletions` after each of
+    them, so an interrupted deletion resumes from its stage.
+    """
+
+    MUTUALS: str = "mutuals"
+    FOLLOWERS_YOU_KNOW: str = "followers_you_know"
+
+    DELETION_STAGES: Tuple[str, ...] = (
+        "tweets",
+        "archived",
+        "media",
+        "likes",
+        "follows",
+        "user",
+    )
+    DELETED: str = "done"
+
+    __deletion_task: PeriodicTask | None = None
+
+    _relations_cache: TaggedLRUCache = TaggedLRUCache(
+        settings.RELATIONS_CACHE_SIZE,
+        settings.RELATIONS_CACHE_TTL,
+    )
+    _names_cache: LRUCache = LRUCache(
+        settings.NAMES_CACHE_SIZE,
+        settings.NAMES_CACHE_TTL,
+    )
+    _search_cache: LRUCache = LRUCache(
+        settings.USERS_SEARCH_CACHE_SIZE,
+        settings.USERS_SEARCH_CACHE_TTL,
+    )
+
     def __init__(self) -> None:
         self.user_manager: UserManager = UserManager()
+        self.tweet_manager: TweetManager = TweetManager()
+        self.archived_tweet_manager: ArchivedTweetManager = ArchivedTweetManager()
+        self.like_manager: LikeManager = LikeManager()
+        self.media_manager: MediaManager = MediaManager()
+        self.deletion_manager: AccountDeletionManager = AccountDeletionManager()
+
+    @classmethod
+    def start_deletion_task(cls) -> None:
+        cls.__deletion_task = PeriodicTask(
+            "AccountDeletionTask",
+            cls.__deletion,
+            settings.ACCOUNT_DELETION_INTERVAL,
+        )
+        cls.__deletion_task.start()
+
+    @classmethod
+    async def stop_deletion_task(cls) -> None:
+        if cls.__deletion_task is not None:
+            await cls.__deletion_task.stop()
+            cls.__deletion_task = None
+
+    @classmethod
+    async def __deletion(cls) -> None:
+        await cls().purge_accounts()
+
+    @classmethod
+    async def load_follow_graph(cls) -> None:
+        user_manager = UserManager()
+
+        async with db_session_manager.session() as async_session:
+            edges = await user_manager.get_follow_edges(async_session)
+
+        follow_graph.load(edges)
 
     @staticmethod
-    def user_to_dict(user: User) -> Dict:
+    def user_to_dict(user: User, names: Dict[int, str] | None = None) -> Dict:
+        """
+        Follow lists store ids only, names are taken from `names`.
+        Ids without a name (removed users) are skipped.
+        """
+        names = names or {}
+
         followers = [
-            {"id": int(user_id), "name": user_name}
-            for user_id, user_name in user.followers.items()
+            {"id": user_id, "name": names[user_id]}
+            for user_id in user.followers
+            if user_id in names
         ]
         following = [
-            {"id": int(user_id), "name": user_name}
-            for user_id, user_name in user.following.items()
+            {"id": user_id, "name": names[user_id]}
+            for user_id in user.following
+            if user_id in names
         ]
 
         user_dict = user.to_dict()
@@ -190,6 +1044,76 @@ class UserController:
 
         return user_dict
 
+    async def resolve_names(
+        self,
+        async_session: AsyncSession,
+        user_ids: Iterable[int],
+    ) -> Dict[int, str]:
+        """Batched id -> name lookup through the in-process LRU cache."""
+        names, missing_ids = {}, []
+
+        for user_id in user_ids:
+            name = self._names_cache.get(user_id)
+
+            if name is None:
+                missing_ids.append(user_id)
+            else:
+                names[user_id] = name
+
+        if missing_ids:
+            loaded = await self.user_manager.get_names(async_session, missing_ids)
+
+            for user_id, name in loaded.items():
+                self._names_cache.set(user_id, name)
+
+            names.update(loaded)
+
+        return names
+
+    @classmethod
+    def forget_name(cls, user_id: int) -> None:
+        """Drop cached name, e.g. after rename."""
+        cls._names_cache.pop(user_id)
+
+    async def search_users(self, async_session: AsyncSession, query: str) -> List[Dict]:
+        """
+        Users whose name starts with `query`, case is ignored. Typeahead sends
+        a request per keystroke, so prefixes up to `USERS_SEARCH_CACHE_PREFIX`
+        characters, the most shared ones, are served from the cache; added and
+        deleted users show there within `USERS_SEARCH_CACHE_TTL` seconds.
+        """
+        prefix = query.strip().lower()
+
+        if not prefix:
+            raise ValidationError("Empty query")
+
+        cacheable = len(prefix) <= settings.USERS_SEARCH_CACHE_PREFIX
+
+        if cacheable:
+            users = self._search_cache.get(prefix)
+
+            if users is not None:
+                return users
+
+        found = await self.user_manager.search_by_name(
+            async_session,
+            prefix,
+            settings.USERS_SEARCH_LIMIT,
+        )
+        users = [{"id": user_id, "name": name} for user_id, name in found]
+
+        if cacheable:
+            self._search_cache.set(prefix, users)
+
+        return users
+
+    async def user_detail_to_dict(self, async_session: AsyncSession, user: User) -> Dict:
+        names = await self.resolve_names(
+            async_session,
+            {*user.followers, *user.following},
+        )
+        return self.user_to_dict(user, names)
+
     async def user_detail(self, async_session: AsyncSession, user_id: int) -> User:
         user = await self.user_manager.get_user_detail(async_session, user_id)
 
@@ -221,16 +1145,13 @@ class UserController:
             target_user_id,
         )
 
-        str_target_user_id = str(target_user_id)
-        str_user_id = str(user.id)
-
-        if str_user_id in target_user.followers:
+        if user.id in target_user.followers:
             raise APIException(
                 f"You already followed user with user_id `{target_user_id}`",
             )
 
-        user.following[str_target_user_id] = target_user.name
-        target_user.followers[str_user_id] = user.name
+        user.following.append(target_user_id)
+        target_user.followers.append(user.id)
 
         await self.user_manager.update(
             async_session,
@@ -240,6 +1161,8 @@ class UserController:
             ],
         )
 
+        self.__follows_changed(user, followed_ids=[target_user_id])
+
     async def delete_follow_user(
         self,
         async_session: AsyncSession,
@@ -252,16 +1175,15 @@ class UserController:
             target_user_id,
         )
 
-        str_target_user_id = str(target_user_id)
-        str_user_id = str(user.id)
-
-        if str_user_id not in target_user.followers:
+        if user.id not in target_user.followers:
             raise APIException(
                 f"You are not followed user with user_id `{target_user_id}`",
             )
 
-        user.following.pop(str_target_user_id)
-        target_user.followers.pop(str_user_id)
+        if target_user_id in user.following:
+            user.following.remove(target_user_id)
+
+        target_user.followers.remove(user.id)
 
         await self.user_manager.update(
             async_session,
@@ -271,6 +1193,539 @@ class UserController:
             ],
         )
 
+        self.__follows_changed(user, unfollowed_ids=[target_user_id])
+
+    def __follows_changed(
+        self,
+        user: User,
+        followed_ids: Iterable[int] = (),
+        unfollowed_ids: Iterable[int] = (),
+    ) -> None:
+        for target_user_id in followed_ids:
+            if follow_graph.is_loaded:
+                follow_graph.follow(user.id, target_user_id)
+
+            self._relations_cache.invalidate(user.id, target_user_id)
+
+        for target_user_id in unfollowed_ids:
+            if follow_graph.is_loaded:
+                follow_graph.unfollow(user.id, target_user_id)
+
+            self._relations_cache.invalidate(user.id, target_user_id)
+
+        SuggestionController.mark_dirty([user.id, *user.followers])
+
+    async def batch_follow_users(
+        self,
+        async_session: AsyncSession,
+        user: User,
+        follow_ids: List[int],
+        unfollow_ids: List[int],
+    ) -> Dict[str, List[int]]:
+        """
+        Apply follows and unfollows with one multi-row UPDATE.
+
+        Already followed (or not followed) targets are skipped, so the batch
+        can be safely retried.
+        """
+        max_size = settings.MAX_FOLLOW_BATCH_SIZE
+        target_ids = set(follow_ids) | set(unfollow_ids)
+
+        if len(follow_ids) + len(unfollow_ids) > max_size:
+            raise ValidationError(f"Too many user ids, max `{max_size}`")
+
+        if set(follow_ids) & set(unfollow_ids):
+            raise ValidationError("Same user ID to follow and unfollow")
+
+        if user.id in target_ids:
+            raise APIException(f"It's your user ID `{user.id}`")
+
+        target_users = {
+            target_user.id: target_user
+            for target_user in await self.user_manager.get_users_detail(
+                async_session,
+                list(target_ids),
+            )
+        }
+
+        missing_ids = sorted(target_ids - target_users.keys())
+
+        if missing_ids:
+            raise NotFoundError(f"Users with ID {missing_ids} not found")
+
+        followed, unfollowed = [], []
+
+        for target_user_id in sorted(set(follow_ids)):
+            target_user = target_users[target_user_id]
+
+            if user.id not in target_user.followers:
+                user.following.append(target_user_id)
+                target_user.followers.append(user.id)
+                followed.append(target_user_id)
+
+        for target_user_id in sorted(set(unfollow_ids)):
+            target_user = target_users[target_user_id]
+
+            if user.id in target_user.followers:
+                if target_user_id in user.following:
+                    user.following.remove(target_user_id)
+
+                target_user.followers.remove(user.id)
+                unfollowed.append(target_user_id)
+
+        changed = [user, *(target_users[user_id] for user_id in followed + unfollowed)]
+
+        if len(changed) > 1:
+            await self.user_manager.update_follows(
+                async_session,
+                [item.to_dict(only=("id", "followers", "following")) for item in changed],
+            )
+            self.__follows_changed(user, followed, unfollowed)
+
+        return {"followed": followed, "unfollowed": unfollowed}
+
+    async def delete_account(self, async_session: AsyncSession, user: User) -> None:
+        if not await self.user_manager.tombstone(
+            async_session,
+            user.id,
+            self.DELETION_STAGES[0],
+        ):
+            raise NotFoundError(f"User with ID `{user.id}` not found")
+
+        self.forget_name(user.id)
+
+        if UserController.__deletion_task is not None:
+            UserController.__deletion_task.wake()
+
+    async def __purge_follows(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+    ) -> int | None:
+        """
+        Remove up to `ACCOUNT_DELETION_FOLLOWS` follow edges of a deleted user.
+        Returns number of removed edges, None if none are left.
+        """
+        users = await self.user_manager.get_users_detail(
+            async_session,
+            [user_id],
+            with_deleted=True,
+        )
+
+        if not users:
+            return None
+
+        user = users[0]
+        target_ids = list(dict.fromkeys([*user.following, *user.followers]))
+        target_ids = target_ids[: settings.ACCOUNT_DELETION_FOLLOWS]
+
+        if not target_ids:
+            return None
+
+        targets = await self.user_manager.get_users_detail(
+            async_session,
+            target_ids,
+            with_deleted=True,
+        )
+
+        batch = set(target_ids)
+        following = [target_id for target_id in user.following if target_id not in batch]
+        followers = [target_id for target_id in user.followers if target_id not in batch]
+
+        removed = (
+            len(user.following) - len(following) + len(user.followers) - len(followers)
+        )
+
+        rows = [{"id": user.id, "followers": followers, "following": following}]
+        rows.extend(
+            {
+                "id": target.id,
+                "followers": [item for item in target.followers if item != user_id],
+                "following": [item for item in target.following if item != user_id],
+            }
+            for target in targets
+        )
+
+        await self.user_manager.update_follows(async_session, rows)
+
+        for target_id in target_ids:
+            if follow_graph.is_loaded:
+                follow_graph.unfollow(user_id, target_id)
+                follow_graph.unfollow(target_id, user_id)
+
+            self._relations_cache.invalidate(user_id, target_id)
+
+        SuggestionController.mark_dirty(target_ids)
+
+        return removed
+
+    async def __purge_account(
+        self,
+        async_session: AsyncSession,
+        deletion: AccountDeletion,
+        max_batches: int,
+    ) -> Tuple[str, int]:
+        """Returns reached stage and number of used batches."""
+        user_id, stage = deletion.user_id, deletion.stage
+        rows = settings.ACCOUNT_DELETION_ROWS
+        pause = settings.ACCOUNT_DELETION_PAUSE / 1000
+        batches = 0
+
+        while stage != self.DELETED and batches < max_batches:
+            if batches:
+                await asyncio.sleep(pause)
+
+            removed = {}
+
+            if stage == "tweets":
+                tweet_ids = await self.tweet_manager.delete_author_tweets(
+                    async_session,
+                    user_id,
+                    settings.ACCOUNT_DELETION_TWEETS,
+                )
+
+                if tweet_ids:
+                    removed["tweets"], used = await TweetController().purge_tweets(
+                        async_session,
+                        tweet_ids,
+                        max_batches - batches,
+                    )
+                    batches += max(used, 1)
+                else:
+                    stage = "archived"
+            elif stage == "archived":
+                deleted, files = await self.archived_tweet_manager.delete_tweets(
+                    async_session,
+                    [ArchivedTweet.author_id == user_id],
+                    rows,
+                )
+
+                if deleted:
+                    removed["tweets"] = deleted
+                    removed["media"] = len(files)
+                    batches += 1
+
+                    await asyncio.to_thread(MediaController.remove_files, files)
+
+                if deleted < rows:
+                    stage = "media"
+            elif stage == "media":
+                files = await self.media_manager.delete_owner_media(
+                    async_session,
+                    user_id,
+                    rows,
+                )
+
+                if files:
+                    removed["media"] = len(files)
+                    batches += 1
+
+                    await asyncio.to_thread(MediaController.remove_files, files)
+
+                if len(files) < rows:
+                    stage = "likes"
+            elif stage == "likes":
+                removed["likes"] = await self.like_manager.purge_user_likes(
+                    async_session,
+                    user_id,
+                    rows,
+                )
+                batches += 1
+
+                if removed["likes"] < rows:
+                    stage = "follows"
+            elif stage == "follows":
+                edges = await self.__purge_follows(async_session, user_id)
+
+                if edges is None:
+                    stage = "user"
+                else:
+                    removed["follows"] = edges
+                    batches += 1
+            else:
+                await self.user_manager.delete(
+                    async_session,
+                    [User.id == user_id, User.deleted_at.is_not(None)],
+                )
+                batches += 1
+                stage = self.DELETED
+
+            await self.deletion_manager.save_progress(
+                async_session,
+                user_id,
+                stage,
+                finished=stage == self.DELETED,
+                **removed,
+            )
+
+        return stage, batches
+
+    async def purge_accounts(self, max_batches: int | None = None) -> int:
+        """
+        Run deletion batches (at most `ACCOUNT_DELETION_MAX_BATCHES`) for the
+        oldest deleted accounts. Returns number of fully removed accounts.
+        """
+        if max_batches is None:
+            max_batches = settings.ACCOUNT_DELETION_MAX_BATCHES
+
+        batches, finished = 0, 0
+
+        async with db_session_manager.session() as async_session:
+            deletions = await self.deletion_manager.get_pending(async_session)
+
+            for deletion in deletions:
+                if batches >= max_batches:
+                    break
+
+                stage, used = await self.__purge_account(
+                    async_session,
+                    deletion,
+                    max_batches - batches,
+                )
+                batches += used
+
+                if stage == self.DELETED:
+                    finished += 1
+
+        logger.debug("Accounts deleted: %s, batches: %s", finished, batches)
+        return finished
+
+    async def __relation_ids_from_graph(
+        self,
+        async_session: AsyncSession,
+        user: User,
+        target_user_id: int,
+        kind: str,
+    ) -> List[int]:
+        if kind == self.FOLLOWERS_YOU_KNOW:
+            target_ids = follow_graph.followers(target_user_id)
+        else:
+            target_ids = follow_graph.following(target_user_id)
+
+        ids = follow_graph.intersect(follow_graph.following(user.id), target_ids)
+
+        if not ids:
+            target_exists = await self.user_manager.exists(
+                async_session,
+                [User.id == target_user_id],
+            )
+
+            if not target_exists:
+                raise NotFoundError(f"User with ID `{target_user_id}` not found")
+
+        return ids
+
+    async def __relation_ids_from_db(
+        self,
+        async_session: AsyncSession,
+        user: User,
+        target_user_id: int,
+        kind: str,
+    ) -> List[int]:
+        target_user = await self.user_detail(async_session, target_user_id)
+
+        if kind == self.FOLLOWERS_YOU_KNOW:
+            target_ids = target_user.followers
+        else:
+            target_ids = target_user.following
+
+        return sorted(set(user.following).intersection(target_ids))
+
+    async def __relations(
+        self,
+        async_session: AsyncSession,
+        user: User,
+        target_user_id: int,
+        kind: str,
+    ) -> List[Dict]:
+        if user.id == target_user_id:
+            raise APIException(f"It's your user ID `{target_user_id}`")
+
+        key = (kind, user.id, target_user_id)
+        relations = self._relations_cache.get(key)
+
+        if relations is not None:
+            return relations
+
+        if follow_graph.is_loaded:
+            ids = await self.__relation_ids_from_graph(
+                async_session,
+                user,
+                target_user_id,
+                kind,
+            )
+        else:
+            ids = await self.__relation_ids_from_db(
+                async_session,
+                user,
+                target_user_id,
+                kind,
+            )
+
+        names = await self.resolve_names(async_session, ids)
+
+        relations = [
+            {"id": user_id, "name": names[user_id]} for user_id in ids if user_id in names
+        ]
+
+        self._relations_cache.set_tagged(key, relations, (user.id, target_user_id))
+        return relations
+
+    async def mutuals(
+        self,
+        async_session: AsyncSession,
+        user: User,
+        target_user_id: int,
+    ) -> List[Dict]:
+        """Accounts followed by both the current user and the target user."""
+        return await self.__relations(async_session, user, target_user_id, self.MUTUALS)
+
+    async def followers_you_know(
+        self,
+        async_session: AsyncSession,
+        user: User,
+        target_user_id: int,
+    ) -> List[Dict]:
+        """Followers of the target user that the current user follows."""
+        return await self.__relations(
+            async_session,
+            user,
+            target_user_id,
+            self.FOLLOWERS_YOU_KNOW,
+        )
+
+
+class SuggestionController:
+    """
+    Friend-of-friend suggestions.
+
+    Suggestions are computed in background and stored in `user_suggestions`. Only
+    users whose neighbourhood changed (marked dirty by follow/unfollow) are
+    recomputed after the first full run.
+    """
+
+    __dirty: Set[int] = set()
+    __task: PeriodicTask | None = None
+    __full_refresh: bool = True
+
+    def __init__(self) -> None:
+        self.user_manager: UserManager = UserManager()
+        self.suggestion_manager: UserSuggestionManager = UserSuggestionManager()
+
+    @classmethod
+    def mark_dirty(cls, user_ids: Iterable[int]) -> None:
+        if cls.__task is not None:
+            cls.__dirty.update(user_ids)
+
+    @classmethod
+    def start_task(cls) -> None:
+        cls.__task = PeriodicTask(
+            "SuggestionsTask",
+            cls.__refresh_task,
+            settings.SUGGESTIONS_INTERVAL,
+        )
+        cls.__task.start()
+
+    @classmethod
+    async def stop_task(cls) -> None:
+        if cls.__task is not None:
+            await cls.__task.stop()
+            cls.__task = None
+
+    @classmethod
+    async def __refresh_task(cls) -> None:
+        full, cls.__full_refresh = cls.__full_refresh, False
+        await cls().refresh(full=full)
+
+    @staticmethod
+    def top_k(
+        user_id: int,
+        following: Callable[[int], Iterable[int]],
+        top_k: int,
+    ) -> List[int]:
+        followed = set(following(user_id))
+        counter: Counter = Counter()
+
+        for friend_id in followed:
+            counter.update(following(friend_id))
+
+        for excluded_id in followed | {user_id}:
+            counter.pop(excluded_id, None)
+
+        best = nsmallest(top_k, counter.items(), key=lambda item: (-item[1], item[0]))
+        return [suggested_id for suggested_id, _ in best]
+
+    async def __load_following(
+        self,
+        async_session: AsyncSession,
+        user_ids: Iterable[int] | None,
+    ) -> Dict[int, List[int]]:
+        if user_ids is None:
+            graph = FollowGraphIndex()
+            graph.load(await self.user_manager.get_follow_edges(async_session))
+            return {user_id: list(graph.following(user_id)) for user_id in graph.users()}
+
+        following = await self.user_manager.get_following(async_session, list(user_ids))
+        friend_ids = {
+            friend_id for friends in following.values() for friend_id in friends
+        } - following.keys()
+
+        if friend_ids:
+            following.update(
+                await self.user_manager.get_following(async_session, list(friend_ids)),
+            )
+
+        return following
+
+    async def refresh(self, full: bool = False) -> int:
+        dirty, SuggestionController.__dirty = SuggestionController.__dirty, set()
+
+        if not full and not dirty:
+            return 0
+
+        async with db_session_manager.session() as async_session:
+            if follow_graph.is_loaded:
+                user_ids = follow_graph.users() if full else sorted(dirty)
+                following = follow_graph.following
+            else:
+                following_map = await self.__load_following(
+                    async_session,
+                    None if full else dirty,
+                )
+                user_ids = list(following_map) if full else sorted(dirty)
+                following = defaultdict(list, following_map).__getitem__
+
+            batch_size = settings.SUGGESTIONS_BATCH_SIZE
+
+            # Computed batch by batch, each upsert yields to the event loop, so
+            # requests are not stalled for the whole run. The live follow graph
+            # is changed by requests and is not read from another thread.
+            for start in range(0, len(user_ids), batch_size):
+                end = start + batch_size
+                rows = [
+                    {
+                        "user_id": user_id,
+                        "suggested_ids": self.top_k(
+                            user_id,
+                            following,
+                            settings.SUGGESTIONS_TOP_K,
+                        ),
+                    }
+                    for user_id in user_ids[start:end]
+                ]
+
+                await self.suggestion_manager.upsert(async_session, rows)
+
+        logger.debug("Suggestions refreshed for %s users", len(user_ids))
+        return len(user_ids)
+
+    async def get_suggestions(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+    ) -> List[Dict]:
+        return await self.suggestion_manager.get_suggestions(async_session, user_id)
+
 
 class MediaController:
     __write_queue: Queue = Queue(100_000)
@@ -297,6 +1752,25 @@ class MediaController:
         for thread in cls.__THREADS:
             thread.stop()
 
+    @staticmethod
+    def remove_files(files: Iterable[str | None]) -> None:
+        """Remove files of deleted media with their media item dirs."""
+        media_dir = Path(settings.MEDIA_DIR)
+
+        for file in files:
+            if not file:
+                continue
+
+            path = Path(file)
+            path.unlink(missing_ok=True)
+
+            # Media are stored as `MEDIA_DIR/<media id>/<name>`
+            if path.parent.parent == media_dir:
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass
+
     @staticmethod
     def __create_media_item_dir(media_item_id: int) -> Path:
         media_item_dir: Path = settings.MEDIA_DIR / str(media_item_id)
@@ -334,7 +1808,9 @@ class MediaController:
         self,
         files: List[UploadFile],
         async_session: AsyncSession,
+        owner_id: int | None,
     ) -> List[Media]:
+        """Ids are generated before insert, so media are saved with their files."""
         media = []
 
         for file in files:
@@ -343,50 +1819,64 @@ class MediaController:
             except ValueError as exc:
                 raise ValidationError("File error") from exc
 
-            media.append(Media(name=self.__refactor_filename(file.filename)))
+            media_id = snowflake.next_id()
+            name = self.__refactor_filename(file.filename)
+            media_location = self.__create_media_item_dir(media_id) / name
+
+            media.append(
+                Media(
+                    id=media_id,
+                    name=name,
+                    file=media_location.as_posix(),
+                    owner_id=owner_id,
+                ),
+            )
 
         return await self.media_manager.add_all(
             async_session,
             media,
         )
 
-    async def __update_media_items(
-        self,
-        media_items: List[Media],
-        async_session: AsyncSession,
-    ) -> None:
-        to_update = []
-
-        for media in media_items:
-            media_item_dir = self.__create_media_item_dir(media.id)
-            media_location = media_item_dir / media.name
-            media.file = media_location.as_posix()
-
-            to_update.append(media.to_dict())
-
-        await self.media_manager.update(async_session, to_update)
-
     async def _save_media(
         self,
         files: List[UploadFile],
         async_session: AsyncSession,
+        owner_id: int | None = None,
     ) -> List[Media]:
         if self.__stop_event.is_set():
             info = "Queue is closed"
             logger.critical(info)
             raise APIException(info, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        media_items = await self.__create_media_items(files, async_session)
-        await self.__update_media_items(media_items, async_session)
+        media_items = await self.__create_media_items(files, async_session, owner_id)
 
         self.__read_queue.put((media_items, files))
 
         return media_items
 
+    @staticmethod
+    async def form_digest(form: FormData) -> bytes:
+        """SHA-256 of names and contents of uploaded files."""
+        digest = sha256()
+
+        for file in form.getlist("file"):
+            if isinstance(file, str):
+                continue
+
+            digest.update(f"{file.filename}\0{file.size}\0".encode())
+
+            while chunk := await file.read(1 << 16):
+                digest.update(chunk)
+
+            await file.seek(0)
+
+        return digest.digest()
+
     async def save_media(
         self,
         form: FormData,
         async_session: AsyncSession,
+        owner_id: int | None = None,
     ) -> List[Media]:
         field_name = "file"
         files: List[UploadFile] = form.getlist(field_name)
@@ -394,4 +1884,368 @@ class MediaController:
         if not files:
             raise ValidationError(f"Empty field: `{field_name}`")
 
-        return await self._save_media(files, async_session)
+        return await self._save_media(files, async_session, owner_id)
+
+
+class IdempotencyController:
+    """
+    Responses of requests made with an `Idempotency-Key` header are stored by
+    user and key with a fingerprint of the request for `IDEMPOTENCY_KEY_TTL`.
+
+    A repeated request gets the stored response without running again, a
+    request with a used key and another fingerprint is rejected. A duplicate
+    arriving while the first request runs waits for its response (up to
+    `IDEMPOTENCY_KEY_WAIT`). Failed requests release the key, so they can be
+    retried. A key left without response for longer than `IDEMPOTENCY_KEY_WAIT`
+    (its process died) is claimed again by a retry. Expired keys are deleted by
+    a background task.
+    """
+
+    __task: PeriodicTask | None = None
+
+    def __init__(self) -> None:
+        self.idempotency_key_manager: IdempotencyKeyManager = IdempotencyKeyManager()
+
+    @classmethod
+    def start_task(cls) -> None:
+        cls.__task = PeriodicTask(
+            "IdempotencyKeysPurgeTask",
+            cls.__purge,
+            settings.IDEMPOTENCY_KEYS_PURGE_INTERVAL,
+        )
+        cls.__task.start()
+
+    @classmethod
+    async def stop_task(cls) -> None:
+        if cls.__task is not None:
+            await cls.__task.stop()
+            cls.__task = None
+
+    @classmethod
+    async def __purge(cls) -> None:
+        await cls().purge()
+
+    async def purge(self) -> int:
+        """Delete expired keys in batches, returns number of deleted."""
+        batch_size = settings.IDEMPOTENCY_KEYS_PURGE_BATCH_SIZE
+        deleted = 0
+
+        async with db_session_manager.session() as async_session:
+            while True:
+                count = await self.idempotency_key_manager.delete_expired(
+                    async_session,
+                    settings.IDEMPOTENCY_KEY_TTL,
+                    batch_size,
+                )
+                deleted += count
+
+                if count < batch_size:
+                    break
+
+        logger.debug("Idempotency keys purged: %s", deleted)
+        return deleted
+
+    @staticmethod
+    def fingerprint(path: str, body: bytes) -> bytes:
+        return sha256(path.encode() + b"\0" + body).digest()
+
+    async def run(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        key: str,
+        fingerprint: bytes,
+        func: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Returns stored response for `key` or runs `func` and stores its response."""
+        deadline = perf_counter() + settings.IDEMPOTENCY_KEY_WAIT / 1000
+
+        while True:
+            stored = await self.idempotency_key_manager.claim(
+                async_session,
+                user_id,
+                key,
+                fingerprint,
+                settings.IDEMPOTENCY_KEY_TTL,
+                settings.IDEMPOTENCY_KEY_WAIT,
+            )
+
+            if stored is None:
+                break
+
+            if stored.fingerprint != fingerprint:
+                raise ValidationError("Idempotency-Key is used for another request")
+
+            if stored.response is not None:
+                return stored.response
+
+            if perf_counter() >= deadline:
+                raise APIException(
+                    "Request with this Idempotency-Key is in progress",
+                    status.HTTP_409_CONFLICT,
+                )
+
+            await asyncio.sleep(settings.IDEMPOTENCY_KEY_POLL / 1000)
+
+        try:
+            response = await func()
+        except (Exception, asyncio.CancelledError):
+            await async_session.rollback()
+            await self.idempotency_key_manager.release(async_session, user_id, key)
+            raise
+
+        await self.idempotency_key_manager.save_response(
+            async_session,
+            user_id,
+            key,
+            response,
+        )
+        return response
+
+
+class PartitionController:
+    """
+    `tweets` and `likes` are partitioned by tweet id ranges of
+    `TWEETS_PARTITION_DAYS` days (see utils/partitions.py): tweets of a period
+    and their likes are in two partitions with the same bounds.
+
+    The maintenance task creates partitions for `TWEETS_PARTITIONS_AHEAD`
+    periods ahead. Partitions older than `TWEETS_RETENTION` (or, without it,
+    `TWEETS_ARCHIVE_AFTER`) are detached concurrently once the purge or archive
+    task has emptied them, so queries of the table are not blocked; detached
+    partitions are dropped as plain tables afterwards.
+    """
+
+    __task: PeriodicTask | None = None
+    __legacy_upper: int | None = None
+
+    def __init__(self) -> None:
+        self.partition_manager: PartitionManager = PartitionManager()
+
+    @classmethod
+    def start_task(cls) -> None:
+        cls.__task = PeriodicTask(
+            "PartitionsMaintenanceTask",
+            cls.__maintain,
+            settings.PARTITIONS_MAINTENANCE_INTERVAL,
+        )
+        cls.__task.start()
+
+    @classmethod
+    async def stop_task(cls) -> None:
+        if cls.__task is not None:
+            await cls.__task.stop()
+            cls.__task = None
+
+    @classmethod
+    async def __maintain(cls) -> None:
+        await cls().maintain()
+
+    @classmethod
+    async def legacy_upper(cls, async_session: AsyncSession) -> int:
+        """Upper bound of the legacy tweets partition (0 if none), loaded once."""
+        if cls.__legacy_upper is None:
+            partitions = await PartitionManager().get_partitions(async_session, "tweets")
+            cls.__legacy_upper = next(
+                (partition.upper for partition in partitions if partition.lower is None),
+                0,
+            )
+
+        return cls.__legacy_upper
+
+    async def maintain(
+        self,
+        now: datetime | None = None,
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Create upcoming, detach expired and drop detached partitions as of `now`
+        (current time by default), returns their names.
+        """
+        now = int((now or datetime.now(timezone.utc)).timestamp() * 1000)
+        horizon = snowflake.min_id(
+            now + settings.TWEETS_PARTITIONS_AHEAD * partition_scheme.period,
+        )
+        created = []
+
+        async with db_session_manager.session() as async_session:
+            for table_name in PARTITIONED_TABLES:
+                partitions = await self.partition_manager.get_partitions(
+                    async_session,
+                    table_name,
+                )
+                upcoming = []
+
+                if partitions:
+                    upper = partitions[-1].upper
+                else:
+                    # Tables made by FORCE_INIT have no partitions yet
+                    upper = partition_scheme.next_bound(snowflake.min_id(now))
+                    upcoming.append(Partition(f"{table_name}_legacy", None, upper))
+
+                while upper is not None and upper <= horizon:
+                    lower, upper = upper, partition_scheme.next_bound(upper)
+                    name = partition_scheme.partition_name(table_name, lower)
+                    upcoming.append(Partition(name, lower, upper))
+
+                for partition in upcoming:
+                    await self.partition_manager.create_partition(
+                        async_session,
+                        table_name,
+                        partition,
+                        settings.PARTITIONS_LOCK_TIMEOUT,
+                    )
+                    created.append(partition.name)
+
+            detached = await self.__detach_expired(async_session, now)
+            dropped = await self.__drop_detached(async_session)
+
+        logger.debug(
+            "Partitions created: %s, detached: %s, dropped: %s",
+            created,
+            detached,
+            dropped,
+        )
+        return created, detached, dropped
+
+    async def __detach_expired(self, async_session: AsyncSession, now: int) -> List[str]:
+        days = settings.TWEETS_RETENTION or settings.TWEETS_ARCHIVE_AFTER
+        expired = snowflake.min_id(now - days * 86_400_000)
+        # Lower bound: partitions of each table, likes go first as they refer tweets
+        pairs: Dict[int, List[Tuple[str, Partition]]] = defaultdict(list)
+
+        for table_name in reversed(PARTITIONED_TABLES):
+            partitions = await self.partition_manager.get_partitions(
+                async_session,
+                table_name,
+            )
+
+            for partition in partitions:
+                # The legacy partition is kept, its ids are not time ordered
+                if partition.lower is not None and partition.upper is not None:
+                    pairs[partition.lower].append((table_name, partition))
+
+        detached = []
+
+        for _, pair in sorted(pairs.items()):
+            if pair[0][1].upper > expired:
+                break
+
+            # Partitions with rows left are kept until the tasks empty them
+            for _, partition in pair:
+                if not await self.partition_manager.is_empty(
+                    async_session,
+                    partition.name,
+                ):
+                    break
+            else:
+                for table_name, partition in pair:
+                    await self.partition_manager.detach_partition(
+                        async_session,
+                        table_name,
+                        partition.name,
+                        settings.PARTITIONS_LOCK_TIMEOUT,
+                    )
+                    detached.append(partition.name)
+
+        return detached
+
+    async def __drop_detached(self, async_session: AsyncSession) -> List[str]:
+        dropped = []
+
+        for table_name in reversed(PARTITIONED_TABLES):
+            for name in await self.partition_manager.get_detached(
+                async_session,
+                table_name,
+            ):
+                if not await self.partition_manager.is_empty(async_session, name):
+                    logger.warning("Detached partition %s is not empty, kept", name)
+                    continue
+
+                await self.partition_manager.drop_table(async_session, name)
+                dropped.append(name)
+
+        return dropped
+
+
+class SnowflakeController:
+    """
+    Snowflake ids need a worker id unique among running processes. A set
+    `SNOWFLAKE_WORKER_ID` is used as is, otherwise the lowest free worker id is
+    leased in `snowflake_workers` for `SNOWFLAKE_WORKER_LEASE` seconds and
+    renewed by a background task. The generator stops when the lease runs out
+    unrenewed, and a lost lease is replaced by a new worker id.
+    """
+
+    __holder: str = uuid4().hex
+    __task: PeriodicTask | None = None
+
+    def __init__(self) -> None:
+        self.worker_manager: SnowflakeWorkerManager = SnowflakeWorkerManager()
+
+    @classmethod
+    async def start_task(cls) -> None:
+        """Assign a worker id, fails if it is out of range or none is free."""
+        if settings.SNOWFLAKE_WORKER_ID is not None:
+            snowflake.assign(settings.SNOWFLAKE_WORKER_ID)
+            return
+
+        worker_id = await cls().lease()
+        logger.info("Snowflake worker id leased: %s", worker_id)
+
+        cls.__task = PeriodicTask(
+            "SnowflakeLeaseTask",
+            cls.__renew,
+            settings.SNOWFLAKE_WORKER_LEASE / 3,
+        )
+        cls.__task.start()
+
+    @classmethod
+    async def stop_task(cls) -> None:
+        if cls.__task is None:
+            return
+
+        await cls.__task.stop()
+        cls.__task = None
+
+        worker_id = snowflake.worker_id
+        snowflake.assign(None)
+
+        if worker_id is not None:
+            async with db_session_manager.session() as async_session:
+                await cls().worker_manager.release(async_session, worker_id, cls.__holder)
+
+    @classmethod
+    async def __renew(cls) -> None:
+        await cls().lease()
+
+    async def lease(self) -> int:
+        """Lease a worker id or renew the current one, returns the worker id."""
+        ttl = settings.SNOWFLAKE_WORKER_LEASE
+        worker_id = snowflake.worker_id
+        started_at = perf_counter()
+
+        async with db_session_manager.session() as async_session:
+            if worker_id is not None and not await self.worker_manager.renew(
+                async_session,
+                worker_id,
+                self.__holder,
+                ttl,
+            ):
+                logger.warning("Snowflake worker id %s lease lost", worker_id)
+                worker_id = None
+
+            if worker_id is None:
+                worker_id = await self.worker_manager.lease(
+                    async_session,
+                    self.__holder,
+                    1 << settings.SNOWFLAKE_WORKER_BITS,
+                    ttl,
+                )
+
+        if worker_id is None:
+            snowflake.assign(None)
+            raise RuntimeError("No free snowflake worker id, all of them are leased")
+
+        # The lease started in the database after `started_at`
+        snowflake.assign(worker_id, ttl - (perf_counter() - started_at))
+        return worker_id
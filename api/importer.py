@@ -0,0 +1,306 @@
+"""
+Bulk import of users, tokens, tweets, likes and follows from NDJSON files.
+
+    python importer.py DIR [--batch-size 10000] [--reset]
+
+DIR may contain `users.ndjson`, `tokens.ndjson`, `tweets.ndjson`, `likes.ndjson`
+and `follows.ndjson` (missing files are skipped), one JSON object per line:
+
+    users:   {"id": 1, "name": "alice"}
+    tokens:  {"user_id": 1, "api_key": "..."}
+    tweets:  {"id": 1, "author_id": 1, "content": "...", "created_at": "..."}
+    likes:   {"user_id": 2, "tweet_id": 1, "created_at": "..."}
+    follows: {"user_id": 2, "target_id": 1}
+
+Files are imported in this order with `COPY`, in chunks of `--batch-size` rows.
+Each chunk is committed together with its checkpoint (last imported line) in
+`import_checkpoints`, so an interrupted import continues after the last
+committed chunk. User and tweet ids are kept, sequences are moved past them at
+the end. Like counters are updated per chunk, as are hashtags and mentions of
+tweets; follow edges are appended to the follow lists of both users (edges are
+expected to be unique). `created_at` is
+an ISO 8601 time, UTC if it has no offset.
+"""
+import argparse
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import islice
+from logging import basicConfig, getLogger
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import asyncpg
+from sqlalchemy import URL
+
+from settings import settings
+from utils.entities import extract_mentions, extract_tags
+
+logger = getLogger(__name__)
+
+Record = Tuple[Any, ...]
+# SQL run after each copied chunk, with arguments built from the chunk records
+Statement = Tuple[str, Callable[[List[Record]], Tuple[Any, ...]]]
+
+CHECKPOINT_STMT = "SELECT line FROM import_checkpoints WHERE source = $1"
+
+SAVE_CHECKPOINT_STMT = """
+INSERT INTO import_checkpoints (source, line) VALUES ($1, $2)
+ON CONFLICT (source) DO UPDATE SET line = EXCLUDED.line, updated_at = now()
+"""
+
+RESET_CHECKPOINT_STMT = "DELETE FROM import_checkpoints WHERE source = $1"
+
+COUNT_LIKES_STMT = """
+INSERT INTO tweet_like_counters (tweet_id, shard, count)
+SELECT tweet_id, 0, count(*) FROM unnest($1::bigint[]) AS likes(tweet_id)
+GROUP BY tweet_id
+ON CONFLICT (tweet_id, shard)
+DO UPDATE SET count = tweet_like_counters.count + EXCLUDED.count
+"""
+
+TAGS_STMT = """
+INSERT INTO tweet_tags (tag, tweet_id)
+SELECT tag, tweet_id FROM unnest($1::text[], $2::bigint[]) AS tags(tag, tweet_id)
+"""
+
+# Names of missing or deleted users are skipped
+MENTIONS_STMT = """
+INSERT INTO tweet_mentions (user_id, tweet_id)
+SELECT users.id, mentions.tweet_id
+FROM unnest($1::text[], $2::bigint[]) AS mentions(name, tweet_id)
+JOIN users ON users.name = mentions.name AND users.deleted_at IS NULL
+"""
+
+FOLLOWS_TABLE_STMT = """
+CREATE TEMP TABLE IF NOT EXISTS import_follows (user_id BIGINT, target_id BIGINT)
+ON COMMIT DELETE ROWS
+"""
+
+APPEND_FOLLOWS_STMTS = (
+    """
+    UPDATE users SET following = (users.following::jsonb || edges.ids)::json
+    FROM (
+        SELECT user_id, jsonb_agg(target_id) AS ids FROM import_follows GROUP BY user_id
+    ) edges
+    WHERE users.id = edges.user_id
+    """,
+    """
+    UPDATE users SET followers = (users.followers::jsonb || edges.ids)::json
+    FROM (
+        SELECT target_id, jsonb_agg(user_id) AS ids FROM import_follows
+        GROUP BY target_id
+    ) edges
+    WHERE users.id = edges.target_id
+    """,
+)
+
+SEQUENCE_STMT = """
+SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false)
+FROM {table}
+"""
+
+
+def entities(
+    extract: Callable[[str], List[str]],
+) -> Callable[[List[Record]], Tuple[Any, ...]]:
+    """Arguments of `TAGS_STMT`/`MENTIONS_STMT` from `extract` of tweet records."""
+
+    def arguments(records: List[Record]) -> Tuple[Any, ...]:
+        pairs = [(item, record[0]) for record in records for item in extract(record[2])]
+        return [item for item, _ in pairs], [tweet_id for _, tweet_id in pairs]
+
+    return arguments
+
+
+def parse_time(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class Source:
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+    record: Callable[[Dict[str, Any]], Record]
+    # Tables with ids from the source, sequences are moved past them
+    keeps_ids: bool = False
+    statements: Tuple[Statement, ...] = field(default_factory=tuple)
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.name}.ndjson"
+
+
+SOURCES: Tuple[Source, ...] = (
+    Source(
+        "users",
+        "users",
+        ("id", "name", "followers", "following"),
+        lambda item: (item["id"], item["name"], "[]", "[]"),
+        keeps_ids=True,
+    ),
+    Source(
+        "tokens",
+        "tokens",
+        ("user_id", "api_key"),
+        lambda item: (item["user_id"], item["api_key"]),
+    ),
+    Source(
+        "tweets",
+        "tweets",
+        ("id", "author_id", "content", "created_at"),
+        lambda item: (
+            item["id"],
+            item["author_id"],
+            item["content"],
+            parse_time(item["created_at"]),
+        ),
+        keeps_ids=True,
+        statements=(
+            (TAGS_STMT, entities(extract_tags)),
+            (MENTIONS_STMT, entities(extract_mentions)),
+        ),
+    ),
+    Source(
+        "likes",
+        "likes",
+        ("user_id", "tweet_id", "created_at"),
+        lambda item: (item["user_id"], item["tweet_id"], parse_time(item["created_at"])),
+        statements=(
+            (COUNT_LIKES_STMT, lambda records: ([record[1] for record in records],)),
+        ),
+    ),
+    Source(
+        "follows",
+        "import_follows",
+        ("user_id", "target_id"),
+        lambda item: (item["user_id"], item["target_id"]),
+        statements=tuple((stmt, lambda records: ()) for stmt in APPEND_FOLLOWS_STMTS),
+    ),
+)
+
+
+def read_chunks(
+    path: Path,
+    skip: int,
+    size: int,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Yields (number of the last read line, parsed lines) after `skip` lines."""
+    with path.open(encoding="utf-8") as file:
+        lines = enumerate(islice(file, skip, None), start=skip + 1)
+
+        while chunk := list(islice(lines, size)):
+            yield chunk[-1][0], [json.loads(line) for _, line in chunk if line.strip()]
+
+
+class Importer:
+    def __init__(self, directory: Path, batch_size: int) -> None:
+        self.directory: Path = directory
+        self.batch_size: int = batch_size
+
+    @staticmethod
+    async def connect(url: URL) -> asyncpg.Connection:
+        return await asyncpg.connect(
+            user=url.username,
+            password=url.password,
+            host=url.host,
+            port=url.port,
+            database=url.database,
+        )
+
+    async def import_source(self, connection: asyncpg.Connection, source: Source) -> int:
+        """Returns number of imported rows."""
+        path = self.directory / source.file_name
+        checkpoint = str(path.resolve())
+
+        start = await connection.fetchval(CHECKPOINT_STMT, checkpoint) or 0
+        rows, started = 0, perf_counter()
+
+        if start:
+            logger.info("%s: resuming after line %s", source.file_name, start)
+
+        for line, items in read_chunks(path, start, self.batch_size):
+            records = [source.record(item) for item in items]
+
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    source.table,
+                    records=records,
+                    columns=source.columns,
+                )
+
+                for stmt, arguments in source.statements:
+                    await connection.execute(stmt, *arguments(records))
+
+                await connection.execute(SAVE_CHECKPOINT_STMT, checkpoint, line)
+
+            rows += len(records)
+            logger.info(
+                "%s: %s rows, %.0f rows/s",
+                source.file_name,
+                rows,
+                rows / (perf_counter() - started),
+            )
+
+        return rows
+
+    async def run(self, reset: bool = False) -> Dict[str, int]:
+        """Returns numbers of imported rows by source name."""
+        imported = {}
+        connection = await self.connect(settings.DB_URL)
+
+        try:
+            await connection.execute(FOLLOWS_TABLE_STMT)
+
+            for source in SOURCES:
+                path = self.directory / source.file_name
+
+                if not path.is_file():
+                    continue
+
+                if reset:
+                    await connection.execute(RESET_CHECKPOINT_STMT, str(path.resolve()))
+
+                started = perf_counter()
+                imported[source.name] = await self.import_source(connection, source)
+                elapsed = perf_counter() - started
+
+                logger.info(
+                    "%s: imported %s rows in %.1f s (%.0f rows/s)",
+                    source.file_name,
+                    imported[source.name],
+                    elapsed,
+                    imported[source.name] / elapsed if elapsed else 0,
+                )
+
+                if source.keeps_ids:
+                    await connection.execute(SEQUENCE_STMT.format(table=source.table))
+        finally:
+            await connection.close()
+
+        return imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import data from NDJSON files")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Ignore checkpoints and import files from the start",
+    )
+    args = parser.parse_args()
+
+    basicConfig(level="INFO", format="%(asctime)s %(levelname)s %(message)s")
+
+    importer = Importer(args.directory, args.batch_size)
+    asyncio.run(importer.run(reset=args.reset))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,13 @@ from fastapi import APIRouter, FastAPI
 
 from exceptions import ExceptionRegistrator
 from middlewares import ValidateUploadMediaMiddleware
-from routers import base_router, media_router, tweets_router, users_router
+from routers import (
+    base_router,
+    media_router,
+    tags_router,
+    tweets_router,
+    users_router,
+)
 from settings import settings
 from utils.lifespan import lifespan
 
@@ -27,6 +33,7 @@ ROUTERS: Tuple[APIRouter, ...] = (
     users_router,
     tweets_router,
     media_router,
+    tags_router,
 )
 
 for router in ROUTERS:
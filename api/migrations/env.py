@@ -12,6 +12,7 @@ from alembic import context
 from alembic.runtime.environment import EnvironmentContext
 from models.schemas import Base
 from settings import settings
+from utils.partitions import is_partition_name
 
 ctx_var: ContextVar[dict[str, Any]] = ContextVar("ctx_var")
 
@@ -37,6 +38,44 @@ url = URL.create(
 config.set_main_option("sqlalchemy.URL", url.render_as_string(False))
 
 
+def include_name(name: str | None, type_: str, parent_names: dict[str, Any]) -> bool:
+    """Partitions are managed by PartitionController, not by migrations."""
+    if type_ == "table":
+        return not is_partition_name(name)
+
+    return True
+
+
+def include_object(
+    obj: Any,
+    name: str | None,
+    type_: str,
+    reflected: bool,
+    compare_to: Any,
+) -> bool:
+    """PostgreSQL adds foreign keys to each partition of a referenced table."""
+    if type_ == "foreign_key_constraint":
+        return not is_partition_name(obj.referred_table.name)
+
+    return True
+
+
+def configure_options() -> dict[str, Any]:
+    """
+    Index builds in migrations/helpers.py run outside transactions, so every
+    migration gets its own transaction. `-x concurrent_indexes=false` switches
+    them to plain blocking builds.
+    """
+    x_arguments = context.get_x_argument(as_dictionary=True)
+
+    return {
+        "transaction_per_migration": True,
+        "include_name": include_name,
+        "include_object": include_object,
+        "concurrent_indexes": x_arguments.get("concurrent_indexes", "true") != "false",
+    }
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -55,6 +94,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        **configure_options(),
     )
 
     with context.begin_transaction():
@@ -63,7 +103,11 @@ def run_migrations_offline() -> None:
 
 def do_run_migrations(connection: Connection) -> None:
     try:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            **configure_options(),
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -76,7 +120,11 @@ def do_run_migrations(connection: Connection) -> None:
             script=context_data["script"],
             **context_data["opts"],
         ):
-            context.configure(connection=connection, target_metadata=target_metadata)
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                **configure_options(),
+            )
             with context.begin_transaction():
                 context.run_migrations()
 
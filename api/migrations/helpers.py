@@ -0,0 +1,159 @@
+"""
+Online index operations for migrations.
+
+`CREATE INDEX CONCURRENTLY` does not block writes but cannot run inside a
+transaction, so the helpers run it in an autocommit block (env.py configures
+one transaction per migration). A failed or interrupted concurrent build leaves
+an INVALID index behind; on the next run it is dropped and built again, a valid
+index is kept as is.
+
+Pass `-x concurrent_indexes=false` to alembic to use plain blocking builds, e.g.
+on an empty database.
+
+Partitioned tables do not support concurrent builds: the index is created on
+the parent only (invalid), built concurrently on each partition and attached.
+It becomes valid when all partitions are attached; partitions created later get
+it from the parent.
+"""
+from typing import Any, Sequence
+
+from alembic import op
+from sqlalchemy import text
+
+INDEX_STATE_STMT = text(
+    """
+    SELECT x.indisvalid
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    WHERE i.relname = :index_name AND i.relnamespace = current_schema()::regnamespace
+    """,
+)
+
+PARTITIONS_STMT = text(
+    """
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table_name AS regclass)
+    ORDER BY c.relname
+    """,
+)
+
+
+def concurrent_indexes() -> bool:
+    return op.get_context().opts.get("concurrent_indexes", True)
+
+
+def index_is_valid(index_name: str) -> bool | None:
+    """True/False for valid/invalid index, None if index does not exist."""
+    return op.get_bind().scalar(INDEX_STATE_STMT, {"index_name": index_name})
+
+
+def create_index_concurrently(
+    index_name: str,
+    table_name: str,
+    columns: Sequence[Any],
+    unique: bool = False,
+    **kw: Any,
+) -> None:
+    context = op.get_context()
+
+    if not concurrent_indexes():
+        op.create_index(index_name, table_name, columns, unique=unique, **kw)
+        return
+
+    with context.autocommit_block():
+        if context.as_sql:
+            op.create_index(
+                index_name,
+                table_name,
+                columns,
+                unique=unique,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                **kw,
+            )
+            return
+
+        state = index_is_valid(index_name)
+
+        if state:
+            return
+
+        if state is False:
+            # Leftover of an interrupted build
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            unique=unique,
+            postgresql_concurrently=True,
+            **kw,
+        )
+
+        if not index_is_valid(index_name):
+            raise RuntimeError(f"Index {index_name} is not valid after build")
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    if not concurrent_indexes():
+        op.drop_index(index_name, table_name=table_name)
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def create_partitioned_index_concurrently(
+    index_name: str,
+    table_name: str,
+    definition: str,
+) -> None:
+    """
+    `definition` follows the table name in CREATE INDEX, e.g.
+    `USING gin (to_tsvector('simple', content))`.
+    """
+    context = op.get_context()
+
+    if not concurrent_indexes() or context.as_sql:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} {definition}",
+        )
+        return
+
+    with context.autocommit_block():
+        if index_is_valid(index_name):
+            return
+
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY {table_name} {definition}",
+        )
+
+        partitions = op.get_bind().scalars(PARTITIONS_STMT, {"table_name": table_name})
+
+        for partition_name in partitions.all():
+            partition_index = index_name.replace(table_name, partition_name, 1)
+            state = index_is_valid(partition_index)
+
+            if state is False:
+                # Leftover of an interrupted build
+                op.execute(f"DROP INDEX CONCURRENTLY {partition_index}")
+
+            if not state:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY {partition_index} "
+                    f"ON {partition_name} {definition}",
+                )
+
+            # Attaching an attached index does nothing
+            op.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}")
+
+        if not index_is_valid(index_name):
+            raise RuntimeError(f"Index {index_name} is not valid after build")
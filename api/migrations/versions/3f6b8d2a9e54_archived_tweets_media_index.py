@@ -0,0 +1,29 @@
+"""Archived tweets media index
+
+Revision ID: 3f6b8d2a9e54
+Revises: 5a9c2e7f4b13
+Create Date: 2026-10-18 22:15:36.595167
+
+"""
+from typing import Sequence, Union
+
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "3f6b8d2a9e54"
+down_revision: Union[str, None] = "5a9c2e7f4b13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        "ix_archived_tweets_media_ids",
+        "archived_tweets",
+        ["media_ids"],
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently("ix_archived_tweets_media_ids", "archived_tweets")
@@ -0,0 +1,33 @@
+"""Users name prefix index
+
+Revision ID: 5a9c2e7f4b13
+Revises: 7d1f3b9e6c42
+Create Date: 2026-10-19 01:12:36.418207
+
+pg_trgm is not required: typeahead matches name prefixes only, which a btree
+index with text_pattern_ops serves as a range scan.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "5a9c2e7f4b13"
+down_revision: Union[str, None] = "7d1f3b9e6c42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_concurrently(
+        "ix_users_name_prefix",
+        "users",
+        [sa.text("lower(name) text_pattern_ops")],
+        postgresql_where=sa.text("deleted_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently("ix_users_name_prefix", "users")
@@ -0,0 +1,40 @@
+"""Tweet media unique media
+
+Revision ID: 8b3d5f1c7a29
+Revises: 3f6b8d2a9e54
+Create Date: 2026-10-19 09:41:12.503817
+
+A media item is attached to one tweet. Legacy rows attaching it to several
+tweets are removed first, the earliest attachment of each media is kept.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "8b3d5f1c7a29"
+down_revision: Union[str, None] = "3f6b8d2a9e54"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        DELETE FROM tweet_media AS later
+        USING tweet_media AS earlier
+        WHERE later.media_id = earlier.media_id AND later.id > earlier.id
+        """,
+    )
+    create_index_concurrently(
+        "ix_tweet_media_media_id",
+        "tweet_media",
+        ["media_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    drop_index_concurrently("ix_tweet_media_media_id", "tweet_media")
@@ -0,0 +1,49 @@
+"""Follow maps store user ids only
+
+Revision ID: 8c41e27d5f03
+Revises: 3b9d7f0c51a2
+Create Date: 2026-10-18 11:04:27.190844
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c41e27d5f03"
+down_revision: Union[str, None] = "3b9d7f0c51a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOLLOW_COLUMNS = ("followers", "following")
+
+
+def upgrade() -> None:
+    # {"<id>": "<name>"} -> [<id>, ...]
+    for column in FOLLOW_COLUMNS:
+        op.execute(
+            f"""
+            UPDATE users
+            SET {column} = (
+                SELECT coalesce(json_agg(key::bigint), '[]'::json)
+                FROM json_object_keys(users.{column}) AS key
+            )
+            WHERE json_typeof({column}) = 'object'
+            """
+        )
+
+
+def downgrade() -> None:
+    # [<id>, ...] -> {"<id>": "<name>"}
+    for column in FOLLOW_COLUMNS:
+        op.execute(
+            f"""
+            UPDATE users
+            SET {column} = (
+                SELECT coalesce(json_object_agg(u.id::text, u.name), '{{}}'::json)
+                FROM json_array_elements_text(users.{column}) AS item
+                JOIN users AS u ON u.id = item::bigint
+            )
+            WHERE json_typeof({column}) = 'array'
+            """
+        )
@@ -0,0 +1,51 @@
+"""Created at of tweets, likes and media
+
+Revision ID: 8f2c6d4b1a53
+Revises: 1d9b5e3a7f48
+Create Date: 2026-10-18 23:12:35.604127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "8f2c6d4b1a53"
+down_revision: Union[str, None] = "1d9b5e3a7f48"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("tweets", "likes", "media")
+
+
+def upgrade() -> None:
+    # now() is stable, existing rows get the migration time without a rewrite
+    for table_name in TABLES:
+        op.add_column(
+            table_name,
+            sa.Column(
+                "created_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.text("now()"),
+                nullable=False,
+            ),
+        )
+
+    for table_name in TABLES:
+        create_index_concurrently(
+            f"ix_{table_name}_created_at",
+            table_name,
+            ["created_at"],
+            postgresql_using="brin",
+        )
+
+
+def downgrade() -> None:
+    for table_name in reversed(TABLES):
+        drop_index_concurrently(f"ix_{table_name}_created_at", table_name)
+
+    for table_name in reversed(TABLES):
+        op.drop_column(table_name, "created_at")
@@ -0,0 +1,30 @@
+"""Secondary indexes
+
+Revision ID: 9d4e6b2a7c10
+Revises: 5f2a9c7d1e84
+Create Date: 2026-10-18 15:21:09.734518
+
+"""
+from typing import Sequence, Union
+
+from migrations.helpers import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4e6b2a7c10"
+down_revision: Union[str, None] = "5f2a9c7d1e84"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_concurrently("ix_tokens_user_id", "tokens", ["user_id"])
+    create_index_concurrently("ix_tweets_author_id", "tweets", ["author_id"])
+    create_index_concurrently("ix_likes_tweet_id", "likes", ["tweet_id"])
+    create_index_concurrently("ix_tweet_media_tweet_id", "tweet_media", ["tweet_id"])
+
+
+def downgrade() -> None:
+    drop_index_concurrently("ix_tweet_media_tweet_id", "tweet_media")
+    drop_index_concurrently("ix_likes_tweet_id", "likes")
+    drop_index_concurrently("ix_tweets_author_id", "tweets")
+    drop_index_concurrently("ix_tokens_user_id", "tokens")
@@ -0,0 +1,192 @@
+"""Partition tweets and likes by id range
+
+Revision ID: b3e8d1f6a2c7
+Revises: 8f2c6d4b1a53
+Create Date: 2026-10-18 23:48:02.517390
+
+Existing tables become the `legacy` partitions of new partitioned tables, rows
+are not copied. The legacy range ends at the partition bound following the
+current time, later partitions are created by PartitionController.
+
+Bound checks are validated before ATTACH, so it does not scan the tables under
+an exclusive lock; foreign keys to tweets are re-created NOT VALID and
+validated separately for the same reason.
+"""
+import time
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+from utils.partitions import partition_scheme
+from utils.snowflake import snowflake
+
+# revision identifiers, used by Alembic.
+revision: str = "b3e8d1f6a2c7"
+down_revision: Union[str, None] = "8f2c6d4b1a53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Table: (partition key, constraints, indexes), renamed for the legacy partition
+TABLES = {
+    "tweets": (
+        "id",
+        ("tweets_pkey",),
+        (
+            "ix_tweets_id",
+            "ix_tweets_author_id",
+            "ix_tweets_deleted_at",
+            "ix_tweets_created_at",
+        ),
+    ),
+    "likes": (
+        "tweet_id",
+        ("likes_pkey", "_user_tweet_uc"),
+        ("ix_likes_tweet_id", "ix_likes_created_at"),
+    ),
+}
+
+PARENT_DDL = {
+    "tweets": (
+        "ALTER TABLE tweets ADD CONSTRAINT tweets_pkey PRIMARY KEY (id)",
+        "ALTER TABLE tweets ADD CONSTRAINT tweets_author_id_fkey "
+        "FOREIGN KEY (author_id) REFERENCES users (id) ON DELETE SET NULL",
+        "CREATE UNIQUE INDEX ix_tweets_id ON tweets (id)",
+        "CREATE INDEX ix_tweets_author_id ON tweets (author_id)",
+        "CREATE INDEX ix_tweets_deleted_at ON tweets (deleted_at) "
+        "WHERE deleted_at IS NOT NULL",
+        "CREATE INDEX ix_tweets_created_at ON tweets USING brin (created_at)",
+    ),
+    "likes": (
+        "ALTER TABLE likes ADD CONSTRAINT likes_pkey "
+        "PRIMARY KEY (id, user_id, tweet_id)",
+        "ALTER TABLE likes ADD CONSTRAINT _user_tweet_uc UNIQUE (user_id, tweet_id)",
+        "ALTER TABLE likes ADD CONSTRAINT likes_user_id_fkey "
+        "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE",
+        "ALTER TABLE likes ADD CONSTRAINT likes_tweet_id_fkey "
+        "FOREIGN KEY (tweet_id) REFERENCES tweets (id) ON DELETE CASCADE",
+        "CREATE INDEX ix_likes_tweet_id ON likes (tweet_id)",
+        "CREATE INDEX ix_likes_created_at ON likes USING brin (created_at)",
+    ),
+}
+
+# Foreign keys to tweets: referencing table
+TWEETS_REFERENCES = ("likes", "tweet_media", "tweet_like_counters")
+
+
+def point_tweets_references(table_names: Sequence[str], validate: bool) -> None:
+    for table_name in table_names:
+        fkey = f"{table_name}_tweet_id_fkey"
+
+        op.execute(
+            f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {fkey}, "
+            f"ADD CONSTRAINT {fkey} FOREIGN KEY (tweet_id) REFERENCES tweets (id) "
+            f"ON DELETE CASCADE{' NOT VALID' if validate else ''}",
+        )
+
+        if validate:
+            op.execute(f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {fkey}")
+
+
+def rename_to_legacy(table_name: str) -> str:
+    _, constraints, indexes = TABLES[table_name]
+    legacy_table = f"{table_name}_legacy"
+
+    op.execute(f"ALTER TABLE {table_name} RENAME TO {legacy_table}")
+
+    for name in constraints:
+        op.execute(
+            f"ALTER TABLE {legacy_table} RENAME CONSTRAINT {name} TO {name}_legacy",
+        )
+
+    for name in indexes:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+
+    return legacy_table
+
+
+def rename_from_legacy(table_name: str) -> None:
+    _, constraints, indexes = TABLES[table_name]
+    legacy_table = f"{table_name}_legacy"
+
+    for name in constraints:
+        op.execute(
+            f"ALTER TABLE {legacy_table} RENAME CONSTRAINT {name}_legacy TO {name}",
+        )
+
+    for name in indexes:
+        op.execute(f"ALTER INDEX {name}_legacy RENAME TO {name}")
+
+    op.execute(f"ALTER TABLE {legacy_table} RENAME TO {table_name}")
+
+
+def partition(table_name: str, legacy_upper: int) -> None:
+    key, _, _ = TABLES[table_name]
+    legacy_table = rename_to_legacy(table_name)
+
+    op.execute(
+        f"CREATE TABLE {table_name} (LIKE {legacy_table} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({key})",
+    )
+    op.execute(f"ALTER SEQUENCE {table_name}_id_seq OWNED BY {table_name}.id")
+
+    for stmt in PARENT_DDL[table_name]:
+        op.execute(stmt)
+
+    check = f"{legacy_table}_bound"
+    op.execute(
+        f"ALTER TABLE {legacy_table} ADD CONSTRAINT {check} "
+        f"CHECK ({key} < {legacy_upper}) NOT VALID",
+    )
+    op.execute(f"ALTER TABLE {legacy_table} VALIDATE CONSTRAINT {check}")
+    # Indexes and foreign keys of the partition are attached to the parent ones
+    op.execute(
+        f"ALTER TABLE {table_name} ATTACH PARTITION {legacy_table} "
+        f"FOR VALUES FROM (MINVALUE) TO ({legacy_upper})",
+    )
+    op.execute(f"ALTER TABLE {legacy_table} DROP CONSTRAINT {check}")
+
+
+def unpartition(table_name: str) -> None:
+    legacy_table = f"{table_name}_legacy"
+
+    op.execute(f"ALTER TABLE {table_name} DETACH PARTITION {legacy_table}")
+    op.execute(f"INSERT INTO {legacy_table} SELECT * FROM {table_name}")
+    op.execute(f"ALTER SEQUENCE {table_name}_id_seq OWNED BY {legacy_table}.id")
+    op.execute(f"DROP TABLE {table_name}")
+
+    rename_from_legacy(table_name)
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql:
+        max_id = 0
+    else:
+        max_id = op.get_bind().scalar(text("SELECT coalesce(max(id), 0) FROM tweets"))
+
+    legacy_upper = partition_scheme.next_bound(
+        max(max_id, snowflake.min_id(time.time_ns() // 1_000_000)),
+    )
+
+    # Unique constraints of partitioned tables must include the partition key
+    op.execute("ALTER TABLE likes DROP CONSTRAINT likes_id_key")
+
+    partition("tweets", legacy_upper)
+    # Before likes are partitioned, their foreign key is attached as is
+    point_tweets_references(TWEETS_REFERENCES, validate=True)
+    partition("likes", legacy_upper)
+
+
+def downgrade() -> None:
+    # Partitioned tweets cannot be dropped while referenced; the foreign key of
+    # likes also goes before DETACH, which fails on keys attached by ATTACH
+    for table_name in TWEETS_REFERENCES:
+        op.execute(
+            f"ALTER TABLE {table_name} DROP CONSTRAINT {table_name}_tweet_id_fkey",
+        )
+
+    unpartition("likes")
+    unpartition("tweets")
+    point_tweets_references(TWEETS_REFERENCES, validate=False)
+
+    op.execute("ALTER TABLE likes ADD CONSTRAINT likes_id_key UNIQUE (id)")
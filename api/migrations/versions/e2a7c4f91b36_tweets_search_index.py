@@ -0,0 +1,31 @@
+"""Full-text search index of tweets
+
+Revision ID: e2a7c4f91b36
+Revises: 4c9a7e2d5b18
+Create Date: 2026-10-19 00:41:27.950218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import create_partitioned_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c4f91b36"
+down_revision: Union[str, None] = "4c9a7e2d5b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Writes to tweets are not blocked while partitions are indexed
+    create_partitioned_index_concurrently(
+        "ix_tweets_content_tsv",
+        "tweets",
+        "USING gin (to_tsvector('simple', content))",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tweets_content_tsv", table_name="tweets")
@@ -1,8 +1,44 @@
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from logging import getLogger
-from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Sequence
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Sequence, Set, Tuple
 
-from sqlalchemy import MetaData, inspect, make_url, select
+from sqlalchemy import (
+    CTE,
+    Exists,
+    MetaData,
+    Row,
+    Select,
+    SmallInteger,
+    String,
+    and_,
+    any_,
+    bindparam,
+    cast,
+    column,
+    delete,
+    exists,
+    func,
+    inspect,
+    literal,
+    make_url,
+    null,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import (
+    ARRAY,
+    BIGINT,
+    JSON,
+    REAL,
+    aggregate_order_by,
+    array,
+    insert,
+)
 from sqlalchemy.engine.url import URL
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
@@ -15,7 +51,27 @@ from sqlalchemy.orm import joinedload, load_only, noload
 from sqlalchemy.util import FacadeDict
 
 from models.mixins import CRUDMixin
-from models.schemas import Base, Like, Media, Token, Tweet, TweetMedia, User
+from models.schemas import (
+    TWEETS_SEARCH_CONFIG,
+    AccountDeletion,
+    ArchivedTweet,
+    Base,
+    IdempotencyKey,
+    Like,
+    Media,
+    SnowflakeWorker,
+    Token,
+    Tweet,
+    TweetLikeCounter,
+    TweetMedia,
+    TweetMention,
+    TweetTag,
+    User,
+    UserSuggestion,
+)
+from utils.entities import extract_mentions, extract_tags
+from utils.partitions import Partition, is_partition_name, parse_partition
+from utils.snowflake import snowflake
 
 
 class DatabaseAsyncSessionManager:
@@ -148,6 +204,11 @@ class DatabaseAsyncSessionManager:
         return f"{name}[{driver}]:{database}"
 
 
+def archived_media() -> Exists:
+    """Media is listed by an archived tweet (served by ix_archived_tweets_media_ids)."""
+    return exists().where(ArchivedTweet.media_ids.contains(array([Media.id])))
+
+
 class TweetManager(CRUDMixin):
     table = Tweet
 
@@ -156,8 +217,14 @@ class TweetManager(CRUDMixin):
         async_session: AsyncSession,
         order_by: Any | None = None,
         limit: int = CRUDMixin.default_limit,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        min_id: int | None = None,
+        legacy_upper: int = 0,
     ) -> Sequence[Tweet]:
         """
+        Tweets created in [`since`, `until`) if set. With `min_id` only ids from
+        it or below `legacy_upper` are read, so older partitions are skipped.
         Loaded fields:
         id, content, author(id, name), likes(user_id, name), attachments(id)
         """
@@ -175,8 +242,23 @@ class TweetManager(CRUDMixin):
             .load_only(Media.id, Media.file),
         ]
 
+        where = [
+            Tweet.deleted_at.is_(None),
+            Tweet.author.has(User.deleted_at.is_(None)),
+        ]
+
+        if since is not None:
+            where.append(Tweet.created_at >= since)
+
+        if until is not None:
+            where.append(Tweet.created_at < until)
+
+        if min_id is not None:
+            where.append(or_(Tweet.id < legacy_upper, Tweet.id >= min_id))
+
         stmt = (
             select(self.table)
+            .where(*where)
             .options(*options)
             .order_by(order_by or self.table.id)
             .limit(limit)
@@ -188,93 +270,179 @@ class TweetManager(CRUDMixin):
 
         return result
 
-    async def get_tweet_with_author_id(
+    async def search(
         self,
         async_session: AsyncSession,
-        tweet_id: int,
-        order_by: Any | None = None,
+        query: str,
         limit: int = CRUDMixin.default_limit,
-    ) -> Tweet | None:
+        after: Tuple[float, int] | None = None,
+    ) -> List[Tuple[Tweet, float]]:
         """
+        Tweets matching web search syntax `query`, best ranked first, with
+        their rank. `after` is (rank, id) of the last tweet of previous page.
         Loaded fields:
-        id, author_id, author(id)
+        id, content, author(id, name), likes(user_id, name), attachments(id)
         """
         options = [
-            load_only(Tweet.id, Tweet.author_id),
-            joinedload(Tweet.author).load_only(User.id).noload(User.tweets),
-            joinedload(Tweet.author).noload(User.token),
+            joinedload(Tweet.author).load_only(User.id, User.name),
+            joinedload(Tweet.author).noload(User.tweets),
             joinedload(Tweet.author).noload(User.tweets_likes),
-            noload(Tweet.likers),
-            noload(Tweet.attachments),
+            joinedload(Tweet.author).noload(User.token),
+            joinedload(Tweet.likers).joinedload(Like.liker).load_only(User.id, User.name),
+            joinedload(Tweet.likers).joinedload(Like.liker).noload(User.tweets),
+            joinedload(Tweet.likers).joinedload(Like.liker).noload(User.tweets_likes),
+            joinedload(Tweet.likers).joinedload(Like.liker).noload(User.token),
+            joinedload(Tweet.attachments)
+            .joinedload(TweetMedia.media_item)
+            .load_only(Media.id, Media.file),
+        ]
+
+        # Same expression as ix_tweets_content_tsv, so the index is used
+        vector = func.to_tsvector(TWEETS_SEARCH_CONFIG, Tweet.content)
+        tsquery = func.websearch_to_tsquery(TWEETS_SEARCH_CONFIG, query)
+        rank = func.ts_rank(vector, tsquery)
+
+        where = [
+            vector.op("@@")(tsquery),
+            Tweet.deleted_at.is_(None),
+            Tweet.author.has(User.deleted_at.is_(None)),
         ]
 
+        if after is not None:
+            after_rank, after_id = after
+            where.append(
+                tuple_(rank, Tweet.id) < tuple_(cast(after_rank, REAL), after_id),
+            )
+
         stmt = (
-            select(self.table)
-            .where(Tweet.id == tweet_id)
+            select(Tweet, rank)
+            .where(*where)
             .options(*options)
-            .order_by(order_by or self.table.id)
+            .order_by(rank.desc(), Tweet.id.desc())
             .limit(limit)
         )
 
-        result = await async_session.scalar(stmt)
+        result = await async_session.execute(stmt)
+        result = [(tweet, tweet_rank) for tweet, tweet_rank in result.unique().all()]
         await async_session.commit()
-        return result
 
+        return result
 
-class UserManager(CRUDMixin):
-    table = User
+    async def get_tagged(
+        self,
+        async_session: AsyncSession,
+        tag: str,
+        limit: int = CRUDMixin.default_limit,
+        before: int | None = None,
+    ) -> Sequence[Tweet]:
+        """
+        Tweets with lowercase `tag`, newest first, with ids below `before`.
+        Loaded fields:
+        id, content, author(id, name), likes(user_id, name), attachments(id)
+        """
+        return await self.__get_indexed(
+            async_session,
+            TweetTag.tweet_id,
+            TweetTag.tag == tag,
+            limit,
+            before,
+        )
 
-    async def get_user_detail(
+    async def get_mentioning(
         self,
         async_session: AsyncSession,
         user_id: int,
-        order_by: Any | None = None,
         limit: int = CRUDMixin.default_limit,
-    ) -> User | None:
+        before: int | None = None,
+    ) -> Sequence[Tweet]:
         """
+        Tweets mentioning `user_id`, newest first, with ids below `before`.
         Loaded fields:
-        id, name, following, followers
+        id, content, author(id, name), likes(user_id, name), attachments(id)
         """
+        return await self.__get_indexed(
+            async_session,
+            TweetMention.tweet_id,
+            TweetMention.user_id == user_id,
+            limit,
+            before,
+        )
+
+    async def __get_indexed(
+        self,
+        async_session: AsyncSession,
+        tweet_id: Any,
+        key: Any,
+        limit: int,
+        before: int | None,
+    ) -> Sequence[Tweet]:
         options = [
-            load_only(User.id, User.name, User.following, User.followers),
-            noload(User.tweets),
-            noload(User.token),
-            noload(User.tweets_likes),
+            joinedload(Tweet.author).load_only(User.id, User.name),
+            joinedload(Tweet.author).noload(User.tweets),
+            joinedload(Tweet.author).noload(User.tweets_likes),
+            joinedload(Tweet.author).noload(User.token),
+            joinedload(Tweet.likers).joinedload(Like.liker).load_only(User.id, User.name),
+            joinedload(Tweet.likers).joinedload(Like.liker).noload(User.tweets),
+            joinedload(Tweet.likers).joinedload(Like.liker).noload(User.tweets_likes),
+            joinedload(Tweet.likers).joinedload(Like.liker).noload(User.token),
+            joinedload(Tweet.attachments)
+            .joinedload(TweetMedia.media_item)
+            .load_only(Media.id, Media.file),
+        ]
+
+        where = [
+            key,
+            Tweet.deleted_at.is_(None),
+            Tweet.author.has(User.deleted_at.is_(None)),
         ]
 
+        if before is not None:
+            where.append(tweet_id < before)
+
+        # Backward range scan of the (key, tweet_id) primary key, stopped by LIMIT
+        page = (
+            select(tweet_id)
+            .join(Tweet, Tweet.id == tweet_id)
+            .where(*where)
+            .order_by(tweet_id.desc())
+            .limit(limit)
+        )
         stmt = (
             select(self.table)
-            .where(User.id == user_id)
+            .where(self.table.id.in_(page.scalar_subquery()))
             .options(*options)
-            .order_by(order_by or self.table.id)
-            .limit(limit)
+            .order_by(self.table.id.desc())
         )
 
-        result = await async_session.scalar(stmt)
+        result = await async_session.scalars(stmt)
+        result = result.unique().all()
         await async_session.commit()
+
         return result
 
-    async def get_user_by_api_key(
+    async def get_tweet_with_author_id(
         self,
-        api_key: str,
         async_session: AsyncSession,
+        tweet_id: int,
         order_by: Any | None = None,
         limit: int = CRUDMixin.default_limit,
-    ) -> User | None:
+    ) -> Tweet | None:
         """
         Loaded fields:
-        id, name, following, followers, token(api_key)
+        id, author_id, author(id)
         """
         options = [
-            load_only(User.id, User.name, User.following, User.followers),
-            joinedload(User.token).load_only(Token.api_key),
-            noload(User.tweets),
-            noload(User.tweets_likes),
+            load_only(Tweet.id, Tweet.author_id),
+            joinedload(Tweet.author).load_only(User.id).noload(User.tweets),
+            joinedload(Tweet.author).noload(User.token),
+            joinedload(Tweet.author).noload(User.tweets_likes),
+            noload(Tweet.likers),
+            noload(Tweet.attachments),
         ]
 
         stmt = (
             select(self.table)
-            .where(User.token.has(api_key=api_key))
+            .where(Tweet.id == tweet_id, Tweet.deleted_at.is_(None))
             .options(*options)
             .order_by(order_by or self.table.id)
             .limit(limit)
@@ -284,45 +452,1515 @@ class UserManager(CRUDMixin):
         await async_session.commit()
         return result
 
+    async def delete_own_tweet(
+        self,
+        async_session: AsyncSession,
+        tweet_id: int,
+        author_id: int,
+    ) -> bool:
+        """Soft delete tweet only if it belongs to `author_id`."""
+        stmt = (
+            update(Tweet)
+            .where(
+                Tweet.id == tweet_id,
+                Tweet.author_id == author_id,
+                Tweet.deleted_at.is_(None),
+            )
+            .values(deleted_at=func.now())
+            .returning(Tweet.id)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
 
-class LikeManager(CRUDMixin):
-    table = Like
+        return result.scalar() is not None
 
+    async def add_with_media(
+        self,
+        async_session: AsyncSession,
+        author_id: int,
+        content: str,
+        media_ids: List[int],
+    ) -> Tuple[int | None, List[int]]:
+        """
+        Insert tweet with its attachments in one statement. Media of other users
+        or already attached to a tweet are rejected, then nothing is saved. An
+        attached media is detected by the unique `tweet_media.media_id` index,
+        so a concurrent tweet cannot attach the same media.
+        Returns (id of the new tweet or None, sorted ids of rejected media).
+        """
+        tweet = (
+            insert(Tweet)
+            .values(id=snowflake.next_id(), author_id=author_id, content=content)
+            .returning(Tweet.id)
+            .cte("tweet")
+        )
+        attached = (
+            insert(TweetMedia)
+            .from_select(
+                ["tweet_id", "media_id"],
+                select(select(tweet.c.id).scalar_subquery(), Media.id).where(
+                    Media.id == any_(bindparam("media_ids", media_ids, ARRAY(BIGINT))),
+                    or_(Media.owner_id == author_id, Media.owner_id.is_(None)),
+                    ~archived_media(),
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=["media_id"])
+            .returning(TweetMedia.media_id)
+            .cte("attached")
+        )
 
-class TweetMediaManager(CRUDMixin):
-    table = TweetMedia
+        stmt = select(
+            tweet.c.id,
+            select(func.array_agg(attached.c.media_id)).scalar_subquery(),
+        )
 
+        result = await async_session.execute(stmt)
+        tweet_id, attached_ids = result.tuples().one()
 
-class MediaManager(CRUDMixin):
-    table = Media
+        rejected_ids = sorted(set(media_ids) - set(attached_ids or ()))
 
-    async def get_media(
+        if rejected_ids:
+            await async_session.rollback()
+            return None, rejected_ids
+
+        await self.__add_entities(async_session, [(tweet_id, content)])
+        await async_session.commit()
+        return tweet_id, []
+
+    async def add_batch(
+        self,
+        async_session: AsyncSession,
+        rows: List[Tuple[int, str]],
+    ) -> List[int]:
+        """
+        Insert `(author_id, content)` tweets without media with one multi-row
+        INSERT and one commit. Returns ids in order of `rows`.
+        """
+        tweet_ids = snowflake.next_ids(len(rows))
+
+        stmt = insert(Tweet).values(
+            [
+                {"id": tweet_id, "author_id": author_id, "content": content}
+                for tweet_id, (author_id, content) in zip(tweet_ids, rows)
+            ],
+        )
+
+        await async_session.execute(stmt)
+        await self.__add_entities(
+            async_session,
+            [(tweet_id, content) for tweet_id, (_, content) in zip(tweet_ids, rows)],
+        )
+        await async_session.commit()
+        return tweet_ids
+
+    async def add_many(
+        self,
+        async_session: AsyncSession,
+        rows: List[Tuple[int, str, List[int]]],
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Insert `(author_id, content, media_ids)` tweets with their attachments in
+        one transaction. Ids are generated first, so all tweets and all
+        attachments are inserted with one statement each. Media are checked
+        as in `add_with_media`, a media id repeated in the batch is rejected.
+        Returns (ids of new tweets in order of `rows` or [], rejected media ids).
+        """
+        tweet_ids = snowflake.next_ids(len(rows))
+
+        await async_session.execute(
+            insert(Tweet),
+            [
+                {"id": tweet_id, "author_id": author_id, "content": content}
+                for tweet_id, (author_id, content, _) in zip(tweet_ids, rows)
+            ],
+        )
+
+        attachments, seen, rejected_ids = [], set(), set()
+
+        for tweet_id, (author_id, _, media_ids) in zip(tweet_ids, rows):
+            for media_id in dict.fromkeys(media_ids):
+                if media_id in seen:
+                    rejected_ids.add(media_id)
+                else:
+                    seen.add(media_id)
+                    attachments.append((tweet_id, author_id, media_id))
+
+        if attachments:
+            requested = values(
+                column("tweet_id", BIGINT),
+                column("author_id", BIGINT),
+                column("media_id", BIGINT),
+                name="requested",
+            ).data(attachments)
+
+            stmt = (
+                insert(TweetMedia)
+                .from_select(
+                    ["tweet_id", "media_id"],
+                    select(requested.c.tweet_id, Media.id)
+                    .join(Media, Media.id == requested.c.media_id)
+                    .where(
+                        or_(
+                            Media.owner_id == requested.c.author_id,
+                            Media.owner_id.is_(None),
+                        ),
+                        ~archived_media(),
+                    ),
+                )
+                .on_conflict_do_nothing(index_elements=["media_id"])
+                .returning(TweetMedia.media_id)
+            )
+
+            attached_ids = set((await async_session.scalars(stmt)).all())
+            rejected_ids |= seen - attached_ids
+
+        if rejected_ids:
+            await async_session.rollback()
+            return [], sorted(rejected_ids)
+
+        await self.__add_entities(
+            async_session,
+            [(tweet_id, content) for tweet_id, (_, content, _) in zip(tweet_ids, rows)],
+        )
+        await async_session.commit()
+        return tweet_ids, []
+
+    @staticmethod
+    async def __add_entities(
+        async_session: AsyncSession,
+        tweets: List[Tuple[int, str]],
+    ) -> None:
+        """
+        Index hashtags and mentions of `(tweet_id, content)` tweets in the
+        current transaction. Names of missing or deleted users are skipped.
+        """
+        tags, mentions = [], []
+
+        for tweet_id, content in tweets:
+            tags.extend(
+                {"tag": tag, "tweet_id": tweet_id} for tag in extract_tags(content)
+            )
+            mentions.extend((name, tweet_id) for name in extract_mentions(content))
+
+        if tags:
+            await async_session.execute(insert(TweetTag), tags)
+
+        if mentions:
+            mentioned = values(
+                column("name", String),
+                column("tweet_id", BIGINT),
+                name="mentioned",
+            ).data(mentions)
+
+            stmt = insert(TweetMention).from_select(
+                ["user_id", "tweet_id"],
+                select(User.id, mentioned.c.tweet_id)
+                .join(mentioned, User.name == mentioned.c.name)
+                .where(User.deleted_at.is_(None)),
+            )
+            await async_session.execute(stmt)
+
+    async def delete_author_tweets(
+        self,
+        async_session: AsyncSession,
+        author_id: int,
+        limit: int,
+    ) -> List[int]:
+        """
+        Soft delete up to `limit` tweets of `author_id`, returns their ids.
+        Already soft deleted tweets are returned again until purged.
+        """
+        batch = select(Tweet.id).where(Tweet.author_id == author_id).limit(limit)
+        stmt = (
+            update(Tweet)
+            .where(Tweet.id.in_(batch))
+            .values(deleted_at=func.coalesce(Tweet.deleted_at, func.now()))
+            .returning(Tweet.id)
+        )
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+
+        return list(result.all())
+
+    async def get_deleted_ids(
         self,
         async_session: AsyncSession,
-        media_ids: List[int],
-        order_by: Any | None = None,
         limit: int = CRUDMixin.default_limit,
-    ) -> Sequence[Media]:
+    ) -> Sequence[int]:
         """
         Loaded fields:
-        id, file
+        id of soft deleted tweets, oldest first
         """
-        options = [
-            load_only(Media.id, Media.file),
-            noload(Media.tweet_item),
-        ]
-
         stmt = (
-            select(self.table)
-            .where(Media.id.in_(media_ids))
-            .options(*options)
-            .order_by(order_by or self.table.id)
+            select(Tweet.id)
+            .where(Tweet.deleted_at.is_not(None))
+            .order_by(Tweet.deleted_at)
             .limit(limit)
         )
 
         result = await async_session.scalars(stmt)
         await async_session.commit()
-        return result.unique().all()
+
+        return result.all()
+
+    async def expire_tweets(
+        self,
+        async_session: AsyncSession,
+        older_than: timedelta,
+        limit: int,
+    ) -> int:
+        """
+        Soft delete up to `limit` tweets created more than `older_than` ago,
+        returns number of deleted.
+        """
+        batch = (
+            select(Tweet.id)
+            .where(
+                Tweet.created_at < func.now() - older_than,
+                Tweet.deleted_at.is_(None),
+            )
+            .limit(limit)
+        )
+        stmt = (
+            update(Tweet)
+            .where(Tweet.id.in_(batch))
+            .values(deleted_at=func.now())
+            .returning(Tweet.id)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return len(result.all())
+
+    async def purge_likes(
+        self,
+        async_session: AsyncSession,
+        tweet_ids: List[int] | Sequence[int],
+        limit: int,
+    ) -> int:
+        """Delete up to `limit` likes of `tweet_ids`, returns number of deleted."""
+        ids = bindparam("tweet_ids", tweet_ids, ARRAY(BIGINT))
+        batch = select(Like.id).where(Like.tweet_id == any_(ids)).limit(limit)
+        stmt = delete(Like).where(Like.id.in_(batch)).returning(Like.id)
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return len(result.all())
+
+    async def purge_media(
+        self,
+        async_session: AsyncSession,
+        tweet_ids: List[int] | Sequence[int],
+        limit: int,
+    ) -> Tuple[int, List[str | None]]:
+        """
+        Detach up to `limit` media from `tweet_ids` and delete the media that no
+        archived tweet lists; a media item is attached to one tweet only.
+        Returns the number of detached media and files of deleted ones.
+        """
+        ids = bindparam("tweet_ids", tweet_ids, ARRAY(BIGINT))
+        batch = select(TweetMedia.id).where(TweetMedia.tweet_id == any_(ids)).limit(limit)
+        detached = (
+            delete(TweetMedia)
+            .where(TweetMedia.id.in_(batch))
+            .returning(TweetMedia.media_id)
+            .cte("detached")
+        )
+        deleted = (
+            delete(Media)
+            .where(
+                Media.id.in_(select(detached.c.media_id)),
+                ~archived_media(),
+            )
+            .returning(Media.file)
+            .cte("deleted")
+        )
+        stmt = select(
+            select(func.count()).select_from(detached).scalar_subquery(),
+            select(func.array_agg(deleted.c.file)).scalar_subquery(),
+        )
+
+        result = await async_session.execute(stmt)
+        count, files = result.tuples().one()
+        await async_session.commit()
+
+        return count, list(files or ())
+
+    async def delete_purged(
+        self,
+        async_session: AsyncSession,
+        tweet_ids: List[int] | Sequence[int],
+    ) -> int:
+        """Delete soft deleted tweets of `tweet_ids` without likes and media left."""
+        stmt = (
+            delete(Tweet)
+            .where(
+                Tweet.id == any_(bindparam("tweet_ids", tweet_ids, ARRAY(BIGINT))),
+                Tweet.deleted_at.is_not(None),
+                ~exists().where(Like.tweet_id == Tweet.id),
+                ~exists().where(TweetMedia.tweet_id == Tweet.id),
+            )
+            .returning(Tweet.id)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return len(result.all())
+
+
+class ArchivedTweetManager(CRUDMixin):
+    table = ArchivedTweet
+
+    async def archive(
+        self,
+        async_session: AsyncSession,
+        older_than: timedelta,
+        limit: int,
+    ) -> int:
+        """
+        Move up to `limit` tweets created more than `older_than` ago to the
+        archive, returns number of moved. Likes, counters and media links
+        cascade, media rows are kept.
+        """
+        batch = (
+            select(Tweet.id)
+            .where(
+                Tweet.created_at < func.now() - older_than,
+                Tweet.deleted_at.is_(None),
+            )
+            .order_by(Tweet.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        moved = (
+            delete(Tweet)
+            .where(Tweet.id.in_(batch))
+            .returning(Tweet.id, Tweet.content, Tweet.author_id, Tweet.created_at)
+            .cte("moved")
+        )
+
+        # Subqueries see likes and media links before the cascade of the delete
+        liker_ids = (
+            select(func.array_agg(aggregate_order_by(Like.user_id, Like.user_id)))
+            .where(Like.tweet_id == moved.c.id)
+            .scalar_subquery()
+        )
+        counted = (
+            select(func.sum(TweetLikeCounter.count))
+            .where(TweetLikeCounter.tweet_id == moved.c.id)
+            .scalar_subquery()
+        )
+        media_ids = (
+            select(func.array_agg(aggregate_order_by(TweetMedia.media_id, TweetMedia.id)))
+            .where(TweetMedia.tweet_id == moved.c.id)
+            .scalar_subquery()
+        )
+        empty = literal([], ARRAY(BIGINT))
+
+        stmt = (
+            insert(ArchivedTweet)
+            .from_select(
+                [
+                    ArchivedTweet.id,
+                    ArchivedTweet.content,
+                    ArchivedTweet.author_id,
+                    ArchivedTweet.created_at,
+                    ArchivedTweet.likes_count,
+                    ArchivedTweet.liker_ids,
+                    ArchivedTweet.media_ids,
+                ],
+                select(
+                    moved.c.id,
+                    moved.c.content,
+                    moved.c.author_id,
+                    moved.c.created_at,
+                    func.coalesce(counted, func.cardinality(liker_ids), 0),
+                    func.coalesce(liker_ids, empty),
+                    func.coalesce(media_ids, empty),
+                ),
+            )
+            .returning(ArchivedTweet.id)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return len(result.all())
+
+    async def get_tweets(
+        self,
+        async_session: AsyncSession,
+        limit: int = CRUDMixin.default_limit,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> Sequence[ArchivedTweet]:
+        """
+        Archived tweets created in [`since`, `until`) if set.
+        Loaded fields:
+        id, content, author(id, name), likes_count, liker_ids, media_ids
+        """
+        options = [
+            joinedload(ArchivedTweet.author).load_only(User.id, User.name),
+            joinedload(ArchivedTweet.author).noload(User.tweets),
+            joinedload(ArchivedTweet.author).noload(User.tweets_likes),
+            joinedload(ArchivedTweet.author).noload(User.token),
+        ]
+
+        where = [ArchivedTweet.author.has(User.deleted_at.is_(None))]
+
+        if since is not None:
+            where.append(ArchivedTweet.created_at >= since)
+
+        if until is not None:
+            where.append(ArchivedTweet.created_at < until)
+
+        stmt = (
+            select(ArchivedTweet)
+            .where(*where)
+            .options(*options)
+            .order_by(ArchivedTweet.id)
+            .limit(limit)
+        )
+
+        result = await async_session.scalars(stmt)
+        result = result.all()
+        await async_session.commit()
+
+        return result
+
+    async def delete_tweets(
+        self,
+        async_session: AsyncSession,
+        where: List[Any],
+        limit: int,
+    ) -> Tuple[int, List[str | None]]:
+        """
+        Delete up to `limit` archived tweets matching `where` with their media
+        not used elsewhere, returns number of deleted tweets and files of
+        deleted media.
+        """
+        batch = select(ArchivedTweet.id).where(*where).limit(limit)
+        stmt = (
+            delete(ArchivedTweet)
+            .where(ArchivedTweet.id.in_(batch))
+            .returning(ArchivedTweet.media_ids)
+        )
+
+        media_ids = (await async_session.scalars(stmt)).all()
+        files = []
+
+        if any(media_ids):
+            ids = [media_id for ids in media_ids for media_id in ids]
+            # Media also attached to a live tweet or listed by another archived
+            # one are kept
+            result = await async_session.scalars(
+                delete(Media)
+                .where(
+                    Media.id == any_(bindparam("media_ids", ids, ARRAY(BIGINT))),
+                    ~exists().where(TweetMedia.media_id == Media.id),
+                    ~archived_media(),
+                )
+                .returning(Media.file),
+            )
+            files = list(result.all())
+
+        await async_session.commit()
+
+        return len(media_ids), files
+
+
+class UserManager(CRUDMixin):
+    table = User
+
+    async def get_user_detail(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        order_by: Any | None = None,
+        limit: int = CRUDMixin.default_limit,
+    ) -> User | None:
+        """
+        Loaded fields:
+        id, name, following, followers
+        """
+        options = [
+            load_only(User.id, User.name, User.following, User.followers),
+            noload(User.tweets),
+            noload(User.token),
+            noload(User.tweets_likes),
+        ]
+
+        stmt = (
+            select(self.table)
+            .where(User.id == user_id, User.deleted_at.is_(None))
+            .options(*options)
+            .order_by(order_by or self.table.id)
+            .limit(limit)
+        )
+
+        result = await async_session.scalar(stmt)
+        await async_session.commit()
+        return result
+
+    async def get_users_detail(
+        self,
+        async_session: AsyncSession,
+        user_ids: List[int],
+        with_deleted: bool = False,
+    ) -> Sequence[User]:
+        """
+        Loaded fields:
+        id, name, following, followers
+        """
+        options = [
+            load_only(User.id, User.name, User.following, User.followers),
+            noload(User.tweets),
+            noload(User.token),
+            noload(User.tweets_likes),
+        ]
+
+        stmt = select(self.table).where(User.id.in_(user_ids)).options(*options)
+
+        if not with_deleted:
+            stmt = stmt.where(User.deleted_at.is_(None))
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+        return result.unique().all()
+
+    async def update_follows(
+        self,
+        async_session: AsyncSession,
+        instances: List[Dict[str, Any]],
+    ) -> None:
+        """Write `followers` and `following` of many users in one statement."""
+        follows = values(
+            column("id", BIGINT),
+            column("followers", JSON),
+            column("following", JSON),
+            name="follows",
+        ).data(
+            [
+                (instance["id"], instance["followers"], instance["following"])
+                for instance in instances
+            ],
+        )
+
+        stmt = (
+            update(User)
+            .where(User.id == follows.c.id)
+            .values(followers=follows.c.followers, following=follows.c.following)
+        )
+
+        await async_session.execute(stmt)
+        await async_session.commit()
+
+    async def get_user_by_api_key(
+        self,
+        api_key: str,
+        async_session: AsyncSession,
+        order_by: Any | None = None,
+        limit: int = CRUDMixin.default_limit,
+    ) -> User | None:
+        """
+        Loaded fields:
+        id, name, following, followers, token(api_key)
+        """
+        options = [
+            load_only(User.id, User.name, User.following, User.followers),
+            joinedload(User.token).load_only(Token.api_key),
+            noload(User.tweets),
+            noload(User.tweets_likes),
+        ]
+
+        stmt = (
+            select(self.table)
+            .where(User.token.has(api_key=api_key))
+            .options(*options)
+            .order_by(order_by or self.table.id)
+            .limit(limit)
+        )
+
+        result = await async_session.scalar(stmt)
+        await async_session.commit()
+        return result
+
+    async def get_follow_edges(
+        self,
+        async_session: AsyncSession,
+    ) -> List[Tuple[int, int]]:
+        """
+        Loaded fields:
+        id, following
+        """
+        stmt = select(User.id, User.following)
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return [
+            (user_id, target_user_id)
+            for user_id, following in result
+            for target_user_id in following
+        ]
+
+    async def get_following(
+        self,
+        async_session: AsyncSession,
+        user_ids: List[int] | Sequence[int],
+    ) -> Dict[int, List[int]]:
+        """
+        Loaded fields:
+        id, following
+        """
+        stmt = select(User.id, User.following).where(User.id.in_(user_ids))
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return dict(result.tuples().all())
+
+    async def get_names(
+        self,
+        async_session: AsyncSession,
+        user_ids: List[int] | Sequence[int],
+    ) -> Dict[int, str]:
+        """
+        Loaded fields:
+        id, name
+        """
+        stmt = select(User.id, User.name).where(
+            User.id.in_(user_ids),
+            User.deleted_at.is_(None),
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return dict(result.tuples().all())
+
+    async def search_by_name(
+        self,
+        async_session: AsyncSession,
+        prefix: str,
+        limit: int = CRUDMixin.default_limit,
+    ) -> List[Tuple[int, str]]:
+        """
+        Live users whose lowercase name starts with lowercase `prefix`, in
+        byte order of lowercase names.
+        Loaded fields:
+        id, name
+        """
+        lower_name = func.lower(User.name)
+        where = [lower_name.op("~>=~")(prefix), User.deleted_at.is_(None)]
+
+        # Pattern operators compare UTF-8 bytes, i.e. code points: names with the
+        # prefix are below the prefix with its last character incremented.
+        # Unlike LIKE with a bound pattern, the range stays an index condition
+        # in generic plans of prepared statements.
+        next_code = ord(prefix[-1]) + 1
+
+        if 0xD800 <= next_code <= 0xDFFF:  # Surrogates are not encodable
+            next_code = 0xE000
+
+        if next_code <= 0x10FFFF:
+            where.append(lower_name.op("~<~")(prefix[:-1] + chr(next_code)))
+        else:
+            where.append(lower_name.startswith(prefix, autoescape=True))
+
+        stmt = (
+            select(User.id, User.name)
+            .where(*where)
+            # Order of ix_users_name_prefix, so LIMIT stops the index scan
+            .order_by(text("lower(users.name) USING ~<~"))
+            .limit(limit)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return list(result.tuples().all())
+
+    async def tombstone(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        stage: str,
+    ) -> bool:
+        """
+        Mark user deleted, drop the token and queue the account deletion from
+        `stage` in one transaction. Returns False if the user is already deleted.
+        """
+        stmt = (
+            update(User)
+            .where(User.id == user_id, User.deleted_at.is_(None))
+            .values(deleted_at=func.now())
+            .returning(User.id)
+        )
+
+        result = await async_session.execute(stmt)
+
+        if result.scalar() is None:
+            await async_session.rollback()
+            return False
+
+        await async_session.execute(delete(Token).where(Token.user_id == user_id))
+
+        stmt = insert(AccountDeletion).values(user_id=user_id, stage=stage)
+        await async_session.execute(stmt.on_conflict_do_nothing())
+        await async_session.commit()
+
+        return True
+
+
+class AccountDeletionManager(CRUDMixin):
+    table = AccountDeletion
+
+    async def get_pending(
+        self,
+        async_session: AsyncSession,
+        limit: int = CRUDMixin.default_limit,
+    ) -> Sequence[AccountDeletion]:
+        """
+        Loaded fields:
+        all of unfinished deletions, oldest first
+        """
+        stmt = (
+            select(AccountDeletion)
+            .where(AccountDeletion.finished_at.is_(None))
+            .order_by(AccountDeletion.requested_at)
+            .limit(limit)
+        )
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+
+        return result.all()
+
+    async def save_progress(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        stage: str,
+        finished: bool = False,
+        **removed: int,
+    ) -> None:
+        """Set `stage` and add `removed` row numbers (tweets, likes, follows)."""
+        changes = {
+            name: getattr(AccountDeletion, name) + count
+            for name, count in removed.items()
+        }
+
+        if finished:
+            changes["finished_at"] = func.now()
+
+        stmt = (
+            update(AccountDeletion)
+            .where(AccountDeletion.user_id == user_id)
+            .values(stage=stage, updated_at=func.now(), **changes)
+        )
+
+        await async_session.execute(stmt)
+        await async_session.commit()
+
+
+class UserSuggestionManager(CRUDMixin):
+    table = UserSuggestion
+
+    async def get_suggestions(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Loaded fields:
+        users(id, name) in stored order
+        """
+        stmt = (
+            select(User.id, User.name)
+            .join(UserSuggestion, User.id == any_(UserSuggestion.suggested_ids))
+            .where(UserSuggestion.user_id == user_id, User.deleted_at.is_(None))
+            .order_by(func.array_position(UserSuggestion.suggested_ids, User.id))
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return [{"id": row.id, "name": row.name} for row in result]
+
+    async def upsert(
+        self,
+        async_session: AsyncSession,
+        rows: List[Dict[str, Any]],
+    ) -> None:
+        if not rows:
+            return
+
+        # Users removed since the graph was read are skipped
+        suggestions = values(
+            column("user_id", BIGINT),
+            column("suggested_ids", ARRAY(BIGINT)),
+            name="suggestions",
+        ).data([(row["user_id"], row["suggested_ids"]) for row in rows])
+
+        stmt = insert(UserSuggestion).from_select(
+            ["user_id", "suggested_ids"],
+            select(suggestions.c.user_id, suggestions.c.suggested_ids).join(
+                User,
+                User.id == suggestions.c.user_id,
+            ),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserSuggestion.user_id],
+            set_={
+                "suggested_ids": stmt.excluded.suggested_ids,
+                "computed_at": func.now(),
+            },
+        )
+
+        await async_session.execute(stmt)
+        await async_session.commit()
+
+
+class LikeManager(CRUDMixin):
+    table = Like
+
+    @staticmethod
+    def __tweet_cte(tweet_id: int) -> CTE:
+        return (
+            select(Tweet.id)
+            .where(Tweet.id == tweet_id, Tweet.deleted_at.is_(None))
+            .cte("tweet")
+        )
+
+    @staticmethod
+    def __counter_cte(changed: Select, name: str) -> CTE:
+        """Upsert `(tweet_id, shard, delta)` rows of `changed` into like counters."""
+        stmt = insert(TweetLikeCounter).from_select(
+            ["tweet_id", "shard", "count"],
+            changed,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TweetLikeCounter.tweet_id, TweetLikeCounter.shard],
+            set_={"count": TweetLikeCounter.count + stmt.excluded.count},
+        )
+        return stmt.cte(name)
+
+    async def like(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        tweet_id: int,
+        shard: int = 0,
+    ) -> Tuple[bool, int | None]:
+        """
+        Insert like and increment counter `shard` in one statement.
+        Returns (tweet exists, id of the new like or None if it already exists).
+        """
+        tweet = self.__tweet_cte(tweet_id)
+
+        inserted = (
+            insert(Like)
+            .from_select(
+                ["user_id", "tweet_id"],
+                select(literal(user_id, BIGINT), tweet.c.id),
+            )
+            .on_conflict_do_nothing(constraint="_user_tweet_uc")
+            .returning(Like.id, Like.tweet_id)
+            .cte("inserted")
+        )
+        counted = self.__counter_cte(
+            select(inserted.c.tweet_id, literal(shard, SmallInteger), literal(1, BIGINT)),
+            "counted",
+        )
+
+        stmt = select(
+            exists(select(tweet.c.id)).label("tweet_exists"),
+            select(inserted.c.id).scalar_subquery().label("like_id"),
+        ).add_cte(counted)
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return result.tuples().one()
+
+    async def unlike(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        tweet_id: int,
+        shard: int = 0,
+    ) -> Tuple[bool, int | None]:
+        """
+        Delete like and decrement counter `shard` in one statement.
+        Returns (tweet exists, id of the deleted like or None if there was none).
+        """
+        tweet = self.__tweet_cte(tweet_id)
+
+        deleted = (
+            delete(Like)
+            .where(
+                Like.tweet_id.in_(select(tweet.c.id)),
+                Like.user_id == user_id,
+            )
+            .returning(Like.id, Like.tweet_id)
+            .cte("deleted")
+        )
+        counted = self.__counter_cte(
+            select(deleted.c.tweet_id, literal(shard, SmallInteger), literal(-1, BIGINT)),
+            "counted",
+        )
+
+        stmt = select(
+            exists(select(tweet.c.id)).label("tweet_exists"),
+            select(deleted.c.id).scalar_subquery().label("like_id"),
+        ).add_cte(counted)
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return result.tuples().one()
+
+    async def purge_user_likes(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        limit: int,
+        shard: int = 0,
+    ) -> int:
+        """
+        Delete up to `limit` likes of `user_id` and decrement counters `shard`
+        in one statement. Returns number of deleted likes.
+        """
+        batch = select(Like.id).where(Like.user_id == user_id).limit(limit)
+        deleted = (
+            delete(Like).where(Like.id.in_(batch)).returning(Like.tweet_id).cte("deleted")
+        )
+        counted = self.__counter_cte(
+            select(
+                deleted.c.tweet_id, literal(shard, SmallInteger), -func.count()
+            ).group_by(deleted.c.tweet_id),
+            "counted",
+        )
+
+        stmt = select(func.count()).select_from(deleted).add_cte(counted)
+
+        result = await async_session.scalar(stmt)
+        await async_session.commit()
+
+        return result
+
+    async def apply_batch(
+        self,
+        async_session: AsyncSession,
+        likes: List[Tuple[int, int]],
+        unlikes: List[Tuple[int, int]],
+        shards: Dict[int, int],
+    ) -> int:
+        """
+        Apply buffered `(user_id, tweet_id)` likes and unlikes in one transaction.
+        Counters are changed in shard `shards[tweet_id]`. Likes of removed tweets
+        or users, existing likes and missing unlikes are skipped. Returns number
+        of applied likes and unlikes.
+        """
+        applied = 0
+        shards_rows = values(
+            column("tweet_id", BIGINT),
+            column("shard", SmallInteger),
+            name="shards",
+        ).data(list(shards.items()))
+
+        if likes:
+            rows = values(
+                column("user_id", BIGINT),
+                column("tweet_id", BIGINT),
+                name="new_likes",
+            ).data(likes)
+
+            inserted = (
+                insert(Like)
+                .from_select(
+                    ["user_id", "tweet_id"],
+                    select(rows.c.user_id, rows.c.tweet_id)
+                    .join(
+                        Tweet,
+                        (Tweet.id == rows.c.tweet_id) & Tweet.deleted_at.is_(None),
+                    )
+                    .join(User, (User.id == rows.c.user_id) & User.deleted_at.is_(None)),
+                )
+                .on_conflict_do_nothing(constraint="_user_tweet_uc")
+                .returning(Like.tweet_id)
+                .cte("inserted")
+            )
+            counted = self.__counter_cte(
+                select(inserted.c.tweet_id, shards_rows.c.shard, func.count())
+                .join(shards_rows, shards_rows.c.tweet_id == inserted.c.tweet_id)
+                .group_by(inserted.c.tweet_id, shards_rows.c.shard),
+                "counted",
+            )
+
+            stmt = select(func.count()).select_from(inserted).add_cte(counted)
+            applied += (await async_session.execute(stmt)).scalar_one()
+
+        if unlikes:
+            rows = values(
+                column("user_id", BIGINT),
+                column("tweet_id", BIGINT),
+                name="removed_likes",
+            ).data(unlikes)
+
+            deleted = (
+                delete(Like)
+                .where(
+                    Like.user_id == rows.c.user_id,
+                    Like.tweet_id == rows.c.tweet_id,
+                )
+                .returning(Like.tweet_id)
+                .cte("deleted")
+            )
+            counted = self.__counter_cte(
+                select(deleted.c.tweet_id, shards_rows.c.shard, -func.count())
+                .join(shards_rows, shards_rows.c.tweet_id == deleted.c.tweet_id)
+                .group_by(deleted.c.tweet_id, shards_rows.c.shard),
+                "counted",
+            )
+
+            stmt = select(func.count()).select_from(deleted).add_cte(counted)
+            applied += (await async_session.execute(stmt)).scalar_one()
+
+        await async_session.commit()
+
+        return applied
+
+    async def get_liked(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        tweet_ids: List[int] | Sequence[int],
+    ) -> Set[int]:
+        """
+        Loaded fields:
+        tweet_id of `tweet_ids` liked by user
+        """
+        stmt = select(Like.tweet_id).where(
+            Like.user_id == user_id,
+            Like.tweet_id == any_(bindparam("tweet_ids", tweet_ids, ARRAY(BIGINT))),
+        )
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+
+        return set(result.all())
+
+    async def get_liked_tweet_ids(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+    ) -> Sequence[int]:
+        """
+        Loaded fields:
+        tweet_id of all tweets liked by user
+        """
+        stmt = select(Like.tweet_id).where(Like.user_id == user_id)
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+
+        return result.all()
+
+    async def get_likes_count(
+        self,
+        async_session: AsyncSession,
+        tweet_ids: List[int] | Sequence[int],
+    ) -> Dict[int, int]:
+        """
+        Loaded fields:
+        tweet_id, sum of counter shards
+        """
+        stmt = (
+            select(TweetLikeCounter.tweet_id, func.sum(TweetLikeCounter.count))
+            .where(TweetLikeCounter.tweet_id.in_(tweet_ids))
+            .group_by(TweetLikeCounter.tweet_id)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return {tweet_id: int(count) for tweet_id, count in result.tuples()}
+
+
+class TweetMediaManager(CRUDMixin):
+    table = TweetMedia
+
+
+class MediaManager(CRUDMixin):
+    table = Media
+
+    async def delete_owner_media(
+        self,
+        async_session: AsyncSession,
+        owner_id: int,
+        limit: int,
+    ) -> List[str | None]:
+        """Delete up to `limit` media of `owner_id`, returns files of deleted media."""
+        batch = select(Media.id).where(Media.owner_id == owner_id).limit(limit)
+        stmt = delete(Media).where(Media.id.in_(batch)).returning(Media.file)
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+
+        return list(result.all())
+
+    async def get_media(
+        self,
+        async_session: AsyncSession,
+        media_ids: List[int],
+        order_by: Any | None = None,
+        limit: int = CRUDMixin.default_limit,
+    ) -> Sequence[Media]:
+        """
+        Loaded fields:
+        id, file
+        """
+        options = [
+            load_only(Media.id, Media.file),
+            noload(Media.tweet_item),
+        ]
+
+        stmt = (
+            select(self.table)
+            .where(Media.id.in_(media_ids))
+            .options(*options)
+            .order_by(order_by or self.table.id)
+            .limit(limit)
+        )
+
+        result = await async_session.scalars(stmt)
+        await async_session.commit()
+        return result.unique().all()
+
+
+class IdempotencyKeyManager(CRUDMixin):
+    table = IdempotencyKey
+
+    async def claim(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        key: str,
+        fingerprint: bytes,
+        ttl: int,
+        lease: int,
+    ) -> Row[Tuple[bytes, Dict[str, Any] | None]] | None:
+        """
+        Claim `key` of `user_id` for a new request, a key older than `ttl`
+        seconds is claimed again. A claim without response is a lease: after
+        `lease` milliseconds the same request can claim it again, so a request
+        lost with its process does not block retries. Returns None if claimed.
+        Loaded fields (if not claimed):
+        fingerprint, response
+        """
+        stmt = insert(IdempotencyKey).values(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+        )
+        # The conflicting row stays locked even if not updated
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "response": null(),
+                "created_at": func.now(),
+            },
+            where=or_(
+                IdempotencyKey.created_at < func.now() - timedelta(seconds=ttl),
+                and_(
+                    IdempotencyKey.response.is_(None),
+                    IdempotencyKey.fingerprint == stmt.excluded.fingerprint,
+                    IdempotencyKey.created_at
+                    < func.now() - timedelta(milliseconds=lease),
+                ),
+            ),
+        ).returning(IdempotencyKey.user_id)
+
+        stored = None
+
+        if (await async_session.execute(stmt)).first() is None:
+            result = await async_session.execute(
+                select(IdempotencyKey.fingerprint, IdempotencyKey.response).where(
+                    IdempotencyKey.user_id == user_id,
+                    IdempotencyKey.key == key,
+                ),
+            )
+            stored = result.one()
+
+        await async_session.commit()
+        return stored
+
+    async def save_response(
+        self,
+        async_session: AsyncSession,
+        user_id: int,
+        key: str,
+        response: Dict[str, Any],
+    ) -> None:
+        """Store response of the request that claimed `key`."""
+        stmt = (
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(response=response)
+        )
+
+        await async_session.execute(stmt)
+        await async_session.commit()
+
+    async def release(self, async_session: AsyncSession, user_id: int, key: str) -> None:
+        """Delete claimed `key` of a failed request."""
+        stmt = delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            IdempotencyKey.response.is_(None),
+        )
+
+        await async_session.execute(stmt)
+        await async_session.commit()
+
+    async def delete_expired(
+        self,
+        async_session: AsyncSession,
+        ttl: int,
+        limit: int,
+    ) -> int:
+        """Delete up to `limit` keys older than `ttl` seconds, returns their number."""
+        batch = (
+            select(IdempotencyKey.user_id, IdempotencyKey.key)
+            .where(IdempotencyKey.created_at < func.now() - timedelta(seconds=ttl))
+            .limit(limit)
+        )
+        stmt = (
+            delete(IdempotencyKey)
+            .where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_(batch))
+            .returning(IdempotencyKey.user_id)
+        )
+
+        result = await async_session.execute(stmt)
+        await async_session.commit()
+
+        return len(result.all())
+
+
+class SnowflakeWorkerManager(CRUDMixin):
+    table = SnowflakeWorker
+
+    async def lease(
+        self,
+        async_session: AsyncSession,
+        holder: str,
+        worker_count: int,
+        ttl: int,
+    ) -> int | None:
+        """
+        Lease the lowest worker id below `worker_count` that is free or expired
+        to `holder` for `ttl` seconds. Returns None if all of them are leased.
+        """
+        slot = func.generate_series(0, worker_count - 1).column_valued("slot")
+        free = (
+            select(slot)
+            .where(
+                ~exists().where(
+                    SnowflakeWorker.worker_id == slot,
+                    SnowflakeWorker.leased_until >= func.now(),
+                ),
+            )
+            .order_by(slot)
+            .limit(1)
+        )
+
+        while True:
+            worker_id = await async_session.scalar(free)
+
+            if worker_id is None:
+                await async_session.commit()
+                return None
+
+            stmt = insert(SnowflakeWorker).values(
+                worker_id=worker_id,
+                holder=holder,
+                leased_until=func.now() + timedelta(seconds=ttl),
+            )
+            # Another process may lease the same id meanwhile, then try the next
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SnowflakeWorker.worker_id],
+                set_={
+                    "holder": stmt.excluded.holder,
+                    "leased_until": stmt.excluded.leased_until,
+                },
+                where=SnowflakeWorker.leased_until < func.now(),
+            ).returning(SnowflakeWorker.worker_id)
+
+            leased = (await async_session.execute(stmt)).scalar_one_or_none()
+            await async_session.commit()
+
+            if leased is not None:
+                return leased
+
+    async def renew(
+        self,
+        async_session: AsyncSession,
+        worker_id: int,
+        holder: str,
+        ttl: int,
+    ) -> bool:
+        """Extend lease of `worker_id` by `holder` to `ttl` seconds from now."""
+        stmt = (
+            update(SnowflakeWorker)
+            .where(
+                SnowflakeWorker.worker_id == worker_id,
+                SnowflakeWorker.holder == holder,
+                SnowflakeWorker.leased_until >= func.now(),
+            )
+            .values(leased_until=func.now() + timedelta(seconds=ttl))
+            .returning(SnowflakeWorker.worker_id)
+        )
+
+        result = await async_session.execute(stmt)
+        renewed = result.first() is not None
+        await async_session.commit()
+
+        return renewed
+
+    async def release(
+        self,
+        async_session: AsyncSession,
+        worker_id: int,
+        holder: str,
+    ) -> None:
+        stmt = delete(SnowflakeWorker).where(
+            SnowflakeWorker.worker_id == worker_id,
+            SnowflakeWorker.holder == holder,
+        )
+
+        await async_session.execute(stmt)
+        await async_session.commit()
+
+
+class PartitionManager:
+    async def get_partitions(
+        self,
+        async_session: AsyncSession,
+        table_name: str,
+    ) -> List[Partition]:
+        """Range partitions of `table_name` ordered by lower bound, legacy first."""
+        stmt = text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:table_name AS regclass)
+            """,
+        )
+
+        result = await async_session.execute(stmt, {"table_name": table_name})
+        partitions = [parse_partition(name, bound) for name, bound in result.all()]
+        await async_session.commit()
+
+        return sorted(partitions, key=lambda p: -1 if p.lower is None else p.lower)
+
+    async def is_empty(self, async_session: AsyncSession, partition_name: str) -> bool:
+        stmt = text(f"SELECT NOT EXISTS (SELECT 1 FROM {partition_name})")
+
+        result = await async_session.scalar(stmt)
+        await async_session.commit()
+        return result
+
+    async def create_partition(
+        self,
+        async_session: AsyncSession,
+        table_name: str,
+        partition: Partition,
+        lock_timeout: int,
+    ) -> None:
+        """
+        Create `partition` of `table_name`, waits for the table lock at most
+        `lock_timeout` milliseconds. Indexes and keys are created as in the table.
+        """
+        lower = "MINVALUE" if partition.lower is None else partition.lower
+        upper = "MAXVALUE" if partition.upper is None else partition.upper
+
+        await async_session.execute(text(f"SET LOCAL lock_timeout = {lock_timeout}"))
+        await async_session.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition.name} PARTITION OF {table_name} "
+                f"FOR VALUES FROM ({lower}) TO ({upper})",
+            ),
+        )
+        await async_session.commit()
+
+    async def detach_partition(
+        self,
+        async_session: AsyncSession,
+        table_name: str,
+        partition_name: str,
+        lock_timeout: int,
+    ) -> None:
+        """
+        Detach `partition_name` of `table_name` concurrently, so queries of the
+        table are not blocked; a detach interrupted before is finished instead.
+        Waits for locks at most `lock_timeout` milliseconds.
+        """
+        # DETACH CONCURRENTLY cannot run in a transaction block
+        connection = await async_session.connection(
+            execution_options={"isolation_level": "AUTOCOMMIT"},
+        )
+        pending = await connection.scalar(
+            text(
+                "SELECT inhdetachpending FROM pg_inherits "
+                "WHERE inhrelid = CAST(:partition_name AS regclass)",
+            ),
+            {"partition_name": partition_name},
+        )
+        stmt = (
+            f"ALTER TABLE {table_name} DETACH PARTITION {partition_name} "
+            f"{'FINALIZE' if pending else 'CONCURRENTLY'}"
+        )
+
+        try:
+            await connection.execute(text(f"SET lock_timeout = {lock_timeout}"))
+            await connection.execute(text(stmt))
+        finally:
+            await connection.execute(text("RESET lock_timeout"))
+            await async_session.commit()
+
+    async def get_detached(
+        self,
+        async_session: AsyncSession,
+        table_name: str,
+    ) -> List[str]:
+        """Names of partitions of `table_name` detached before, as plain tables."""
+        stmt = text(
+            """
+            SELECT relname FROM pg_class
+            WHERE relkind = 'r' AND NOT relispartition
+                AND relnamespace = current_schema()::regnamespace
+                AND starts_with(relname, :prefix)
+            ORDER BY relname
+            """,
+        )
+
+        result = await async_session.scalars(stmt, {"prefix": f"{table_name}_"})
+        await async_session.commit()
+
+        return [name for name in result.all() if is_partition_name(name)]
+
+    async def drop_table(self, async_session: AsyncSession, table_name: str) -> None:
+        await async_session.execute(text(f"DROP TABLE {table_name}"))
+        await async_session.commit()
 
 
 db_session_manager = DatabaseAsyncSessionManager()
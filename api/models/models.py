@@ -39,6 +39,20 @@ class ResultUserModel(BaseResultModel):
     user_id: int
 
 
+class ResultUsersModel(BaseResultModel):
+    users: List[UserModel] = []
+
+
+class BatchFollowModel(BaseModel):
+    follow: List[int] = []
+    unfollow: List[int] = []
+
+
+class ResultBatchFollowModel(BaseResultModel):
+    followed: List[int] = []
+    unfollowed: List[int] = []
+
+
 # Tweets
 class CrateTweetModel(BaseModel):
     tweet_data: str
@@ -49,18 +63,32 @@ class ResultSingleTweetModel(BaseResultModel):
     tweet_id: int
 
 
+class BatchTweetsModel(BaseModel):
+    tweets: List[CrateTweetModel]
+
+
+class ResultBatchTweetsModel(BaseResultModel):
+    tweet_ids: List[int] = []
+
+
 class TweetItemModel(BaseModel):
     id: int
     content: str = ""
     attachments: List[str] = Field(..., title="List of media")
     author: UserModel
     likes: List[LikerModel] = []
+    likes_count: int = 0
+    liked_by_me: bool = False
 
 
 class ResultMultipleTweetModel(BaseResultModel):
     tweets: List[TweetItemModel] = []
 
 
+class ResultTweetsPageModel(ResultMultipleTweetModel):
+    next_cursor: str | None = Field(None, title="Cursor of the next page")
+
+
 # Media
 class ResultMediaModel(BaseResultModel):
     media_id: int
@@ -96,6 +124,19 @@ class BaseResponse:
             },
         },
     }
+    # Only for requests with `Idempotency-Key`
+    HTTP_409_CONFLICT: Dict[str, Any] = {
+        "model": APIExceptionModel,
+        "description": "Request with the same Idempotency-Key is in progress",
+        "content": {
+            "application/json": {
+                "example": APIException(
+                    "Request with this Idempotency-Key is in progress",
+                    status.HTTP_409_CONFLICT,
+                ).content,
+            },
+        },
+    }
     HTTP_422_UNPROCESSABLE_ENTITY: Dict[str, Any] = {
         "model": APIExceptionModel,
         "description": "Validation Error",
@@ -162,6 +203,14 @@ class UserResponsesModel(BaseModel):
         },
     }
 
+    delete_account_responses: Dict[str, Any] = {
+        **BaseResponse.some(exclude=[422]),
+        status.HTTP_202_ACCEPTED: {
+            "model": BaseResultModel,
+            "description": "Successful Response",
+        },
+    }
+
     user_detail_responses: Dict[str, Any] = {
         **BaseResponse.some(exclude=[401, 422]),
         status.HTTP_200_OK: {
@@ -208,6 +257,79 @@ class UserResponsesModel(BaseModel):
         },
     }
 
+    batch_follow_responses: Dict[str, Any] = {
+        **BaseResponse.all(),
+        status.HTTP_200_OK: {
+            "model": ResultBatchFollowModel,
+            "description": "Successful Response",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": APIExceptionModel,
+            "description": "Not Found Error",
+            "content": {
+                "application/json": {
+                    "example": NotFoundError(
+                        "Users with ID [3, 4] not found",
+                    ).content,
+                },
+            },
+        },
+    }
+
+    suggestions_responses: Dict[str, Any] = {
+        **BaseResponse.some(exclude=[422]),
+        status.HTTP_200_OK: {
+            "model": ResultUsersModel,
+            "description": "Successful Response",
+        },
+    }
+
+    search_responses: Dict[str, Any] = {
+        **BaseResponse.all(),
+        status.HTTP_200_OK: {
+            "model": ResultUsersModel,
+            "description": "Successful Response",
+        },
+    }
+
+    mentions_responses: Dict[str, Any] = {
+        **BaseResponse.all(),
+        status.HTTP_200_OK: {
+            "model": ResultTweetsPageModel,
+            "description": "Successful Response",
+        },
+    }
+
+    relations_responses: Dict[str, Any] = {
+        **BaseResponse.some(exclude=[422]),
+        status.HTTP_200_OK: {
+            "model": ResultUsersModel,
+            "description": "Successful Response",
+        },
+        status.HTTP_400_BAD_REQUEST: {
+            "model": APIExceptionModel,
+            "description": "Bad Request",
+            "content": {
+                "application/json": {
+                    "example": APIException(
+                        "It's your user ID `3`",
+                    ).content,
+                },
+            },
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": APIExceptionModel,
+            "description": "Not Found Error",
+            "content": {
+                "application/json": {
+                    "example": NotFoundError(
+                        "User with ID `3` not found",
+                    ).content,
+                },
+            },
+        },
+    }
+
 
 class TweetResponsesModel(BaseModel):
     get_tweet_responses: Dict[str, Any] = {
@@ -218,12 +340,59 @@ class TweetResponsesModel(BaseModel):
         },
     }
 
+    search_tweets_responses: Dict[str, Any] = {
+        **BaseResponse.all(),
+        status.HTTP_200_OK: {
+            "model": ResultTweetsPageModel,
+            "description": "Successful Response",
+        },
+    }
+
+    tagged_tweets_responses: Dict[str, Any] = {
+        **BaseResponse.all(),
+        status.HTTP_200_OK: {
+            "model": ResultTweetsPageModel,
+            "description": "Successful Response",
+        },
+    }
+
     create_tweet_responses: Dict[str, Any] = {
         **BaseResponse.all(),
         status.HTTP_201_CREATED: {
             "model": ResultSingleTweetModel,
             "description": "Successful Response",
         },
+        status.HTTP_404_NOT_FOUND: {
+            "model": APIExceptionModel,
+            "description": "Not Found Error",
+            "content": {
+                "application/json": {
+                    "example": NotFoundError(
+                        "Media with ID [3, 4] not found",
+                    ).content,
+                },
+            },
+        },
+        status.HTTP_409_CONFLICT: BaseResponse.HTTP_409_CONFLICT,
+    }
+
+    batch_create_tweets_responses: Dict[str, Any] = {
+        **BaseResponse.all(),
+        status.HTTP_201_CREATED: {
+            "model": ResultBatchTweetsModel,
+            "description": "Successful Response",
+        },
+        status.HTTP_404_NOT_FOUND: {
+            "model": APIExceptionModel,
+            "description": "Not Found Error",
+            "content": {
+                "application/json": {
+                    "example": NotFoundError(
+                        "Media with ID [3, 4] not found",
+                    ).content,
+                },
+            },
+        },
     }
 
     delete_tweet_responses: Dict[str, Any] = {
@@ -258,6 +427,7 @@ class MediaResponsesModel(BaseModel):
             "model": ResultMediaModel,
             "description": "Loaded media",
         },
+        status.HTTP_409_CONFLICT: BaseResponse.HTTP_409_CONFLICT,
         status.HTTP_411_LENGTH_REQUIRED: {
             "model": APIExceptionModel,
             "description": "Length required",
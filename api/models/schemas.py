@@ -1,11 +1,27 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Any, Dict, List, Tuple
 
-from sqlalchemy import ForeignKey, ForeignKeyConstraint, Integer, String, UniqueConstraint
-from sqlalchemy.dialects.postgresql import BIGINT, JSON
+from sqlalchemy import (
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    SmallInteger,
+    String,
+    UniqueConstraint,
+    column,
+    func,
+    literal_column,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, BIGINT, JSON
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from utils.snowflake import snowflake
+
 
 class Base(DeclarativeBase):
     def to_dict(
@@ -34,6 +50,15 @@ class Base(DeclarativeBase):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__: Tuple[Index] = (
+        # Name prefix search: a `~>=~`/`~<~` range scan in `~<~` order
+        Index(
+            "ix_users_name_prefix",
+            func.lower(column("name")).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(
         "id",
@@ -51,15 +76,23 @@ class User(Base):
         index=True,
         unique=True,
     )
+    # Lists of user ids
     followers: Mapped[JSON] = mapped_column(
         "followers",
         JSON,
-        default=lambda: {},
+        default=list,
     )
     following: Mapped[JSON] = mapped_column(
         "following",
         JSON,
-        default=lambda: {},
+        default=list,
+    )
+
+    # Account deletion tombstone, the row is removed by the deletion task
+    deleted_at: Mapped[datetime | None] = mapped_column(
+        "deleted_at",
+        DateTime(timezone=True),
+        nullable=True,
     )
 
     # Tweets relationship
@@ -115,6 +148,7 @@ class Token(Base):
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     user: Mapped[User] = relationship(
         lambda: User,
@@ -125,20 +159,23 @@ class Token(Base):
 
 class Like(Base):
     __tablename__ = "likes"
-    __table_args__: Tuple[UniqueConstraint] = (
+    __table_args__: Tuple[UniqueConstraint, Index, Dict[str, str]] = (
         UniqueConstraint(
             "user_id",
             "tweet_id",
             name="_user_tweet_uc",
         ),
+        Index("ix_likes_created_at", "created_at", postgresql_using="brin"),
+        # Same bounds as tweets partitions, see PartitionController
+        {"postgresql_partition_by": "RANGE (tweet_id)"},
     )
 
+    # Unique constraints of a partitioned table must include the partition key
     id: Mapped[int] = mapped_column(
         "id",
         BIGINT,
         autoincrement=True,
         nullable=False,
-        unique=True,
         primary_key=True,
     )
     user_id: Mapped[int] = mapped_column(
@@ -148,6 +185,13 @@ class Like(Base):
     tweet_id: Mapped[int] = mapped_column(
         ForeignKey("tweets.id", ondelete="CASCADE"),
         primary_key=True,
+        index=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        "created_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
     )
 
     liker: Mapped["User"] = relationship(
@@ -160,13 +204,35 @@ class Like(Base):
     )
 
 
+# Text search configuration of tweets, `simple` does not depend on the language
+TWEETS_SEARCH_CONFIG = literal_column("'simple'")
+
+
 class Tweet(Base):
     __tablename__ = "tweets"
+    __table_args__: Tuple[Index, Index, Index, Dict[str, str]] = (
+        Index(
+            "ix_tweets_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+        # Rows are appended in time order, BRIN keeps block ranges only
+        Index("ix_tweets_created_at", "created_at", postgresql_using="brin"),
+        # Expression index instead of a stored tsvector column: no table rewrite
+        Index(
+            "ix_tweets_content_tsv",
+            func.to_tsvector(TWEETS_SEARCH_CONFIG, column("content")),
+            postgresql_using="gin",
+        ),
+        # Ids are time ordered, so id ranges are time ranges
+        {"postgresql_partition_by": "RANGE (id)"},
+    )
 
     id: Mapped[int] = mapped_column(
         "id",
         BIGINT,
-        autoincrement=True,
+        # Column keeps its sequence default for rows inserted with SQL
+        default=snowflake.next_id,
         nullable=False,
         unique=True,
         primary_key=True,
@@ -185,6 +251,7 @@ class Tweet(Base):
         Integer,
         ForeignKey("users.id", ondelete="SET NULL"),
         nullable=False,
+        index=True,
     )
     author: Mapped[User] = relationship(
         User,
@@ -192,6 +259,20 @@ class Tweet(Base):
         lazy="joined",
     )
 
+    created_at: Mapped[datetime] = mapped_column(
+        "created_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+    # Soft delete, rows are removed later by the purge task
+    deleted_at: Mapped[datetime | None] = mapped_column(
+        "deleted_at",
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
     # Users relationship
     likers: Mapped[List[Like]] = relationship(
         uselist=True,
@@ -211,12 +292,14 @@ class Tweet(Base):
 
 class TweetMedia(Base):
     __tablename__ = "tweet_media"
-    __table_args__: Tuple[ForeignKeyConstraint] = (
+    __table_args__: Tuple[UniqueConstraint, Index] = (
         UniqueConstraint(
             "media_id",
             "tweet_id",
             name="_tweet_media_uc",
         ),
+        # A media item is attached to one tweet, concurrent attachments conflict
+        Index("ix_tweet_media_media_id", "media_id", unique=True),
     )
 
     id: Mapped[int] = mapped_column(
@@ -231,6 +314,7 @@ class TweetMedia(Base):
     tweet_id: Mapped[int] = mapped_column(
         ForeignKey("tweets.id", ondelete="CASCADE"),
         primary_key=True,
+        index=True,
     )
     media_id: Mapped[int] = mapped_column(
         ForeignKey("media.id", ondelete="CASCADE"),
@@ -252,13 +336,17 @@ class TweetMedia(Base):
 
 class Media(Base):
     __tablename__ = "media"
+    __table_args__: Tuple[Index] = (
+        Index("ix_media_created_at", "created_at", postgresql_using="brin"),
+    )
 
     filename_max_length: int = 20
 
     id: Mapped[int] = mapped_column(
         "id",
         BIGINT,
-        autoincrement=True,
+        # Column keeps its sequence default for rows inserted with SQL
+        default=snowflake.next_id,
         nullable=False,
         unique=True,
         primary_key=True,
@@ -274,8 +362,321 @@ class Media(Base):
         nullable=True,
     )
 
+    # Uploader, media can be attached only to own tweets (not set for old uploads)
+    owner_id: Mapped[int | None] = mapped_column(
+        "owner_id",
+        BIGINT,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=True,
+        index=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        "created_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
     # Tweet relationship
     tweet_item: Mapped[TweetMedia] = relationship(
         back_populates="media_item",
         lazy="joined",
     )
+
+
+class UserSuggestion(Base):
+    __tablename__ = "user_suggestions"
+
+    user_id: Mapped[int] = mapped_column(
+        "user_id",
+        BIGINT,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    suggested_ids: Mapped[List[int]] = mapped_column(
+        "suggested_ids",
+        ARRAY(BIGINT),
+        nullable=False,
+        default=list,
+    )
+    computed_at: Mapped[datetime] = mapped_column(
+        "computed_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class AccountDeletion(Base):
+    """Progress of a background account deletion, kept after the user is removed."""
+
+    __tablename__ = "account_deletions"
+
+    # No foreign key, the user row is deleted at the last stage
+    user_id: Mapped[int] = mapped_column(
+        "user_id",
+        BIGINT,
+        primary_key=True,
+    )
+    stage: Mapped[str] = mapped_column(
+        "stage",
+        String(20),
+        nullable=False,
+    )
+    # Numbers of removed rows
+    tweets: Mapped[int] = mapped_column(
+        "tweets",
+        BIGINT,
+        nullable=False,
+        default=0,
+    )
+    likes: Mapped[int] = mapped_column(
+        "likes",
+        BIGINT,
+        nullable=False,
+        default=0,
+    )
+    media: Mapped[int] = mapped_column(
+        "media",
+        BIGINT,
+        nullable=False,
+        default=0,
+    )
+    follows: Mapped[int] = mapped_column(
+        "follows",
+        BIGINT,
+        nullable=False,
+        default=0,
+    )
+    requested_at: Mapped[datetime] = mapped_column(
+        "requested_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        "updated_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(
+        "finished_at",
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+
+class TweetLikeCounter(Base):
+    """Like counter of a tweet, split into shard rows to spread row locks."""
+
+    __tablename__ = "tweet_like_counters"
+
+    tweet_id: Mapped[int] = mapped_column(
+        "tweet_id",
+        BIGINT,
+        ForeignKey("tweets.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    shard: Mapped[int] = mapped_column(
+        "shard",
+        SmallInteger,
+        primary_key=True,
+    )
+    count: Mapped[int] = mapped_column(
+        "count",
+        BIGINT,
+        nullable=False,
+        default=0,
+    )
+
+
+class ImportCheckpoint(Base):
+    """Last committed line of an NDJSON file imported by `importer.py`."""
+
+    __tablename__ = "import_checkpoints"
+
+    source: Mapped[str] = mapped_column(
+        "source",
+        String(500),
+        primary_key=True,
+    )
+    line: Mapped[int] = mapped_column(
+        "line",
+        BIGINT,
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        "updated_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class IdempotencyKey(Base):
+    """Stored response of a request made with an `Idempotency-Key` header."""
+
+    __tablename__ = "idempotency_keys"
+    __table_args__: Tuple[Index] = (
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+    user_id: Mapped[int] = mapped_column(
+        "user_id",
+        BIGINT,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    key: Mapped[str] = mapped_column(
+        "key",
+        String(255),
+        primary_key=True,
+    )
+    # SHA-256 of the request path and body
+    fingerprint: Mapped[bytes] = mapped_column(
+        "fingerprint",
+        LargeBinary(32),
+        nullable=False,
+    )
+    # NULL while the first request is running
+    response: Mapped[Dict[str, Any] | None] = mapped_column(
+        "response",
+        JSON,
+        nullable=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        "created_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class SnowflakeWorker(Base):
+    """Worker id leased by a process generating snowflake ids."""
+
+    __tablename__ = "snowflake_workers"
+
+    worker_id: Mapped[int] = mapped_column(
+        "worker_id",
+        SmallInteger,
+        primary_key=True,
+        autoincrement=False,
+    )
+    # Random id of the process, new on each start
+    holder: Mapped[str] = mapped_column(
+        "holder",
+        String(32),
+        nullable=False,
+    )
+    leased_until: Mapped[datetime] = mapped_column(
+        "leased_until",
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+
+class ArchivedTweet(Base):
+    """
+    Tweet moved out of `tweets` by the archive task with its likes and media
+    links: likes count is frozen, likers and media ids are kept as arrays.
+    """
+
+    __tablename__ = "archived_tweets"
+    __table_args__: Tuple[Index, Index] = (
+        Index("ix_archived_tweets_created_at", "created_at", postgresql_using="brin"),
+        # Media of archived tweets are not attached again or deleted while listed
+        Index("ix_archived_tweets_media_ids", "media_ids", postgresql_using="gin"),
+    )
+
+    id: Mapped[int] = mapped_column(
+        "id",
+        BIGINT,
+        primary_key=True,
+        autoincrement=False,
+    )
+    content: Mapped[str] = mapped_column(
+        "content",
+        String(10_000),
+        nullable=False,
+    )
+    author_id: Mapped[int] = mapped_column(
+        "author_id",
+        BIGINT,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    author: Mapped[User] = relationship(User, lazy="joined")
+
+    likes_count: Mapped[int] = mapped_column(
+        "likes_count",
+        Integer,
+        nullable=False,
+        server_default="0",
+    )
+    # Sorted, arrays of TOAST size are stored compressed
+    liker_ids: Mapped[List[int]] = mapped_column(
+        "liker_ids",
+        ARRAY(BIGINT),
+        nullable=False,
+        server_default="{}",
+    )
+    media_ids: Mapped[List[int]] = mapped_column(
+        "media_ids",
+        ARRAY(BIGINT),
+        nullable=False,
+        server_default="{}",
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        "created_at",
+        DateTime(timezone=True),
+        nullable=False,
+    )
+    archived_at: Mapped[datetime] = mapped_column(
+        "archived_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+
+class TweetTag(Base):
+    """
+    Hashtag of a tweet, lowercase. Primary key (tag, tweet_id) serves pages of
+    tagged tweets, newest first, as index range scans.
+    """
+
+    __tablename__ = "tweet_tags"
+
+    tag: Mapped[str] = mapped_column(
+        "tag",
+        String(100),
+        primary_key=True,
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("tweets.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+
+
+class TweetMention(Base):
+    """
+    Mention of a user in a tweet. Primary key (user_id, tweet_id) serves pages
+    of tweets mentioning the user, newest first, as index range scans.
+    """
+
+    __tablename__ = "tweet_mentions"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("tweets.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
@@ -1,11 +1,13 @@
 from .base import base_router
 from .media import router as media_router
+from .tags import router as tags_router
 from .tweets import router as tweets_router
 from .users import router as users_router
 
 __all__ = [
     "base_router",
     "media_router",
+    "tags_router",
     "tweets_router",
     "users_router",
 ]
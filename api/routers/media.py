@@ -1,11 +1,11 @@
-from typing import Annotated
+from typing import Annotated, Dict
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Header, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.datastructures import FormData
 from starlette.requests import Request
 
-from controllers import MediaController
+from controllers import IdempotencyController, MediaController
 from controllers.authenticate import APIKeyHeader
 from models.managers import get_session
 from models.models import MediaResponsesModel, ResultMediaModel
@@ -19,17 +19,40 @@ router = APIRouter(prefix="/medias")
     dependencies=[Depends(APIKeyHeader())],
     response_model=ResultMediaModel,
     status_code=status.HTTP_201_CREATED,
-    description="Form-data is expected",
+    description=(
+        "Form-data is expected. "
+        "A retry with the same `Idempotency-Key` gets the first response"
+    ),
     responses=MediaResponsesModel().upload_media_responses,
 )
 async def upload_media(
     async_session: Annotated[AsyncSession, Depends(get_session)],
     request: Request,
+    idempotency_key: Annotated[str | None, Header(min_length=1, max_length=255)] = None,
 ) -> ResultMediaModel:
     media_controller = MediaController()
 
     form: FormData = await request.form()
-    media = await media_controller.save_media(form, async_session)
 
-    data = ResultMediaModel(media_id=media[0].id)
+    async def upload() -> Dict[str, int]:
+        media = await media_controller.save_media(form, async_session, request.user.id)
+        return {"media_id": media[0].id}
+
+    if idempotency_key is None:
+        data = await upload()
+    else:
+        idempotency_controller = IdempotencyController()
+        fingerprint = idempotency_controller.fingerprint(
+            request.url.path,
+            await media_controller.form_digest(form),
+        )
+
+        data = await idempotency_controller.run(
+            async_session,
+            request.user.id,
+            idempotency_key,
+            fingerprint,
+            upload,
+        )
+
     return ResultMediaModel.model_validate(data)
@@ -0,0 +1,40 @@
+from typing import Annotated, Any, Dict
+
+from fastapi import APIRouter, Depends, Path, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from controllers import TweetController
+from controllers.authenticate import APIKeyHeader
+from models.managers import get_session
+from models.models import ResultTweetsPageModel, TweetResponsesModel
+
+router: APIRouter = APIRouter(prefix="/tags")
+
+
+@router.get(
+    "/{tag}",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultTweetsPageModel,
+    status_code=status.HTTP_200_OK,
+    description="Tweets with the hashtag, newest first; case is ignored",
+    responses=TweetResponsesModel().tagged_tweets_responses,
+)
+async def get_tagged_tweets(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    tag: Annotated[str, Path(min_length=1, max_length=101)],
+    cursor: Annotated[
+        str | None,
+        Query(max_length=32, description="`next_cursor` of the previous page"),
+    ] = None,
+) -> Dict[str, Any]:
+    tweet_controller: TweetController = TweetController()
+
+    tweets, next_cursor = await tweet_controller.get_tagged_tweets(
+        async_session,
+        tag,
+        user_id=request.user.id,
+        cursor=cursor,
+    )
+    return {"tweets": tweets, "next_cursor": next_cursor}
@@ -1,17 +1,21 @@
-from typing import Annotated, Dict, List
+from datetime import datetime
+from typing import Annotated, Any, Dict, List
 
-from fastapi import APIRouter, Depends, Path, status
+from fastapi import APIRouter, Depends, Header, Path, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
-from controllers import LikeController, TweetController
+from controllers import IdempotencyController, LikeController, TweetController
 from controllers.authenticate import APIKeyHeader
 from models.managers import get_session
 from models.models import (
     BaseResultModel,
+    BatchTweetsModel,
     CrateTweetModel,
+    ResultBatchTweetsModel,
     ResultMultipleTweetModel,
     ResultSingleTweetModel,
+    ResultTweetsPageModel,
     TweetResponsesModel,
 )
 
@@ -27,10 +31,48 @@ router: APIRouter = APIRouter(prefix="/tweets")
 )
 async def get_tweets(
     async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    since: Annotated[datetime | None, Query(description="Created at or after")] = None,
+    until: Annotated[datetime | None, Query(description="Created before")] = None,
 ) -> Dict[str, List[Dict]]:
     tweet_controller: TweetController = TweetController()
 
-    return {"tweets": await tweet_controller.get_tweets(async_session, as_dict=True)}
+    tweets = await tweet_controller.get_tweets(
+        async_session,
+        as_dict=True,
+        user_id=request.user.id,
+        since=since,
+        until=until,
+    )
+    return {"tweets": tweets}
+
+
+@router.get(
+    "/search",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultTweetsPageModel,
+    status_code=status.HTTP_200_OK,
+    description='Words, `"phrases"`, `or` and `-excluded` words, best matches first',
+    responses=TweetResponsesModel().search_tweets_responses,
+)
+async def search_tweets(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    q: Annotated[str, Query(min_length=1, max_length=256)],
+    cursor: Annotated[
+        str | None,
+        Query(max_length=128, description="`next_cursor` of the previous page"),
+    ] = None,
+) -> Dict[str, Any]:
+    tweet_controller: TweetController = TweetController()
+
+    tweets, next_cursor = await tweet_controller.search_tweets(
+        async_session,
+        q,
+        user_id=request.user.id,
+        cursor=cursor,
+    )
+    return {"tweets": tweets, "next_cursor": next_cursor}
 
 
 @router.post(
@@ -38,17 +80,60 @@ async def get_tweets(
     dependencies=[Depends(APIKeyHeader())],
     response_model=ResultSingleTweetModel,
     status_code=status.HTTP_201_CREATED,
+    description="A retry with the same `Idempotency-Key` gets the first response",
     responses=TweetResponsesModel().create_tweet_responses,
 )
 async def create_tweet(
     async_session: Annotated[AsyncSession, Depends(get_session)],
     request: Request,
     twt: CrateTweetModel,
+    idempotency_key: Annotated[str | None, Header(min_length=1, max_length=255)] = None,
 ) -> Dict[str, int]:
     tweet_controller: TweetController = TweetController()
 
-    tweet = await tweet_controller.create_tweet(twt, request.user, async_session)
-    return {"tweet_id": tweet.id}
+    async def create() -> Dict[str, int]:
+        tweet_id = await tweet_controller.create_tweet(twt, request.user, async_session)
+        return {"tweet_id": tweet_id}
+
+    if idempotency_key is None:
+        return await create()
+
+    idempotency_controller = IdempotencyController()
+    fingerprint = idempotency_controller.fingerprint(
+        request.url.path,
+        twt.model_dump_json().encode(),
+    )
+
+    return await idempotency_controller.run(
+        async_session,
+        request.user.id,
+        idempotency_key,
+        fingerprint,
+        create,
+    )
+
+
+@router.post(
+    ":batch",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultBatchTweetsModel,
+    status_code=status.HTTP_201_CREATED,
+    description="Create many tweets in one transaction",
+    responses=TweetResponsesModel().batch_create_tweets_responses,
+)
+async def batch_create_tweets(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    batch: BatchTweetsModel,
+) -> Dict[str, List[int]]:
+    tweet_controller: TweetController = TweetController()
+
+    tweet_ids = await tweet_controller.create_tweets(
+        batch.tweets,
+        request.user,
+        async_session,
+    )
+    return {"tweet_ids": tweet_ids}
 
 
 @router.delete(
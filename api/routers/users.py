@@ -1,13 +1,21 @@
-from typing import Annotated, Dict
+from typing import Annotated, Any, Dict
 
-from fastapi import APIRouter, Depends, Path, status
+from fastapi import APIRouter, Depends, Path, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
-from controllers import UserController
+from controllers import SuggestionController, TweetController, UserController
 from controllers.authenticate import APIKeyHeader
 from models.managers import get_session
-from models.models import BaseResultModel, ResultDetailUserModel, UserResponsesModel
+from models.models import (
+    BaseResultModel,
+    BatchFollowModel,
+    ResultBatchFollowModel,
+    ResultDetailUserModel,
+    ResultTweetsPageModel,
+    ResultUsersModel,
+    UserResponsesModel,
+)
 
 router: APIRouter = APIRouter(prefix="/users")
 
@@ -19,10 +27,94 @@ router: APIRouter = APIRouter(prefix="/users")
     status_code=status.HTTP_200_OK,
     responses=UserResponsesModel().me_detail_responses,
 )
-async def me_detail(request: Request) -> Dict:
+async def me_detail(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+) -> Dict:
     user_controller = UserController()
 
-    return {"user": user_controller.user_to_dict(request.user)}
+    user = await user_controller.user_detail_to_dict(async_session, request.user)
+    return {"user": user}
+
+
+@router.delete(
+    "/me",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=BaseResultModel,
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Account is hidden at once and removed in background",
+    responses=UserResponsesModel().delete_account_responses,
+)
+async def delete_account(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+) -> Dict:
+    user_controller = UserController()
+
+    await user_controller.delete_account(async_session, request.user)
+    return {}
+
+
+@router.get(
+    "/me/suggestions",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultUsersModel,
+    status_code=status.HTTP_200_OK,
+    description="Who to follow, recomputed in background",
+    responses=UserResponsesModel().suggestions_responses,
+)
+async def me_suggestions(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+) -> Dict:
+    suggestion_controller = SuggestionController()
+
+    users = await suggestion_controller.get_suggestions(async_session, request.user.id)
+    return {"users": users}
+
+
+@router.get(
+    "/me/mentions",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultTweetsPageModel,
+    status_code=status.HTTP_200_OK,
+    description="Tweets mentioning you by `@name`, newest first",
+    responses=UserResponsesModel().mentions_responses,
+)
+async def me_mentions(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    cursor: Annotated[
+        str | None,
+        Query(max_length=32, description="`next_cursor` of the previous page"),
+    ] = None,
+) -> Dict[str, Any]:
+    tweet_controller = TweetController()
+
+    tweets, next_cursor = await tweet_controller.get_mentions(
+        async_session,
+        request.user.id,
+        cursor=cursor,
+    )
+    return {"tweets": tweets, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/search",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultUsersModel,
+    status_code=status.HTTP_200_OK,
+    description="Users whose name starts with `q`, case is ignored; for typeahead",
+    responses=UserResponsesModel().search_responses,
+)
+async def search_users(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+) -> Dict:
+    user_controller = UserController()
+
+    users = await user_controller.search_users(async_session, q)
+    return {"users": users}
 
 
 @router.get(
@@ -38,7 +130,7 @@ async def user_detail(
     user_controller = UserController()
 
     user = await user_controller.user_detail(async_session, user_id)
-    return {"user": user_controller.user_to_dict(user)}
+    return {"user": await user_controller.user_detail_to_dict(async_session, user)}
 
 
 @router.post(
@@ -75,3 +167,67 @@ async def unfollow_user(
 
     await user_controller.delete_follow_user(async_session, request.user, user_id)
     return {}
+
+
+@router.get(
+    "/{user_id:int}/mutuals",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultUsersModel,
+    status_code=status.HTTP_200_OK,
+    description="Accounts followed by both you and the user",
+    responses=UserResponsesModel().relations_responses,
+)
+async def mutuals(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    user_id: Annotated[int, Path(..., ge=1)],
+) -> Dict:
+    user_controller = UserController()
+
+    return {"users": await user_controller.mutuals(async_session, request.user, user_id)}
+
+
+@router.get(
+    "/{user_id:int}/followers-you-know",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultUsersModel,
+    status_code=status.HTTP_200_OK,
+    description="Followers of the user that you follow",
+    responses=UserResponsesModel().relations_responses,
+)
+async def followers_you_know(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    user_id: Annotated[int, Path(..., ge=1)],
+) -> Dict:
+    user_controller = UserController()
+
+    users = await user_controller.followers_you_know(
+        async_session,
+        request.user,
+        user_id,
+    )
+    return {"users": users}
+
+
+@router.post(
+    "/follow:batch",
+    dependencies=[Depends(APIKeyHeader())],
+    response_model=ResultBatchFollowModel,
+    status_code=status.HTTP_200_OK,
+    description="Follow and unfollow many users in one transaction",
+    responses=UserResponsesModel().batch_follow_responses,
+)
+async def batch_follow_users(
+    async_session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    batch: BatchFollowModel,
+) -> Dict:
+    user_controller = UserController()
+
+    return await user_controller.batch_follow_users(
+        async_session,
+        request.user,
+        batch.follow,
+        batch.unfollow,
+    )
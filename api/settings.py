@@ -58,6 +58,101 @@ class Settings(BaseSettings):
 
     MAX_MEDIA_SIZE: int | float = 6 * 1024 * 1024  # Bytes. Default 6 MB
 
+    # Follow graph
+    FOLLOW_GRAPH_INDEX: bool = False
+    FOLLOW_GRAPH_COMPACT_THRESHOLD: int = 10_000  # Overlay edges before compaction
+
+    MAX_FOLLOW_BATCH_SIZE: int = 100
+    MAX_TWEETS_BATCH_SIZE: int = 100
+
+    RELATIONS_CACHE_SIZE: int = 100_000  # Cached (viewer, target) pairs
+    RELATIONS_CACHE_TTL: int = 300  # Seconds
+
+    NAMES_CACHE_SIZE: int = 100_000
+    NAMES_CACHE_TTL: int = 60  # Seconds
+
+    USERS_SEARCH_LIMIT: int = 10  # Users per name search response
+    USERS_SEARCH_CACHE_PREFIX: int = 3  # Longer prefixes are not cached
+    USERS_SEARCH_CACHE_SIZE: int = 10_000  # Prefixes
+    USERS_SEARCH_CACHE_TTL: int = 30  # Seconds
+
+    # Suggestions
+    SUGGESTIONS: bool = False
+    SUGGESTIONS_INTERVAL: int = 300  # Seconds
+    SUGGESTIONS_TOP_K: int = 20
+    SUGGESTIONS_BATCH_SIZE: int = 1000
+
+    # Likes
+    LIKES_WRITE_BEHIND: bool = False
+    LIKES_FLUSH_INTERVAL: int = 200  # Milliseconds
+    LIKES_FLUSH_SIZE: int = 500  # Pending likes that trigger an early flush
+    LIKES_BUFFER_SIZE: int = 50_000  # Above this likes are written synchronously
+
+    LIKES_COUNTER_MAX_SHARDS: int = 16
+    LIKES_COUNTER_CONTENTION_LATENCY: int = 50  # Milliseconds
+    LIKES_COUNT_CACHE_SIZE: int = 100_000
+    LIKES_COUNT_CACHE_TTL: int = 5  # Seconds
+
+    LIKED_FILTER: bool = False  # Per-user Bloom filter of liked tweets
+    LIKED_FILTER_CACHE_SIZE: int = 10_000  # Users
+    LIKED_FILTER_TTL: int = 300  # Seconds
+    LIKED_FILTER_ERROR_RATE: float = 0.01
+
+    # Tweets
+    TWEETS_PURGE: bool = False
+    TWEETS_PURGE_INTERVAL: int = 10  # Seconds
+    TWEETS_PURGE_BATCH_SIZE: int = 100  # Deleted tweets handled per run
+    TWEETS_PURGE_ROWS: int = 1000  # Likes or media deleted per batch
+    TWEETS_PURGE_MAX_BATCHES: int = 20  # Per run
+    TWEETS_PURGE_PAUSE: int = 50  # Milliseconds between batches
+    TWEETS_RETENTION: int = 0  # Days (0 keeps all), older tweets are purged
+    TWEETS_GROUP_COMMIT: bool = False
+    TWEETS_GROUP_COMMIT_WINDOW: int = 5  # Milliseconds
+    TWEETS_GROUP_COMMIT_SIZE: int = 100  # Tweets that trigger an early commit
+    TWEETS_ARCHIVE: bool = False
+    TWEETS_ARCHIVE_AFTER: int = 180  # Days
+    TWEETS_ARCHIVE_INTERVAL: int = 600  # Seconds
+    TWEETS_ARCHIVE_BATCH_SIZE: int = 500  # Tweets moved per transaction
+    TWEETS_ARCHIVE_MAX_BATCHES: int = 20  # Per run
+    TWEETS_ARCHIVE_PAUSE: int = 50  # Milliseconds between batches
+    TWEETS_SEARCH_PAGE_SIZE: int = 20
+    TWEETS_MAX_TAGS: int = 10  # Hashtags indexed per tweet, others are ignored
+    TWEETS_MAX_MENTIONS: int = 10  # Mentions indexed per tweet, others are ignored
+    TWEETS_ENTITIES_PAGE_SIZE: int = 20  # Tweets per page of a tag or mentions
+
+    # Account deletion
+    ACCOUNT_DELETION: bool = False
+    ACCOUNT_DELETION_INTERVAL: int = 10  # Seconds
+    ACCOUNT_DELETION_TWEETS: int = 100  # Tweets purged per batch
+    ACCOUNT_DELETION_ROWS: int = 1000  # Likes deleted per batch
+    ACCOUNT_DELETION_FOLLOWS: int = 500  # Followed and following users per batch
+    ACCOUNT_DELETION_MAX_BATCHES: int = 20  # Per run
+    ACCOUNT_DELETION_PAUSE: int = 50  # Milliseconds between batches
+
+    # Idempotency keys
+    IDEMPOTENCY_KEY_TTL: int = 86_400  # Seconds
+    IDEMPOTENCY_KEY_WAIT: int = 5000  # Milliseconds a duplicate waits for the response
+    IDEMPOTENCY_KEY_POLL: int = 50  # Milliseconds
+    IDEMPOTENCY_KEYS_PURGE: bool = False
+    IDEMPOTENCY_KEYS_PURGE_INTERVAL: int = 600  # Seconds
+    IDEMPOTENCY_KEYS_PURGE_BATCH_SIZE: int = 1000
+
+    # Ids of tweets and media
+    SNOWFLAKE_EPOCH: int = 1_767_225_600_000  # Unix time in milliseconds, 2026-01-01
+    # Unique for each process writing to the database, leased from it if unset
+    SNOWFLAKE_WORKER_ID: int | None = None
+    SNOWFLAKE_WORKER_LEASE: int = 60  # Seconds, renewed every third of it
+    SNOWFLAKE_WORKER_BITS: int = 5  # 41 + 5 + 6 bits keep ids exact in JavaScript
+    SNOWFLAKE_SEQUENCE_BITS: int = 6  # 2 ** bits ids per millisecond and worker
+
+    # Partitions of tweets and likes
+    PARTITIONS_MAINTENANCE: bool = True  # Inserts fail beyond the last partition
+    PARTITIONS_MAINTENANCE_INTERVAL: int = 3600  # Seconds
+    PARTITIONS_LOCK_TIMEOUT: int = 2000  # Milliseconds, DDL waits for table locks
+    TWEETS_PARTITION_DAYS: int = 30
+    TWEETS_PARTITIONS_AHEAD: int = 2  # Partitions created in advance
+    TWEETS_PARTITION_PRUNE_SLACK: int = 60  # Seconds of clock skew between id and time
+
     # Database
     DB_DRIVER: str
 
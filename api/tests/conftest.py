@@ -25,6 +25,7 @@ from models.schemas import Media, Token, Tweet, TweetMedia, User
 from settings import settings
 from tests.db_utils import DBManager, alembic_config_from_url
 from tests.test_media import MediaItem
+from utils.snowflake import snowflake
 
 MIGRATION_TASK: Task | None = None
 
@@ -52,6 +53,14 @@ def threads() -> None:
     MediaController.stop_threads()
 
 
+@pytest.fixture(scope="session", name="snowflake_worker", autouse=True)
+def snowflake_worker() -> None:
+    # Lifespan, which assigns the worker id, is not run by tests
+    snowflake.assign(settings.SNOWFLAKE_WORKER_ID or 0)
+    yield
+    snowflake.assign(settings.SNOWFLAKE_WORKER_ID)
+
+
 @pytest.fixture(scope="session", name="pg_url")
 def pg_url() -> URL:
     """Provides base PostgreSQL URL for creating temporary databases."""
@@ -0,0 +1,42 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from utils.batching import Batcher
+
+
+class TestBatcher:
+    async def test_batches(self) -> None:
+        batches: List[List[int]] = []
+
+        async def double(items: List[int]) -> List[int]:
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        batcher = Batcher("TestBatcher", double, window=0.05, max_size=3)
+        results = await asyncio.gather(*(batcher.submit(item) for item in range(5)))
+
+        assert results == [0, 2, 4, 6, 8]
+        assert batches == [[0, 1, 2], [3, 4]]
+        assert batcher.stats()["batches"] == 2
+        assert batcher.stats()["max_batch"] == 3
+        assert batcher.stats()["pending"] == 0
+
+    async def test_failure(self) -> None:
+        async def fail(items: List[int]) -> List[int]:
+            raise ValueError("Batch failed")
+
+        batcher = Batcher("TestBatcher", fail, window=0.01, max_size=10)
+        results = await asyncio.gather(
+            batcher.submit(1),
+            batcher.submit(2),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+        with pytest.raises(ValueError):
+            await batcher.submit(3)
+
+        assert batcher.stats()["batches"] == 0
@@ -0,0 +1,21 @@
+from utils.bloom import BloomFilter
+
+
+class TestBloomFilter:
+    def test_membership(self) -> None:
+        items = range(0, 2000, 2)
+        bloom = BloomFilter.from_items(items, error_rate=0.01)
+
+        assert all(item in bloom for item in items)
+
+        false_positives = sum(item in bloom for item in range(1, 2000, 2))
+        assert false_positives < 50
+
+    def test_add(self) -> None:
+        bloom = BloomFilter(capacity=100)
+
+        assert 7 not in bloom
+
+        bloom.add(7)
+
+        assert 7 in bloom
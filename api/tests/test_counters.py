@@ -0,0 +1,22 @@
+from utils.counters import CounterShards
+
+
+class TestCounterShards:
+    def test_escalation(self) -> None:
+        shards = CounterShards(max_shards=4, contention_latency=0.05)
+
+        assert shards.shards(1) == 1
+        assert shards.shard(1) == 0
+
+        assert shards.report(1, 0.01) is False
+        assert shards.shards(1) == 1
+
+        assert shards.report(1, 0.1) is True
+        assert shards.shards(1) == 2
+
+        assert shards.report(1, 0.1) is True
+        assert shards.report(1, 0.1) is False
+        assert shards.shards(1) == 4
+        assert 0 <= shards.shard(1) < 4
+
+        assert shards.shards(2) == 1
@@ -0,0 +1,49 @@
+from array import array
+
+from utils.follow_graph import FollowGraphIndex
+
+
+class TestFollowGraphIndex:
+    EDGES = [(1, 2), (1, 3), (2, 3), (3, 1), (4, 1), (4, 3)]
+
+    def test_load(self) -> None:
+        index = FollowGraphIndex()
+        index.load(self.EDGES)
+
+        assert index.is_loaded is True
+        assert index.edges_count == len(self.EDGES)
+        assert index.following(1) == array("q", [2, 3])
+        assert index.followers(3) == array("q", [1, 2, 4])
+        assert index.following(5) == array("q")
+        assert index.memory_footprint > 0
+        assert index.rebuild_time is not None
+
+    def test_follow_unfollow(self) -> None:
+        index = FollowGraphIndex()
+        index.load(self.EDGES)
+
+        index.follow(2, 4)
+        index.unfollow(1, 3)
+
+        assert index.following(2) == array("q", [3, 4])
+        assert index.followers(4) == array("q", [2])
+        assert index.following(1) == array("q", [2])
+        assert index.followers(3) == array("q", [2, 4])
+        assert index.edges_count == len(self.EDGES)
+
+    def test_compact(self) -> None:
+        index = FollowGraphIndex(compact_threshold=2)
+        index.load(self.EDGES)
+
+        index.follow(5, 1)
+        index.follow(5, 2)
+
+        assert index.following(5) == array("q", [1, 2])
+        assert index.followers(1) == array("q", [3, 4, 5])
+        assert index.edges_count == len(self.EDGES) + 2
+
+    def test_intersect(self) -> None:
+        index = FollowGraphIndex()
+        index.load(self.EDGES)
+
+        assert index.intersect(index.following(4), index.followers(3)) == [1]
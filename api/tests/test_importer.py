@@ -0,0 +1,149 @@
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+from uuid import uuid4
+
+import asyncpg
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from importer import Importer
+from models.managers import DatabaseAsyncSessionManager, LikeManager, UserManager
+from models.schemas import (
+    ImportCheckpoint,
+    Like,
+    Token,
+    Tweet,
+    TweetMention,
+    TweetTag,
+    User,
+)
+
+BASE_ID = 10_000_000
+
+
+def write_ndjson(path: Path, items: List[Dict]) -> None:
+    path.write_text("".join(f"{json.dumps(item)}\n" for item in items))
+
+
+class TestImporter:
+    async def test_resume(
+        self,
+        sessionmanager_for_tests: DatabaseAsyncSessionManager,
+        session: AsyncSession,
+        tmp_path: Path,
+    ) -> None:
+        users = [
+            {"id": BASE_ID + i, "name": f"ImportedUser_{uuid4().hex}"} for i in range(5)
+        ]
+        user_ids = [user["id"] for user in users]
+        created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+        tweets = [
+            {
+                "id": BASE_ID + i,
+                "author_id": user_ids[i % 5],
+                "content": f"Imported[{i}] #Imported{i % 2} @{users[1]['name']}",
+                # Times without offset are UTC
+                "created_at": (created_at + timedelta(hours=i)).isoformat()[:-6],
+            }
+            for i in range(10)
+        ]
+
+        write_ndjson(tmp_path / "users.ndjson", users)
+        write_ndjson(
+            tmp_path / "tokens.ndjson",
+            [{"user_id": user_id, "api_key": uuid4().hex} for user_id in user_ids],
+        )
+        write_ndjson(
+            tmp_path / "likes.ndjson",
+            [
+                {
+                    "user_id": user_id,
+                    "tweet_id": BASE_ID,
+                    "created_at": "2024-05-02T08:00:00+02:00",
+                }
+                for user_id in user_ids
+            ],
+        )
+        write_ndjson(
+            tmp_path / "follows.ndjson",
+            [{"user_id": user_ids[0], "target_id": user_id} for user_id in user_ids[1:]],
+        )
+
+        # Unknown author breaks the third chunk
+        write_ndjson(
+            tmp_path / "tweets.ndjson",
+            [*tweets[:7], {**tweets[7], "author_id": BASE_ID - 1}, *tweets[8:]],
+        )
+
+        importer = Importer(tmp_path, batch_size=3)
+
+        try:
+            with pytest.raises(asyncpg.ForeignKeyViolationError):
+                await importer.run()
+
+            saved = await session.scalars(select(Tweet.id).where(Tweet.id >= BASE_ID))
+            assert len(saved.all()) == 6
+
+            write_ndjson(tmp_path / "tweets.ndjson", tweets)
+
+            imported = await importer.run()
+
+            assert imported == {
+                "users": 0,
+                "tokens": 0,
+                "tweets": 4,
+                "likes": 5,
+                "follows": 4,
+            }
+
+            saved = await session.execute(
+                select(Tweet.id, Tweet.created_at)
+                .where(Tweet.id >= BASE_ID)
+                .order_by(Tweet.id),
+            )
+            assert saved.tuples().all() == [
+                (tweet["id"], created_at + timedelta(hours=i))
+                for i, tweet in enumerate(tweets)
+            ]
+
+            tagged = await session.scalars(
+                select(TweetTag.tweet_id)
+                .where(TweetTag.tag == "imported0")
+                .order_by(TweetTag.tweet_id),
+            )
+            assert tagged.all() == [tweet["id"] for tweet in tweets[::2]]
+
+            mentioning = await session.scalars(
+                select(TweetMention.tweet_id)
+                .where(TweetMention.user_id == user_ids[1])
+                .order_by(TweetMention.tweet_id),
+            )
+            assert mentioning.all() == [tweet["id"] for tweet in tweets]
+
+            liked_at = await session.scalars(
+                select(Like.created_at).where(Like.tweet_id == BASE_ID).distinct(),
+            )
+            assert liked_at.all() == [datetime(2024, 5, 2, 6, tzinfo=timezone.utc)]
+
+            assert await LikeManager().get_likes_count(session, [BASE_ID]) == {
+                BASE_ID: len(users),
+            }
+
+            following = await UserManager().get_following(session, user_ids[:2])
+            assert following == {user_ids[0]: user_ids[1:], user_ids[1]: []}
+
+            # Sequences are moved past imported ids
+            tweet = Tweet(author_id=user_ids[0], content="AfterImport")
+            session.add(tweet)
+            await session.commit()
+
+            assert tweet.id > tweets[-1]["id"]
+        finally:
+            await session.execute(delete(Tweet).where(Tweet.author_id >= BASE_ID))
+            await session.execute(delete(Token).where(Token.user_id >= BASE_ID))
+            await session.execute(delete(User).where(User.id >= BASE_ID))
+            await session.execute(delete(ImportCheckpoint))
+            await session.commit()
@@ -7,6 +7,7 @@ from typing import List
 
 from fastapi import status
 from httpx import AsyncClient, Response
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.managers import MediaManager
@@ -96,6 +97,43 @@ class TestUploadMedia:
 
         await clear_media(session, response_json["media_id"])
 
+    async def test_idempotency_key(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key, "Idempotency-Key": "upload-1"}
+        files = {"file": ("idempotent.png", b"IdempotentMedia")}
+
+        responses: List[Response] = [
+            await client.request(
+                method=self._METHOD,
+                url=self.URL,
+                files=files,
+                headers=headers,
+            )
+            for _ in range(2)
+        ]
+        another: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            files={"file": ("idempotent.png", b"AnotherMedia")},
+            headers=headers,
+        )
+
+        assert all(r.status_code == status.HTTP_201_CREATED for r in responses)
+        assert another.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+        media_id = responses[0].json()["media_id"]
+        owned = await session.scalars(select(Media.id).where(Media.owner_id == user.id))
+
+        assert responses[1].json()["media_id"] == media_id
+        assert owned.all() == [media_id]
+
+        await clear_media(session, media_id)
+
     async def test_empty_filename(
         self,
         client: AsyncClient,
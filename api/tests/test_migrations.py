@@ -0,0 +1,74 @@
+from typing import Any, Callable
+
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import pool, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from migrations.helpers import create_index_concurrently, index_is_valid
+from models.managers import DatabaseAsyncSessionManager
+from settings import settings
+
+
+def run_operations(connection: Connection, operations: Callable[[], Any]) -> Any:
+    context = MigrationContext.configure(
+        connection,
+        opts={"transaction_per_migration": True},
+    )
+
+    with Operations.context(context):
+        with context.begin_transaction():
+            return operations()
+
+
+class TestCreateIndexConcurrently:
+    TABLE = "index_build_test"
+    INDEX = "ix_index_build_test_value"
+
+    async def test_resume_invalid_index(
+        self,
+        sessionmanager_for_tests: DatabaseAsyncSessionManager,
+    ) -> None:
+        engine = create_async_engine(settings.DB_URL, poolclass=pool.NullPool)
+
+        def build() -> None:
+            create_index_concurrently(self.INDEX, self.TABLE, ["value"], unique=True)
+
+        async with engine.connect() as connection:
+            await connection.execute(text(f"CREATE TABLE {self.TABLE} (value INTEGER)"))
+            await connection.execute(text(f"INSERT INTO {self.TABLE} VALUES (1), (1)"))
+            await connection.commit()
+
+            try:
+                # Duplicates break the build and leave an invalid index
+                with pytest.raises(IntegrityError):
+                    await connection.run_sync(run_operations, build)
+
+                await connection.rollback()
+
+                state = await connection.run_sync(
+                    run_operations,
+                    lambda: index_is_valid(self.INDEX),
+                )
+                assert state is False
+
+                await connection.execute(text(f"DELETE FROM {self.TABLE}"))
+                await connection.commit()
+
+                await connection.run_sync(run_operations, build)
+                await connection.run_sync(run_operations, build)
+
+                state = await connection.run_sync(
+                    run_operations,
+                    lambda: index_is_valid(self.INDEX),
+                )
+                assert state is True
+            finally:
+                await connection.rollback()
+                await connection.execute(text(f"DROP TABLE {self.TABLE}"))
+                await connection.commit()
+
+        await engine.dispose()
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from controllers import PartitionController
+from models.managers import PartitionManager
+from models.schemas import Tweet, User
+from settings import settings
+from utils.partitions import PartitionScheme, is_partition_name, parse_partition
+from utils.snowflake import SnowflakeGenerator, snowflake
+
+EPOCH = 1_767_225_600_000
+DAY = 86_400_000
+
+
+async def drop_partitions(session: AsyncSession) -> None:
+    partition_manager = PartitionManager()
+
+    for table_name in ("likes", "tweets"):
+        partitions = await partition_manager.get_partitions(session, table_name)
+
+        for partition in partitions:
+            if partition.lower is not None:
+                await partition_manager.detach_partition(
+                    session,
+                    table_name,
+                    partition.name,
+                    settings.PARTITIONS_LOCK_TIMEOUT,
+                )
+                await partition_manager.drop_table(session, partition.name)
+
+
+class TestPartitionScheme:
+    def test_bounds(self) -> None:
+        generator = SnowflakeGenerator(EPOCH, worker_id=0)
+        scheme = PartitionScheme(generator, days=30)
+
+        first = generator.min_id(EPOCH + 30 * DAY)
+
+        assert scheme.next_bound(0) == first
+        assert scheme.next_bound(generator.min_id(EPOCH + 29 * DAY)) == first
+        assert scheme.next_bound(first) == generator.min_id(EPOCH + 60 * DAY)
+
+        assert scheme.partition_name("tweets", None) == "tweets_legacy"
+        assert scheme.partition_name("tweets", first) == "tweets_p20260131"
+
+    def test_parse(self) -> None:
+        legacy = parse_partition("likes_legacy", "FOR VALUES FROM (MINVALUE) TO ('42')")
+        assert (legacy.lower, legacy.upper) == (None, 42)
+
+        partition = parse_partition("likes_p20260131", "FOR VALUES FROM ('42') TO ('84')")
+        assert (partition.lower, partition.upper) == (42, 84)
+
+        with pytest.raises(ValueError):
+            parse_partition("likes_default", "DEFAULT")
+
+    def test_names(self) -> None:
+        assert is_partition_name("tweets_legacy")
+        assert is_partition_name("likes_p20260131")
+        assert not is_partition_name("tweets")
+        assert not is_partition_name("tweet_media")
+
+
+class TestPartitionController:
+    async def test_maintain(
+        self,
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        period = timedelta(days=settings.TWEETS_PARTITION_DAYS)
+        later = datetime.now(timezone.utc) + 3 * period
+        controller = PartitionController()
+        partition_manager = PartitionManager()
+
+        try:
+            created, detached, dropped = await controller.maintain(later)
+
+            tweets_created = [name for name in created if name.startswith("tweets_")]
+            likes_created = [name for name in created if name.startswith("likes_")]
+
+            assert tweets_created and not detached and not dropped
+            assert likes_created == [
+                name.replace("tweets_", "likes_") for name in tweets_created
+            ]
+            assert await controller.maintain(later) == ([], [], [])
+
+            # Tweet ids of that time go to the last partition
+            tweet_id = snowflake.min_id(int(later.timestamp() * 1000))
+            session.add(Tweet(id=tweet_id, content="Partitioned", author_id=users[0].id))
+            await session.commit()
+
+            partitions = await partition_manager.get_partitions(session, "tweets")
+            kept = next(
+                partition.name
+                for partition in partitions
+                if partition.lower is not None
+                and partition.lower <= tweet_id < partition.upper
+            )
+
+            # Empty partitions older than retention are detached, then dropped;
+            # the legacy one stays
+            expired_at = later + (settings.TWEETS_PARTITIONS_AHEAD + 2) * period
+            monkeypatch.setattr(settings, "TWEETS_RETENTION", 1)
+            monkeypatch.setattr(settings, "TWEETS_PARTITIONS_AHEAD", 0)
+            _, detached, dropped = await controller.maintain(expired_at)
+
+            partitions = await partition_manager.get_partitions(session, "tweets")
+            names = {partition.name for partition in partitions}
+
+            assert kept not in detached and kept in names
+            assert "tweets_legacy" in names and "likes_legacy" not in detached
+            assert set(tweets_created) - {kept} <= set(detached)
+            assert set(detached) <= set(dropped)
+            assert not names & set(detached)
+            assert not await partition_manager.get_detached(session, "tweets")
+            assert not await partition_manager.get_detached(session, "likes")
+
+            await session.execute(delete(Tweet).where(Tweet.id == tweet_id))
+            await session.commit()
+        finally:
+            await drop_partitions(session)
+
+    async def test_detach_archived(
+        self,
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        period = timedelta(days=settings.TWEETS_PARTITION_DAYS)
+        later = datetime.now(timezone.utc) + 3 * period
+        controller = PartitionController()
+        partition_manager = PartitionManager()
+
+        try:
+            created, _, _ = await controller.maintain(later)
+
+            # Without retention, partitions past the archive horizon are detached
+            expired_at = later + (settings.TWEETS_PARTITIONS_AHEAD + 2) * period
+            expired_at += timedelta(days=settings.TWEETS_ARCHIVE_AFTER)
+            monkeypatch.setattr(settings, "TWEETS_RETENTION", 0)
+            monkeypatch.setattr(settings, "TWEETS_PARTITIONS_AHEAD", 0)
+            _, detached, dropped = await controller.maintain(expired_at)
+
+            assert set(created) <= set(detached)
+            assert set(detached) == set(dropped)
+
+            partitions = await partition_manager.get_partitions(session, "tweets")
+            assert "tweets_legacy" in {partition.name for partition in partitions}
+        finally:
+            await drop_partitions(session)
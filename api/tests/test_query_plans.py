@@ -0,0 +1,474 @@
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+import pytest
+from sqlalchemy import Connection, event, text
+from sqlalchemy.engine.interfaces import ExecutionContext
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.managers import (
+    AccountDeletionManager,
+    ArchivedTweetManager,
+    DatabaseAsyncSessionManager,
+    IdempotencyKeyManager,
+    LikeManager,
+    MediaManager,
+    PartitionManager,
+    TweetManager,
+    UserManager,
+    UserSuggestionManager,
+)
+from models.schemas import ArchivedTweet, Like, Tweet, User
+from utils.snowflake import snowflake
+
+# Full scan of a table with more estimated rows fails the test
+SEQ_SCAN_ROWS_THRESHOLD = 1000
+
+SEED_USERS = 5000
+SEED_TWEETS = 20000
+SEED_LIKES = 50000
+SEED_MEDIA = 20000
+
+SEED_STATEMENTS = [
+    f"""
+    INSERT INTO users (name, followers, following)
+    SELECT 'PlanUser[' || i || ']', '[]', '[]' FROM generate_series(1, {SEED_USERS}) i
+    """,
+    """
+    INSERT INTO tokens (api_key, user_id)
+    SELECT 'plan-key-' || id, id FROM users WHERE name LIKE 'PlanUser[%'
+    """,
+    f"""
+    WITH u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users)
+    INSERT INTO tweets (content, author_id)
+    SELECT 'PlanTweet[' || i || ']', u.ids[1 + i % {SEED_USERS}]
+    FROM u, generate_series(1, {SEED_TWEETS}) i
+    """,
+    f"""
+    WITH u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users),
+    t AS (SELECT array_agg(id ORDER BY id) AS ids FROM tweets)
+    INSERT INTO likes (user_id, tweet_id)
+    SELECT u.ids[1 + i % {SEED_USERS}], t.ids[1 + (i * 7919) % {SEED_TWEETS}]
+    FROM u, t, generate_series(1, {SEED_LIKES}) i
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO tweet_like_counters (tweet_id, shard, count)
+    SELECT tweet_id, 0, count(*) FROM likes GROUP BY tweet_id
+    """,
+    f"""
+    INSERT INTO media (name, file)
+    SELECT 'PlanMedia', '/plan/media/' || i FROM generate_series(1, {SEED_MEDIA}) i
+    """,
+    """
+    WITH m AS (SELECT id, row_number() OVER (ORDER BY id) AS n FROM media),
+    t AS (SELECT id, row_number() OVER (ORDER BY id) AS n FROM tweets)
+    INSERT INTO tweet_media (tweet_id, media_id)
+    SELECT t.id, m.id FROM m JOIN t USING (n)
+    """,
+    """
+    WITH u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users)
+    INSERT INTO user_suggestions (user_id, suggested_ids)
+    SELECT id, u.ids[1:20] FROM users, u
+    """,
+    """
+    INSERT INTO tweet_tags (tag, tweet_id)
+    SELECT 'plan' || (id % 100), id FROM tweets
+    """,
+    f"""
+    WITH u AS (SELECT array_agg(id ORDER BY id) AS ids FROM users),
+    t AS (SELECT id, row_number() OVER (ORDER BY id) AS n FROM tweets)
+    INSERT INTO tweet_mentions (user_id, tweet_id)
+    SELECT u.ids[1 + (t.n * 31) % {SEED_USERS}], t.id FROM u, t
+    """,
+    """
+    INSERT INTO idempotency_keys (user_id, key, fingerprint, response)
+    SELECT id, 'plan-idempotency-key', sha256(''), '{}' FROM users
+    """,
+]
+
+CLEAR_STATEMENT = """
+TRUNCATE likes, tweet_media, tweet_like_counters, user_suggestions, tweets, tokens,
+media, users, account_deletions, import_checkpoints, idempotency_keys, archived_tweets,
+tweet_tags, tweet_mentions
+"""
+
+
+@dataclass
+class Seed:
+    user_ids: List[int]
+    tweet_ids: List[int]
+    media_ids: List[int]
+    api_key: str
+
+
+@contextmanager
+def captured_statements(
+    async_session: AsyncSession,
+) -> Iterator[List[Tuple[str, Any]]]:
+    """Collects `(statement, parameters)` sent to the database."""
+    statements = []
+    engine = async_session.bind.sync_engine
+
+    def capture(
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext | None,
+        executemany: bool,
+    ) -> None:
+        if statement.lstrip().split(None, 1)[0].upper() in (
+            "SELECT",
+            "INSERT",
+            "UPDATE",
+            "DELETE",
+            "WITH",
+        ):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+INDEXES_STATEMENT = """
+SELECT i.relname, t.relname, a.attname
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_class t ON t.oid = x.indrelid
+LEFT JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+"""
+
+
+def full_scans(
+    plan: Dict[str, Any],
+    indexes: Dict[str, Tuple[str, str | None]],
+    limited: bool = False,
+) -> Iterator[str]:
+    """
+    Tables read in full: Seq Scans and index scans without a condition on the
+    leading index column (unless cut by Limit).
+    """
+    node_type = plan["Node Type"]
+
+    if node_type in ("Seq Scan", "Parallel Seq Scan"):
+        yield plan["Relation Name"]
+    elif "Index Name" in plan:
+        table, column = indexes[plan["Index Name"]]
+        condition = plan.get("Index Cond")
+
+        if condition is None:
+            if not limited:
+                yield table
+        elif column is not None and not re.search(
+            rf"\(\(?{re.escape(column)}\)?(::[\w ]+)? ([=<>~]|IS )",
+            condition,
+        ):
+            yield table
+
+    for child in plan.get("Plans", []):
+        yield from full_scans(child, indexes, limited or node_type == "Limit")
+
+
+@pytest.fixture(scope="class", name="seed")
+async def seed(
+    sessionmanager_for_tests: DatabaseAsyncSessionManager,
+) -> AsyncGenerator[Seed, None]:
+    async with sessionmanager_for_tests.session() as session:
+        for stmt in SEED_STATEMENTS:
+            await session.execute(text(stmt))
+
+        await session.execute(text("ANALYZE"))
+        await session.commit()
+
+        ids = {}
+
+        for table in ("users", "tweets", "media"):
+            result = await session.scalars(text(f"SELECT id FROM {table} ORDER BY id"))
+            ids[table] = list(result.all())
+
+        await session.commit()
+
+        yield Seed(
+            user_ids=ids["users"],
+            tweet_ids=ids["tweets"],
+            media_ids=ids["media"],
+            api_key=f"plan-key-{ids['users'][0]}",
+        )
+
+        await session.execute(text(CLEAR_STATEMENT))
+        await session.commit()
+
+
+Query = Callable[[AsyncSession, Seed], Awaitable[Any]]
+
+# UserManager.get_follow_edges reads the whole table by design
+QUERIES: Dict[str, Query] = {
+    "TweetManager.get_tweets": lambda s, seed: TweetManager().get_tweets(s),
+    "TweetManager.get_tweets[since]": lambda s, seed: TweetManager().get_tweets(
+        s,
+        since=datetime.now(timezone.utc) - timedelta(hours=1),
+        until=datetime.now(timezone.utc),
+    ),
+    "TweetManager.get_tweets[min_id]": lambda s, seed: TweetManager().get_tweets(
+        s,
+        since=datetime.now(timezone.utc) - timedelta(hours=1),
+        min_id=snowflake.min_id(time.time_ns() // 1_000_000 - 3_600_000),
+        legacy_upper=snowflake.min_id(time.time_ns() // 1_000_000),
+    ),
+    "TweetManager.search": lambda s, seed: TweetManager().search(s, "PlanTweet[10]"),
+    "TweetManager.search[after]": lambda s, seed: TweetManager().search(
+        s,
+        "PlanTweet[10]",
+        after=(0.1, seed.tweet_ids[-1]),
+    ),
+    "TweetManager.get_tagged": lambda s, seed: TweetManager().get_tagged(s, "plan10"),
+    "TweetManager.get_tagged[before]": lambda s, seed: TweetManager().get_tagged(
+        s,
+        "plan10",
+        before=seed.tweet_ids[-1000],
+    ),
+    "TweetManager.get_mentioning": (
+        lambda s, seed: TweetManager().get_mentioning(s, seed.user_ids[31])
+    ),
+    "TweetManager.get_mentioning[before]": (
+        lambda s, seed: TweetManager().get_mentioning(
+            s,
+            seed.user_ids[31],
+            before=seed.tweet_ids[-1000],
+        )
+    ),
+    "TweetManager.expire_tweets": (
+        lambda s, seed: TweetManager().expire_tweets(s, timedelta(days=30), 100)
+    ),
+    "ArchivedTweetManager.archive": (
+        lambda s, seed: ArchivedTweetManager().archive(s, timedelta(days=30), 100)
+    ),
+    "ArchivedTweetManager.get_tweets": (
+        lambda s, seed: ArchivedTweetManager().get_tweets(
+            s,
+            since=datetime.now(timezone.utc) - timedelta(days=365),
+        )
+    ),
+    "ArchivedTweetManager.delete_tweets": (
+        lambda s, seed: ArchivedTweetManager().delete_tweets(
+            s,
+            [ArchivedTweet.id == seed.tweet_ids[0], ArchivedTweet.author_id == 1],
+            1,
+        )
+    ),
+    "TweetManager.get_tweet_with_author_id": (
+        lambda s, seed: TweetManager().get_tweet_with_author_id(s, seed.tweet_ids[10])
+    ),
+    "TweetManager.delete_own_tweet": lambda s, seed: TweetManager().delete_own_tweet(
+        s,
+        seed.tweet_ids[-1],
+        seed.user_ids[-1],
+    ),
+    "TweetManager.exists": lambda s, seed: TweetManager().exists(
+        s,
+        [Tweet.id == seed.tweet_ids[-1]],
+    ),
+    "TweetManager.add_with_media": lambda s, seed: TweetManager().add_with_media(
+        s,
+        seed.user_ids[10],
+        "PlanTweet #plan10 @PlanMention",
+        seed.media_ids[:3],
+    ),
+    "TweetManager.add_batch": lambda s, seed: TweetManager().add_batch(
+        s,
+        [
+            (seed.user_ids[10], "PlanTweet #plan10 @PlanMention"),
+            (seed.user_ids[11], "PlanTweet"),
+        ],
+    ),
+    "TweetManager.add_many": lambda s, seed: TweetManager().add_many(
+        s,
+        [
+            (seed.user_ids[10], "PlanTweet", seed.media_ids[:2]),
+            (seed.user_ids[11], "PlanTweet", []),
+        ],
+    ),
+    "TweetManager.delete_author_tweets": (
+        lambda s, seed: TweetManager().delete_author_tweets(s, seed.user_ids[-1], 100)
+    ),
+    "TweetManager.get_deleted_ids": lambda s, seed: TweetManager().get_deleted_ids(s),
+    "TweetManager.purge_likes": lambda s, seed: TweetManager().purge_likes(
+        s,
+        seed.tweet_ids[-10:],
+        100,
+    ),
+    "TweetManager.purge_media": lambda s, seed: TweetManager().purge_media(
+        s,
+        seed.tweet_ids[-10:],
+        100,
+    ),
+    "TweetManager.delete_purged": lambda s, seed: TweetManager().delete_purged(
+        s,
+        seed.tweet_ids[-10:],
+    ),
+    "UserManager.get_user_detail": (
+        lambda s, seed: UserManager().get_user_detail(s, seed.user_ids[10])
+    ),
+    "UserManager.get_users_detail": (
+        lambda s, seed: UserManager().get_users_detail(s, seed.user_ids[:20])
+    ),
+    "UserManager.get_user_by_api_key": (
+        lambda s, seed: UserManager().get_user_by_api_key(seed.api_key, s)
+    ),
+    "UserManager.exists": lambda s, seed: UserManager().exists(
+        s,
+        [User.id == seed.user_ids[10]],
+    ),
+    "UserManager.update": lambda s, seed: UserManager().update(
+        s,
+        [{"id": seed.user_ids[10], "following": [seed.user_ids[11]]}],
+    ),
+    "UserManager.update_follows": lambda s, seed: UserManager().update_follows(
+        s,
+        [{"id": seed.user_ids[10], "following": [], "followers": []}],
+    ),
+    "UserManager.get_following": (
+        lambda s, seed: UserManager().get_following(s, seed.user_ids[:20])
+    ),
+    "UserManager.get_names": (
+        lambda s, seed: UserManager().get_names(s, seed.user_ids[:20])
+    ),
+    "UserManager.search_by_name": (
+        lambda s, seed: UserManager().search_by_name(s, "planuser[12", 10)
+    ),
+    "UserManager.tombstone": (
+        lambda s, seed: UserManager().tombstone(s, seed.user_ids[-1], "tweets")
+    ),
+    "AccountDeletionManager.get_pending": (
+        lambda s, seed: AccountDeletionManager().get_pending(s)
+    ),
+    "AccountDeletionManager.save_progress": (
+        lambda s, seed: AccountDeletionManager().save_progress(
+            s,
+            seed.user_ids[-1],
+            "likes",
+            tweets=1,
+        )
+    ),
+    "UserSuggestionManager.get_suggestions": (
+        lambda s, seed: UserSuggestionManager().get_suggestions(s, seed.user_ids[10])
+    ),
+    "UserSuggestionManager.upsert": lambda s, seed: UserSuggestionManager().upsert(
+        s,
+        [{"user_id": seed.user_ids[10], "suggested_ids": seed.user_ids[:5]}],
+    ),
+    "LikeManager.like": (
+        lambda s, seed: LikeManager().like(s, seed.user_ids[10], seed.tweet_ids[10])
+    ),
+    "LikeManager.unlike": (
+        lambda s, seed: LikeManager().unlike(s, seed.user_ids[10], seed.tweet_ids[10])
+    ),
+    "LikeManager.purge_user_likes": (
+        lambda s, seed: LikeManager().purge_user_likes(s, seed.user_ids[-1], 100)
+    ),
+    "LikeManager.apply_batch": lambda s, seed: LikeManager().apply_batch(
+        s,
+        [(seed.user_ids[10], seed.tweet_ids[20])],
+        [(seed.user_ids[10], seed.tweet_ids[30])],
+        {seed.tweet_ids[20]: 0, seed.tweet_ids[30]: 0},
+    ),
+    "LikeManager.get_liked": lambda s, seed: LikeManager().get_liked(
+        s,
+        seed.user_ids[10],
+        seed.tweet_ids[:100],
+    ),
+    "LikeManager.get_liked_tweet_ids": (
+        lambda s, seed: LikeManager().get_liked_tweet_ids(s, seed.user_ids[10])
+    ),
+    "LikeManager.get_likes_count": (
+        lambda s, seed: LikeManager().get_likes_count(s, seed.tweet_ids[:100])
+    ),
+    "LikeManager.delete": lambda s, seed: LikeManager().delete(
+        s,
+        [Like.tweet_id == seed.tweet_ids[40]],
+    ),
+    "MediaManager.delete_owner_media": (
+        lambda s, seed: MediaManager().delete_owner_media(s, seed.user_ids[-1], 100)
+    ),
+    "MediaManager.get_media": (
+        lambda s, seed: MediaManager().get_media(s, seed.media_ids[:10])
+    ),
+    "IdempotencyKeyManager.claim": lambda s, seed: IdempotencyKeyManager().claim(
+        s,
+        seed.user_ids[10],
+        "plan-idempotency-key",
+        b"",
+        3600,
+        5000,
+    ),
+    "IdempotencyKeyManager.save_response": (
+        lambda s, seed: IdempotencyKeyManager().save_response(
+            s,
+            seed.user_ids[10],
+            "plan-idempotency-key",
+            {"tweet_id": seed.tweet_ids[10]},
+        )
+    ),
+    "IdempotencyKeyManager.release": lambda s, seed: IdempotencyKeyManager().release(
+        s,
+        seed.user_ids[11],
+        "plan-idempotency-key",
+    ),
+    "IdempotencyKeyManager.delete_expired": (
+        lambda s, seed: IdempotencyKeyManager().delete_expired(s, 3600, 100)
+    ),
+    "PartitionManager.get_partitions": (
+        lambda s, seed: PartitionManager().get_partitions(s, "tweets")
+    ),
+}
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("name", QUERIES)
+    async def test_no_seq_scan(
+        self,
+        seed: Seed,
+        session: AsyncSession,
+        name: str,
+    ) -> None:
+        with captured_statements(session) as statements:
+            await QUERIES[name](session, seed)
+
+        assert statements, f"{name} sent no statements"
+
+        result = await session.execute(text("SELECT relname, reltuples FROM pg_class"))
+        table_rows = dict(result.tuples().all())
+        indexes = {
+            index: (table, column)
+            for index, table, column in await session.execute(text(INDEXES_STATEMENT))
+        }
+        connection = await session.connection()
+
+        # Seq Scan is then planned only when no index can serve the query
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+        for statement, parameters in statements:
+            result = await connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}",
+                parameters,
+            )
+            plan = result.scalar_one()[0]["Plan"]
+
+            large_scans = [
+                table
+                for table in full_scans(plan, indexes)
+                if table_rows.get(table, 0) > SEQ_SCAN_ROWS_THRESHOLD
+            ]
+
+            assert not large_scans, f"{name}: full scan of {large_scans}\n{statement}"
+
+        await session.commit()
@@ -0,0 +1,159 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from controllers import SnowflakeController
+from models.managers import SnowflakeWorkerManager
+from models.schemas import SnowflakeWorker
+from settings import settings
+from utils.snowflake import (
+    ClockSkewError,
+    SnowflakeGenerator,
+    WorkerIdError,
+    snowflake,
+)
+
+EPOCH = 1_767_225_600_000
+
+
+class TestSnowflakeGenerator:
+    def test_ordered(self) -> None:
+        generator = SnowflakeGenerator(EPOCH, worker_id=3, worker_bits=5, sequence_bits=6)
+
+        # More ids than the sequence allows in one millisecond
+        ids = generator.next_ids(500)
+
+        assert ids == sorted(set(ids))
+        assert all((snowflake_id >> 6) & 0b11111 == 3 for snowflake_id in ids)
+        assert ids[-1] < 2**53
+
+    def test_timestamp(self) -> None:
+        generator = SnowflakeGenerator(EPOCH, worker_id=1)
+        now = time.time_ns() // 1_000_000
+
+        snowflake_id = generator.next_id()
+
+        assert now <= generator.timestamp(snowflake_id) <= now + 1000
+        assert generator.min_id(now) <= snowflake_id
+        assert generator.min_id(now + 1000) > snowflake_id
+
+    def test_sequence_rollover(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        generator = SnowflakeGenerator(EPOCH, worker_id=1, sequence_bits=1)
+        now = time.time_ns()
+
+        monkeypatch.setattr(time, "time_ns", lambda: now)
+
+        # Exhausted sequences continue in the next milliseconds without waiting
+        ids = generator.next_ids(5)
+
+        assert ids == sorted(set(ids))
+        assert generator.timestamp(ids[4]) == generator.timestamp(ids[0]) + 2
+
+        # Until the clock catches up
+        monkeypatch.setattr(time, "time_ns", lambda: now + 1_000_000)
+
+        assert generator.next_id() == ids[4] + 1
+
+    def test_clock_skew(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        generator = SnowflakeGenerator(EPOCH, worker_id=1)
+        now = time.time_ns()
+
+        monkeypatch.setattr(time, "time_ns", lambda: now)
+        first_id = generator.next_id()
+
+        # Step back by one millisecond continues from the last id
+        monkeypatch.setattr(time, "time_ns", lambda: now - 1_000_000)
+
+        assert generator.next_id() == first_id + 1
+
+        monkeypatch.setattr(time, "time_ns", lambda: now - 5_000_000)
+
+        with pytest.raises(ClockSkewError):
+            generator.next_id()
+
+    def test_worker_id(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        with pytest.raises(ValueError):
+            SnowflakeGenerator(EPOCH, worker_id=32, worker_bits=5)
+
+        generator = SnowflakeGenerator(EPOCH, worker_id=None)
+
+        with pytest.raises(WorkerIdError):
+            generator.next_id()
+
+        generator.assign(1, valid_for=60)
+        assert generator.next_id()
+
+        # Leased worker id is not used after the lease
+        monotonic = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: monotonic + 61)
+
+        with pytest.raises(WorkerIdError):
+            generator.next_id()
+
+
+class TestSnowflakeWorkers:
+    async def test_lease(self, session: AsyncSession) -> None:
+        manager = SnowflakeWorkerManager()
+        await session.execute(delete(SnowflakeWorker))
+
+        assert await manager.lease(session, "first", 2, 60) == 0
+        assert await manager.lease(session, "second", 2, 60) == 1
+        assert await manager.lease(session, "third", 2, 60) is None
+
+        assert await manager.renew(session, 0, "first", 60)
+        assert not await manager.renew(session, 0, "third", 60)
+
+        await manager.release(session, 0, "first")
+
+        assert await manager.lease(session, "third", 2, 60) == 0
+
+        # Expired lease is taken over and cannot be renewed
+        await session.execute(
+            update(SnowflakeWorker)
+            .where(SnowflakeWorker.worker_id == 1)
+            .values(leased_until=datetime.now(timezone.utc) - timedelta(seconds=1)),
+        )
+        await session.commit()
+
+        assert await manager.lease(session, "fourth", 2, 60) == 1
+        assert not await manager.renew(session, 1, "second", 60)
+
+    async def test_controller(
+        self,
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "SNOWFLAKE_WORKER_ID", None)
+        await session.execute(delete(SnowflakeWorker))
+        await session.commit()
+
+        worker_id = snowflake.worker_id
+
+        try:
+            await SnowflakeController.start_task()
+
+            assert snowflake.worker_id == 0
+            assert snowflake.next_id()
+            assert await session.get(SnowflakeWorker, 0, populate_existing=True)
+
+            await SnowflakeController.stop_task()
+
+            assert snowflake.worker_id is None
+            assert await session.get(SnowflakeWorker, 0, populate_existing=True) is None
+        finally:
+            await SnowflakeController.stop_task()
+            snowflake.assign(worker_id)
+
+    async def test_out_of_range(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(
+            settings, "SNOWFLAKE_WORKER_ID", 1 << settings.SNOWFLAKE_WORKER_BITS
+        )
+        worker_id = snowflake.worker_id
+
+        with pytest.raises(ValueError):
+            await SnowflakeController.start_task()
+
+        assert snowflake.worker_id == worker_id
@@ -1,10 +1,36 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
 from random import choice
-from typing import List
+from time import perf_counter
+from typing import List, Tuple
+from uuid import uuid4
 
+import pytest
 from fastapi import status
 from httpx import AsyncClient, Response
-
-from models.schemas import Tweet, User
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from controllers import IdempotencyController, LikeController, TweetController
+from models.managers import (
+    DatabaseAsyncSessionManager,
+    LikeManager,
+    MediaManager,
+    TweetManager,
+)
+from models.models import CrateTweetModel
+from models.schemas import (
+    IdempotencyKey,
+    Like,
+    Media,
+    Tweet,
+    TweetMedia,
+    TweetMention,
+    TweetTag,
+    User,
+)
+from settings import settings
 from tests.common import bad_request, method_not_allowed, unauthorised
 
 
@@ -44,15 +70,711 @@ class TestGetTweets:
                     }
                     for like in tweet.likers
                 ],
+                "likes_count": len(tweet.likers),
+                "liked_by_me": any(like.user_id == user.id for like in tweet.likers),
             }
             for tweet in tweets
         ]
 
-        assert response.status_code == status.HTTP_200_OK
-        assert response_json["result"] is True
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["result"] is True
+
+        for tweet in response_json["tweets"]:
+            assert tweet in expected_data
+
+    async def test_time_range(
+        self,
+        client: AsyncClient,
+        tweets: List[Tweet],
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        headers = {"api-key": choice(users).token.api_key}
+        old_tweet = choice(tweets)
+        now = datetime.now(timezone.utc)
+
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == old_tweet.id)
+            .values(created_at=now - timedelta(days=2)),
+        )
+        await session.commit()
+
+        ranges = {
+            "recent": {"since": (now - timedelta(days=1)).isoformat()},
+            "old": {"until": (now - timedelta(days=1)).isoformat()},
+        }
+        found = {}
+
+        for name, params in ranges.items():
+            response: Response = await client.request(
+                method=self._METHOD,
+                url=self.URL,
+                headers=headers,
+                params=params,
+            )
+
+            assert response.status_code == status.HTTP_200_OK
+            found[name] = {tweet["id"] for tweet in response.json()["tweets"]}
+
+        assert found["old"] == {old_tweet.id}
+        assert found["recent"] == {tweet.id for tweet in tweets} - {old_tweet.id}
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            params={"since": now.isoformat(), "until": now.isoformat()},
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_archive(
+        self,
+        client: AsyncClient,
+        tweets: List[Tweet],
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "TWEETS_ARCHIVE_AFTER", 30)
+        liker = choice(users)
+        old_tweet = choice(tweets)
+
+        session.add(Like(user_id=liker.id, tweet_id=old_tweet.id))
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == old_tweet.id)
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=31)),
+        )
+        await session.commit()
+
+        assert await TweetController().archive() == 1
+
+        likes = await session.scalars(select(Like).where(Like.tweet_id == old_tweet.id))
+        assert not likes.all()
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": liker.token.api_key},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+        found = {tweet["id"]: tweet for tweet in response.json()["tweets"]}
+
+        assert found.keys() == {tweet.id for tweet in tweets}
+        assert found[old_tweet.id] == {
+            "id": old_tweet.id,
+            "content": old_tweet.content,
+            "attachments": [old_tweet.attachments[0].media_item.file],
+            "author": {"id": old_tweet.author.id, "name": old_tweet.author.name},
+            "likes": [{"user_id": liker.id, "name": liker.name}],
+            "likes_count": 1,
+            "liked_by_me": True,
+        }
+
+    async def test_unauthorised(
+        self,
+        client: AsyncClient,
+    ) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+    async def test_bad_api_key(
+        self,
+        client: AsyncClient,
+    ) -> None:
+        params = {"api-key": -1}
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+            params=params,
+        )
+        assert result == "Invalid api-key"
+
+    async def test_not_allowed_method(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+        params = {"api-key": user.token.api_key}
+
+        result = await method_not_allowed(
+            not_allowed_method="PUT",
+            url=self.URL,
+            client=client,
+            params=params,
+        )
+        assert result == "Method Not Allowed"
+
+
+class TestSearchTweets:
+    URL = "/api/tweets/search"
+    _METHOD = "GET"
+
+    async def test_valid(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key}
+        contents = [
+            "Postgres full text search",
+            "Search in postgres, postgres and postgres",
+            "Tuning postgres",
+            "Nothing to see here",
+        ]
+
+        tweets = [Tweet(author_id=user.id, content=content) for content in contents]
+        session.add_all(tweets)
+        await session.commit()
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            params={"q": "postgres search"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+        response_json = response.json()
+
+        # More matches of the query rank higher
+        assert [tweet["id"] for tweet in response_json["tweets"]] == [
+            tweets[1].id,
+            tweets[0].id,
+        ]
+        assert response_json["tweets"][0]["author"] == {"id": user.id, "name": user.name}
+        assert response_json["next_cursor"] is None
+
+        monkeypatch.setattr(settings, "TWEETS_SEARCH_PAGE_SIZE", 2)
+        found, cursor = [], None
+
+        while True:
+            params = {"q": "postgres"}
+
+            if cursor is not None:
+                params["cursor"] = cursor
+
+            response = await client.request(
+                method=self._METHOD,
+                url=self.URL,
+                headers=headers,
+                params=params,
+            )
+
+            assert response.status_code == status.HTTP_200_OK
+
+            found.extend(tweet["id"] for tweet in response.json()["tweets"])
+            cursor = response.json()["next_cursor"]
+
+            if cursor is None:
+                break
+
+        assert len(found) == len(set(found))
+        assert set(found) == {tweet.id for tweet in tweets[:3]}
+        assert found[0] == tweets[1].id
+
+    async def test_invalid_cursor(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        result = await bad_request(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            params={"q": "postgres", "cursor": "not a cursor"},
+            headers={"api-key": choice(users).token.api_key},
+        )
+
+        assert result == "Invalid cursor"
+
+    async def test_unauthorised(
+        self,
+        client: AsyncClient,
+    ) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+            params={"q": "postgres"},
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestTaggedTweets:
+    URL = "/api/tags/{tag}"
+    _METHOD = "GET"
+
+    async def test_valid(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key}
+        contents = [
+            "First #Postgres tweet",
+            "Second #postgres tweet",
+            "Not tagged postgres tweet",
+            "Third #PostgreS tweet #index",
+            "Deleted #postgres tweet",
+        ]
+        tweet_ids = []
+
+        for content in contents:
+            response: Response = await client.request(
+                method="POST",
+                url="/api/tweets",
+                headers=headers,
+                json={"tweet_data": content},
+            )
+            tweet_ids.append(response.json()["tweet_id"])
+
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == tweet_ids[-1])
+            .values(deleted_at=datetime.now(timezone.utc)),
+        )
+        await session.commit()
+
+        monkeypatch.setattr(settings, "TWEETS_ENTITIES_PAGE_SIZE", 2)
+        pages, cursor = [], None
+
+        while True:
+            params = {} if cursor is None else {"cursor": cursor}
+
+            response = await client.request(
+                method=self._METHOD,
+                url=self.URL.format(tag="POSTGRES"),
+                headers=headers,
+                params=params,
+            )
+
+            assert response.status_code == status.HTTP_200_OK
+
+            pages.append([tweet["id"] for tweet in response.json()["tweets"]])
+            cursor = response.json()["next_cursor"]
+
+            if cursor is None:
+                break
+
+        # Newest first, untagged and deleted tweets are skipped
+        assert pages == [[tweet_ids[3], tweet_ids[1]], [tweet_ids[0]]]
+
+    async def test_invalid_tag(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        result = await bad_request(
+            method=self._METHOD,
+            url=self.URL.format(tag="not-a-tag"),
+            client=client,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            headers={"api-key": choice(users).token.api_key},
+        )
+
+        assert result == "Invalid tag"
+
+    async def test_invalid_cursor(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        result = await bad_request(
+            method=self._METHOD,
+            url=self.URL.format(tag="postgres"),
+            client=client,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            params={"cursor": "not a cursor"},
+            headers={"api-key": choice(users).token.api_key},
+        )
+
+        assert result == "Invalid cursor"
+
+    async def test_unauthorised(
+        self,
+        client: AsyncClient,
+    ) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL.format(tag="postgres"),
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestCreateTweet:
+    URL = "/api/tweets"
+    _METHOD = "POST"
+
+    async def test_valid(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+        params = {"api-key": user.token.api_key}
+
+        data = {"tweet_data": "TestTweetData", "tweet_media_ids": []}
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            params=params,
+            json=data,
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response_json["result"] is True
+
+    async def test_media(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        user = choice(users)
+        media = [Media(name=f"Upload[{i}]", owner_id=user.id) for i in range(3)]
+        await MediaManager().add_all(session, media)
+
+        media_ids = [media_item.id for media_item in media]
+        data = {"tweet_data": "TestTweetData", "tweet_media_ids": media_ids}
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": user.token.api_key},
+            json=data,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+        tweet_id = response.json()["tweet_id"]
+        attached = await session.scalars(
+            select(TweetMedia.media_id).where(TweetMedia.tweet_id == tweet_id),
+        )
+
+        assert sorted(attached.all()) == media_ids
+
+    async def test_tags_and_mentions(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        user, mentioned = users[:2]
+        mentioned_name = f"Mentioned_{uuid4().hex}"
+
+        await session.execute(
+            update(User).where(User.id == mentioned.id).values(name=mentioned_name),
+        )
+        await session.commit()
+
+        content = (
+            f"#Postgres and #postgres by @{mentioned_name}, @{mentioned_name} "
+            f"and @Missing_{uuid4().hex}; not tags: a#b, mail@{mentioned_name}"
+        )
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": user.token.api_key},
+            json={"tweet_data": content},
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+        tweet_id = response.json()["tweet_id"]
+        tags = await session.scalars(
+            select(TweetTag.tag).where(TweetTag.tweet_id == tweet_id),
+        )
+        mentions = await session.scalars(
+            select(TweetMention.user_id).where(TweetMention.tweet_id == tweet_id),
+        )
+
+        assert tags.all() == ["postgres"]
+        assert mentions.all() == [mentioned.id]
+
+    async def test_group_commit(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "TWEETS_GROUP_COMMIT_WINDOW", 500)
+        monkeypatch.setattr(settings, "TWEETS_GROUP_COMMIT_SIZE", 4)
+
+        TweetController.start_group_commit()
+
+        try:
+            responses: List[Response] = await asyncio.gather(
+                *(
+                    client.request(
+                        method=self._METHOD,
+                        url=self.URL,
+                        headers={"api-key": user.token.api_key},
+                        json={"tweet_data": f"GroupTweet[{user.id}]"},
+                    )
+                    for user in users
+                ),
+            )
+            stats = TweetController.group_commit_stats()
+        finally:
+            await TweetController.stop_group_commit()
+
+        assert all(r.status_code == status.HTTP_201_CREATED for r in responses)
+
+        tweet_ids = [response.json()["tweet_id"] for response in responses]
+        saved = await session.execute(
+            select(Tweet.id, Tweet.author_id, Tweet.content).where(
+                Tweet.id.in_(tweet_ids),
+            ),
+        )
+
+        assert sorted(saved.tuples().all()) == sorted(
+            (tweet_id, user.id, f"GroupTweet[{user.id}]")
+            for tweet_id, user in zip(tweet_ids, users)
+        )
+        assert stats["items"] == len(users)
+        assert stats["batches"] == 3
+        assert stats["max_batch"] == 4
+
+    async def test_idempotency_key(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key, "Idempotency-Key": "create-tweet-1"}
+        data = {"tweet_data": "IdempotentTweet"}
+
+        # Concurrent duplicates run once
+        responses: List[Response] = await asyncio.gather(
+            *(
+                client.request(
+                    method=self._METHOD,
+                    url=self.URL,
+                    headers=headers,
+                    json=data,
+                )
+                for _ in range(3)
+            ),
+        )
+        retry: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json=data,
+        )
+        another: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json={"tweet_data": "AnotherTweet"},
+        )
+
+        assert all(r.status_code == status.HTTP_201_CREATED for r in responses)
+        assert retry.status_code == status.HTTP_201_CREATED
+        assert another.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+        tweet_ids = await session.scalars(
+            select(Tweet.id).where(
+                Tweet.author_id == user.id,
+                Tweet.content == "IdempotentTweet",
+            ),
+        )
+
+        assert tweet_ids.all() == [retry.json()["tweet_id"]]
+        assert {r.json()["tweet_id"] for r in responses} == {retry.json()["tweet_id"]}
+
+    async def test_idempotency_key_lease(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key, "Idempotency-Key": "create-tweet-3"}
+        data = {"tweet_data": "LeasedTweet"}
+        fingerprint = IdempotencyController.fingerprint(
+            self.URL,
+            CrateTweetModel(**data).model_dump_json().encode(),
+        )
+        claimed_at = datetime.now(timezone.utc) - timedelta(
+            milliseconds=settings.IDEMPOTENCY_KEY_WAIT + 1000,
+        )
+
+        # Claimed by a request whose process died before the response was saved
+        session.add(
+            IdempotencyKey(
+                user_id=user.id,
+                key="create-tweet-3",
+                fingerprint=fingerprint,
+                created_at=claimed_at,
+            ),
+        )
+        await session.commit()
+
+        started = perf_counter()
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json=data,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert perf_counter() - started < settings.IDEMPOTENCY_KEY_WAIT / 1000
+
+        stored = await session.scalar(
+            select(IdempotencyKey.response).where(
+                IdempotencyKey.user_id == user.id,
+                IdempotencyKey.key == "create-tweet-3",
+            ),
+        )
+
+        assert stored == {"tweet_id": response.json()["tweet_id"]}
+
+    async def test_idempotency_key_released(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key, "Idempotency-Key": "create-tweet-2"}
+        data = {"tweet_data": "RetriedTweet", "tweet_media_ids": [0]}
+
+        failed: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json=data,
+        )
+        retried: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json=data,
+        )
+
+        # Failed requests are not stored, a retry runs again
+        assert failed.status_code == status.HTTP_404_NOT_FOUND
+        assert retried.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.parametrize("rejected", ["foreign", "attached", "missing"])
+    async def test_rejected_media(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+        rejected: str,
+    ) -> None:
+        user, other_user = users[:2]
+        media = [Media(name="Upload", owner_id=user.id)]
+
+        if rejected == "foreign":
+            media.append(Media(name="Upload", owner_id=other_user.id))
+
+        await MediaManager().add_all(session, media)
+
+        media_ids = [media_item.id for media_item in media]
+
+        if rejected == "attached":
+            media_ids.append(tweets[0].attachments[0].media_id)
+        elif rejected == "missing":
+            media_ids.append(media_ids[0] + 1000)
+
+        data = {"tweet_data": "RejectedMediaTweet", "tweet_media_ids": media_ids}
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": user.token.api_key},
+            json=data,
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()["error_message"] == (
+            f"Media with ID {media_ids[1:]} not found"
+        )
+
+        saved = await session.scalars(
+            select(Tweet.id).where(Tweet.content == "RejectedMediaTweet"),
+        )
+
+        assert saved.all() == []
+
+    async def test_concurrent_media(
+        self,
+        users: List[User],
+        session: AsyncSession,
+        sessionmanager_for_tests: DatabaseAsyncSessionManager,
+    ) -> None:
+        user = choice(users)
+        media_item = Media(name="Upload", owner_id=user.id)
+        await MediaManager().add(session, media_item)
+
+        async def add(content: str) -> Tuple[int | None, List[int]]:
+            async with sessionmanager_for_tests.session() as async_session:
+                return await TweetManager().add_with_media(
+                    async_session,
+                    user.id,
+                    content,
+                    [media_item.id],
+                )
+
+        results = await asyncio.gather(add("First"), add("Second"))
+
+        assert sorted(rejected for _, rejected in results) == [[], [media_item.id]]
+
+        attached = await session.scalars(
+            select(TweetMedia.tweet_id).where(TweetMedia.media_id == media_item.id),
+        )
+
+        assert attached.all() == [tweet_id for tweet_id, _ in results if tweet_id]
+
+    async def test_missing_required_field(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+        params = {"api-key": user.token.api_key}
+
+        data = {"tweet_media_ids": []}
 
-        for tweet in response_json["tweets"]:
-            assert tweet in expected_data
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            params=params,
+            json=data,
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response_json["result"] is False
 
     async def test_unauthorised(
         self,
@@ -87,7 +809,7 @@ class TestGetTweets:
         params = {"api-key": user.token.api_key}
 
         result = await method_not_allowed(
-            not_allowed_method="PUT",
+            not_allowed_method="DELETE",
             url=self.URL,
             client=client,
             params=params,
@@ -95,91 +817,112 @@ class TestGetTweets:
         assert result == "Method Not Allowed"
 
 
-class TestCreateTweet:
-    URL = "/api/tweets"
+class TestBatchCreateTweets:
+    URL = "/api/tweets:batch"
     _METHOD = "POST"
 
     async def test_valid(
         self,
         client: AsyncClient,
         users: List[User],
+        session: AsyncSession,
     ) -> None:
         user = choice(users)
-        params = {"api-key": user.token.api_key}
+        media = Media(name="Upload", owner_id=user.id)
+        await MediaManager().add(session, media)
 
-        data = {"tweet_data": "TestTweetData", "tweet_media_ids": []}
+        data = {
+            "tweets": [
+                {"tweet_data": "BatchTweet[0]"},
+                {"tweet_data": "BatchTweet[1]", "tweet_media_ids": [media.id]},
+            ],
+        }
 
         response: Response = await client.request(
             method=self._METHOD,
             url=self.URL,
-            params=params,
+            headers={"api-key": user.token.api_key},
             json=data,
         )
-        response_json = response.json()
 
         assert response.status_code == status.HTTP_201_CREATED
-        assert response_json["result"] is True
 
-    async def test_missing_required_field(
+        tweet_ids = response.json()["tweet_ids"]
+        saved = await session.execute(
+            select(Tweet.id, Tweet.content, Tweet.author_id).where(
+                Tweet.id.in_(tweet_ids),
+            ),
+        )
+        attached = await session.scalars(
+            select(TweetMedia.tweet_id).where(TweetMedia.media_id == media.id),
+        )
+
+        assert sorted(saved.tuples().all()) == [
+            (tweet_ids[0], "BatchTweet[0]", user.id),
+            (tweet_ids[1], "BatchTweet[1]", user.id),
+        ]
+        assert attached.all() == [tweet_ids[1]]
+
+    async def test_rejected_media(
         self,
         client: AsyncClient,
         users: List[User],
+        session: AsyncSession,
     ) -> None:
         user = choice(users)
-        params = {"api-key": user.token.api_key}
+        media = Media(name="Upload", owner_id=user.id)
+        await MediaManager().add(session, media)
 
-        data = {"tweet_media_ids": []}
+        # Same media in two tweets
+        data = {
+            "tweets": [
+                {"tweet_data": "RejectedBatch", "tweet_media_ids": [media.id]},
+                {"tweet_data": "RejectedBatch", "tweet_media_ids": [media.id]},
+            ],
+        }
 
         response: Response = await client.request(
             method=self._METHOD,
             url=self.URL,
-            params=params,
+            headers={"api-key": user.token.api_key},
             json=data,
         )
-        response_json = response.json()
 
-        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
-        assert response_json["result"] is False
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()["error_message"] == f"Media with ID {[media.id]} not found"
 
-    async def test_unauthorised(
-        self,
-        client: AsyncClient,
-    ) -> None:
-        result = await unauthorised(
-            method=self._METHOD,
-            url=self.URL,
-            client=client,
+        saved = await session.scalars(
+            select(Tweet.id).where(Tweet.content == "RejectedBatch"),
         )
-        assert result == "Missing `api-key` header"
 
-    async def test_bad_api_key(
+        assert saved.all() == []
+
+    async def test_too_many_tweets(
         self,
         client: AsyncClient,
+        users: List[User],
     ) -> None:
-        params = {"api-key": -1}
-        result = await unauthorised(
+        user = choice(users)
+        max_size = settings.MAX_TWEETS_BATCH_SIZE
+        data = {"tweets": [{"tweet_data": "BatchTweet"}] * (max_size + 1)}
+
+        response: Response = await client.request(
             method=self._METHOD,
             url=self.URL,
-            client=client,
-            params=params,
+            headers={"api-key": user.token.api_key},
+            json=data,
         )
-        assert result == "Invalid api-key"
 
-    async def test_not_allowed_method(
-        self,
-        client: AsyncClient,
-        users: List[User],
-    ) -> None:
-        user = choice(users)
-        params = {"api-key": user.token.api_key}
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["error_message"] == f"Too many tweets, max `{max_size}`"
 
-        result = await method_not_allowed(
-            not_allowed_method="DELETE",
+    async def test_unauthorised(self, client: AsyncClient) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
             url=self.URL,
             client=client,
-            params=params,
         )
-        assert result == "Method Not Allowed"
+        assert result == "Missing `api-key` header"
 
 
 class TestDeleteTweet:
@@ -239,6 +982,95 @@ class TestDeleteTweet:
 
         assert result == "Wrong owner"
 
+    async def test_archived(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "TWEETS_ARCHIVE_AFTER", 30)
+        tweet = choice(tweets)
+        author = next(user for user in users if user.id == tweet.author_id)
+        other = next(user for user in users if user.id != tweet.author_id)
+
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == tweet.id)
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=31)),
+        )
+        await session.commit()
+
+        assert await TweetController().archive() == 1
+
+        result = await bad_request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=tweet.id),
+            client=client,
+            status_code=status.HTTP_403_FORBIDDEN,
+            headers={"api-key": other.token.api_key},
+        )
+        assert result == "Wrong owner"
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=tweet.id),
+            headers={"api-key": author.token.api_key},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["result"] is True
+
+        media_id = tweet.attachments[0].media_id
+        assert await session.scalar(select(Media).where(Media.id == media_id)) is None
+
+    async def test_archived_media(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "TWEETS_ARCHIVE_AFTER", 30)
+        tweet, other_tweet = tweets[:2]
+        author = next(user for user in users if user.id == tweet.author_id)
+        headers = {"api-key": author.token.api_key}
+        media_id = tweet.attachments[0].media_id
+
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == tweet.id)
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=31)),
+        )
+        await session.commit()
+
+        assert await TweetController().archive() == 1
+
+        # Media listed by an archived tweet cannot be attached again
+        response: Response = await client.request(
+            method="POST",
+            url="/api/tweets",
+            headers=headers,
+            json={"tweet_data": "Reused", "tweet_media_ids": [media_id]},
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        # Legacy rows may attach it to a live tweet as well
+        session.add(TweetMedia(tweet_id=other_tweet.id, media_id=media_id))
+        await session.commit()
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=tweet.id),
+            headers=headers,
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert await session.scalar(select(Media.id).where(Media.id == media_id))
+
     async def test_invalid_tweet_id(
         self,
         client: AsyncClient,
@@ -260,6 +1092,117 @@ class TestDeleteTweet:
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response_json["result"] is False
 
+    async def test_missing_tweet(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+    ) -> None:
+        user = choice(users)
+        tweet_id = max(tweet.id for tweet in tweets) + 1
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=tweet_id),
+            headers={"api-key": user.token.api_key},
+        )
+
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response_json["error_message"] == f"Tweet with id `{tweet_id}` not found"
+
+    async def test_soft_delete(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+    ) -> None:
+        tweet = choice(tweets)
+        author = next(user for user in users if user.id == tweet.author_id)
+        headers = {"api-key": author.token.api_key}
+        like_url = f"/api/tweets/{tweet.id}/likes"
+
+        for user in users:
+            response: Response = await client.request(
+                method="POST",
+                url=like_url,
+                headers={"api-key": user.token.api_key},
+            )
+
+            assert response.status_code == status.HTTP_201_CREATED
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=tweet.id),
+            headers=headers,
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+        # Hidden at once, removed by the purge
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=tweet.id),
+            headers=headers,
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = await client.request(method="GET", url="/api/tweets", headers=headers)
+
+        assert tweet.id not in [item["id"] for item in response.json()["tweets"]]
+
+        response = await client.request(method="POST", url=like_url, headers=headers)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        assert await TweetController().purge(max_batches=len(users)) == 1
+
+        likes = await session.scalars(select(Like.id).where(Like.tweet_id == tweet.id))
+        rows = await session.scalars(select(Tweet.id).where(Tweet.id == tweet.id))
+
+        assert likes.all() == []
+        assert rows.all() == []
+
+    async def test_media_attached_once(
+        self,
+        tweets: List[Tweet],
+        session: AsyncSession,
+    ) -> None:
+        media_id = tweets[0].attachments[0].media_id
+
+        session.add(TweetMedia(tweet_id=tweets[1].id, media_id=media_id))
+
+        with pytest.raises(IntegrityError):
+            await session.commit()
+
+        await session.rollback()
+
+    async def test_retention(
+        self,
+        tweets: List[Tweet],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "TWEETS_RETENTION", 30)
+        tweet = choice(tweets)
+
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == tweet.id)
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=31)),
+        )
+        await session.commit()
+
+        assert await TweetController().purge() == 1
+
+        tweet_ids = [item.id for item in tweets]
+        rows = await session.scalars(select(Tweet.id).where(Tweet.id.in_(tweet_ids)))
+
+        assert sorted(rows.all()) == sorted(set(tweet_ids) - {tweet.id})
+
     async def test_unauthorised(
         self,
         client: AsyncClient,
@@ -435,6 +1378,189 @@ class TestLikeTweet:
         assert another_response_json["result"] is False
         assert another_response_json["error_message"] == "Tweet already liked"
 
+    async def test_write_behind(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+    ) -> None:
+        user = choice(users)
+        headers = {"api-key": user.token.api_key}
+
+        tweet_id = choice(tweets).id
+        url = self.URL.format(tweet_id=tweet_id)
+
+        LikeController.start_task()
+
+        try:
+            response: Response = await client.request(
+                method=self._METHOD,
+                url=url,
+                headers=headers,
+            )
+            another_response: Response = await client.request(
+                method=self._METHOD,
+                url=url,
+                headers=headers,
+            )
+
+            assert response.status_code == status.HTTP_201_CREATED
+            assert another_response.status_code == status.HTTP_400_BAD_REQUEST
+            assert another_response.json()["error_message"] == "Tweet already liked"
+        finally:
+            await LikeController.stop_task()
+
+        likes = await session.scalars(
+            select(Like.user_id).where(Like.tweet_id == tweet_id),
+        )
+
+        assert likes.all() == [user.id]
+        assert LikeController.stats()["pending"] == 0
+
+        likes_count = await LikeController().likes_count(session, [tweet_id])
+
+        assert likes_count == {tweet_id: 1}
+
+    async def test_write_behind_skipped(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+    ) -> None:
+        headers = {"api-key": users[0].token.api_key}
+        url = self.URL.format(tweet_id=tweets[0].id)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=url,
+            headers=headers,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+        skipped = LikeController.stats()["skipped"]
+        LikeController.start_task()
+
+        try:
+            # Buffered like is validated only against pending likes
+            response = await client.request(
+                method=self._METHOD,
+                url=url,
+                headers=headers,
+            )
+
+            assert response.status_code == status.HTTP_201_CREATED
+        finally:
+            await LikeController.stop_task()
+
+        assert LikeController.stats()["skipped"] == skipped + 1
+
+    async def test_write_behind_failed_flush(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        async def apply_batch(*args, **kwargs) -> None:
+            monkeypatch.setattr(settings, "LIKES_BUFFER_SIZE", 1)
+            raise RuntimeError("Database is down")
+
+        monkeypatch.setattr(LikeManager, "apply_batch", apply_batch)
+
+        LikeController.start_task()
+
+        try:
+            for tweet in tweets[:2]:
+                response: Response = await client.request(
+                    method=self._METHOD,
+                    url=self.URL.format(tweet_id=tweet.id),
+                    headers={"api-key": users[0].token.api_key},
+                )
+
+                assert response.status_code == status.HTTP_201_CREATED
+        finally:
+            await LikeController.stop_task()
+
+        assert LikeController.stats()["pending"] == 1
+
+        monkeypatch.undo()
+        await LikeController.flush()
+
+        assert LikeController.stats()["pending"] == 0
+
+    async def test_likes_count(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+    ) -> None:
+        tweet_id = choice(tweets).id
+
+        for user in users:
+            response: Response = await client.request(
+                method=self._METHOD,
+                url=self.URL.format(tweet_id=tweet_id),
+                headers={"api-key": user.token.api_key},
+            )
+
+            assert response.status_code == status.HTTP_201_CREATED
+
+        response = await client.request(
+            method="DELETE",
+            url=self.URL.format(tweet_id=tweet_id),
+            headers={"api-key": users[0].token.api_key},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+        likes_count = await LikeController().likes_count(session, [tweet_id])
+
+        assert likes_count == {tweet_id: len(users) - 1}
+
+    @pytest.mark.parametrize("liked_filter", [False, True])
+    async def test_liked_by_me(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        monkeypatch: pytest.MonkeyPatch,
+        liked_filter: bool,
+    ) -> None:
+        monkeypatch.setattr(settings, "LIKED_FILTER", liked_filter)
+
+        user = choice(users)
+        headers = {"api-key": user.token.api_key}
+
+        liked_tweet, other_tweet = tweets[:2]
+
+        # Builds the filter before the like
+        await client.request(method="GET", url="/api/tweets", headers=headers)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(tweet_id=liked_tweet.id),
+            headers=headers,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+        tweets_response: Response = await client.request(
+            method="GET",
+            url="/api/tweets",
+            headers=headers,
+        )
+        liked_by_me = {
+            tweet["id"]: tweet["liked_by_me"]
+            for tweet in tweets_response.json()["tweets"]
+        }
+
+        assert tweets_response.status_code == status.HTTP_200_OK
+        assert liked_by_me[liked_tweet.id] is True
+        assert liked_by_me[other_tweet.id] is False
+
     async def test_unauthorised(
         self,
         client: AsyncClient,
@@ -1,11 +1,23 @@
+from datetime import datetime, timedelta, timezone
 from random import choice
 from typing import List
+from uuid import uuid4
 
+import pytest
 from fastapi import status
 from httpx import AsyncClient, Response
-
-from controllers import UserController
-from models.schemas import User
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from controllers import (
+    MediaController,
+    SuggestionController,
+    TweetController,
+    UserController,
+)
+from models.managers import LikeManager, MediaManager, UserManager
+from models.schemas import AccountDeletion, ArchivedTweet, Like, Media, Tweet, User
+from settings import settings
 from tests.common import method_not_allowed, unauthorised
 
 user_controller: UserController = UserController()
@@ -84,6 +96,171 @@ class TestMeDetail:
         assert result == "Method Not Allowed"
 
 
+class TestDeleteAccount:
+    URL = "/api/users/me"
+    _METHOD = "DELETE"
+
+    async def test_valid(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "ACCOUNT_DELETION_FOLLOWS", 2)
+
+        user, others = users[0], users[1:]
+        headers = {"api-key": user.token.api_key}
+        own_tweet_id = next(tweet.id for tweet in tweets if tweet.author_id == user.id)
+        liked_ids = [tweet.id for tweet in tweets if tweet.author_id != user.id][:3]
+
+        # Uploaded, never attached
+        await MediaManager().add(session, Media(name="Upload", owner_id=user.id))
+
+        for other in others[:3]:
+            await follow(client, user, other)
+
+        for other in others[3:5]:
+            await follow(client, other, user)
+
+        likes = [(other, own_tweet_id) for other in others]
+        likes += [(user, tweet_id) for tweet_id in liked_ids]
+
+        for liker, tweet_id in likes:
+            response: Response = await client.request(
+                method="POST",
+                url=f"/api/tweets/{tweet_id}/likes",
+                headers={"api-key": liker.token.api_key},
+            )
+
+            assert response.status_code == status.HTTP_201_CREATED
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+        )
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+
+        # Hidden at once
+        response = await client.request(method="GET", url=self.URL, headers=headers)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = await client.request(method="GET", url=f"/api/users/{user.id}")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = await client.request(
+            method="GET",
+            url="/api/tweets",
+            headers={"api-key": others[0].token.api_key},
+        )
+
+        assert own_tweet_id not in [item["id"] for item in response.json()["tweets"]]
+
+        # Removed in small batches, one batch per run
+        runs = 0
+
+        while True:
+            runs += 1
+            await UserController().purge_accounts(max_batches=1)
+
+            deletion = await session.get(AccountDeletion, user.id, populate_existing=True)
+
+            if deletion.finished_at is not None:
+                break
+
+            assert runs < 20
+
+        assert runs > 1
+        assert deletion.stage == UserController.DELETED
+        assert (deletion.tweets, deletion.media, deletion.likes) == (1, 1, 3)
+        assert deletion.follows == 5
+
+        assert await session.get(User, user.id, populate_existing=True) is None
+        likes = await session.scalars(select(Like.id).where(Like.user_id == user.id))
+
+        assert likes.all() == []
+        assert await LikeManager().get_likes_count(session, liked_ids) == {
+            tweet_id: 0 for tweet_id in liked_ids
+        }
+
+        for other in await UserManager().get_users_detail(
+            session,
+            [other.id for other in others],
+        ):
+            assert user.id not in other.following
+            assert user.id not in other.followers
+
+    async def test_archived_tweets(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        tweets: List[Tweet],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "TWEETS_ARCHIVE_AFTER", 30)
+        removed_files: List[str | None] = []
+        monkeypatch.setattr(MediaController, "remove_files", removed_files.extend)
+
+        tweet = next(tweet for tweet in tweets if tweet.attachments)
+        user = next(user for user in users if user.id == tweet.author_id)
+        media_ids = [item.media_id for item in tweet.attachments]
+        result = await session.scalars(select(Media.file).where(Media.id.in_(media_ids)))
+        media_files = result.all()
+
+        await session.execute(
+            update(Tweet)
+            .where(Tweet.id == tweet.id)
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=31)),
+        )
+        await session.commit()
+
+        assert await TweetController().archive() == 1
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": user.token.api_key},
+        )
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+
+        for _ in range(20):
+            await UserController().purge_accounts(max_batches=1)
+
+            deletion = await session.get(AccountDeletion, user.id, populate_existing=True)
+
+            if deletion.finished_at is not None:
+                break
+
+        assert deletion.stage == UserController.DELETED
+        assert deletion.tweets >= 1
+
+        archived = await session.scalars(
+            select(ArchivedTweet.id).where(ArchivedTweet.author_id == user.id),
+        )
+
+        assert archived.all() == []
+
+        media = await session.scalars(select(Media.id).where(Media.id.in_(media_ids)))
+
+        assert media.all() == []
+        assert set(media_files) <= set(removed_files)
+
+    async def test_unauthorised(self, client: AsyncClient) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+
 class TestUserDetail:
     URL = "/api/users/{user_id}"
     _METHOD = "GET"
@@ -211,6 +388,32 @@ class TestFollowUser:
         assert me_response_json["result"] is True
         assert me_response_json["user"]["following"] == expected_following
 
+    async def test_renamed_user(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        current_user = users[0]
+        target_user = users[1]
+
+        await follow(client, current_user, target_user)
+
+        new_name = f"Renamed{target_user.name}"
+        await UserManager().update(session, [{"id": target_user.id, "name": new_name}])
+        UserController.forget_name(target_user.id)
+
+        me_response: Response = await client.request(
+            method="GET",
+            url="/api/users/me",
+            headers={"api-key": current_user.token.api_key},
+        )
+
+        expected_following = [{"id": target_user.id, "name": new_name}]
+
+        assert me_response.status_code == status.HTTP_200_OK
+        assert me_response.json()["user"]["following"] == expected_following
+
     async def test_invalid_user_id(
         self,
         client: AsyncClient,
@@ -557,3 +760,544 @@ class TestUnFollowUser:
             client=client,
         )
         assert result == "Method Not Allowed"
+
+
+async def follow(client: AsyncClient, user: User, target_user: User) -> None:
+    response: Response = await client.request(
+        method="POST",
+        url=f"/api/users/{target_user.id}/follow",
+        headers={"api-key": user.token.api_key},
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+class TestMutuals:
+    URL = "/api/users/{user_id}/mutuals"
+    _METHOD = "GET"
+
+    async def test_valid_complex(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        current_user, target_user, common_user, other_user = users[:4]
+        headers = {"api-key": current_user.token.api_key}
+
+        await follow(client, current_user, common_user)
+        await follow(client, target_user, common_user)
+        await follow(client, target_user, other_user)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(user_id=target_user.id),
+            headers=headers,
+        )
+        response_json = response.json()
+
+        expected_users = [{"id": common_user.id, "name": common_user.name}]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["result"] is True
+        assert response_json["users"] == expected_users
+
+        # Cached result is invalidated by follow
+        await follow(client, current_user, other_user)
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(user_id=target_user.id),
+            headers=headers,
+        )
+        response_json = response.json()
+
+        expected_ids = sorted([common_user.id, other_user.id])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [user["id"] for user in response_json["users"]] == expected_ids
+
+    async def test_myself(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(user_id=user.id),
+            headers={"api-key": user.token.api_key},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response_json["error_message"] == f"It's your user ID `{user.id}`"
+
+    async def test_user_not_found(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+        user_id = max(user.id for user in users) + 1
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(user_id=user_id),
+            headers={"api-key": user.token.api_key},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response_json["result"] is False
+
+    async def test_unauthorised(
+        self,
+        users: List[User],
+        client: AsyncClient,
+    ) -> None:
+        user = choice(users)
+
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL.format(user_id=user.id),
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestFollowersYouKnow:
+    URL = "/api/users/{user_id}/followers-you-know"
+    _METHOD = "GET"
+
+    async def test_valid_complex(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        current_user, target_user, known_user, unknown_user = users[:4]
+        headers = {"api-key": current_user.token.api_key}
+
+        await follow(client, current_user, known_user)
+        await follow(client, known_user, target_user)
+        await follow(client, unknown_user, target_user)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(user_id=target_user.id),
+            headers=headers,
+        )
+        response_json = response.json()
+
+        expected_users = [{"id": known_user.id, "name": known_user.name}]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["result"] is True
+        assert response_json["users"] == expected_users
+
+    async def test_user_not_found(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+        user_id = max(user.id for user in users) + 1
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL.format(user_id=user_id),
+            headers={"api-key": user.token.api_key},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response_json["result"] is False
+
+    async def test_unauthorised(
+        self,
+        users: List[User],
+        client: AsyncClient,
+    ) -> None:
+        user = choice(users)
+
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL.format(user_id=user.id),
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestMeSuggestions:
+    URL = "/api/users/me/suggestions"
+    _METHOD = "GET"
+
+    async def test_valid_complex(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        current_user, friend, other_friend, popular_user, other_user = users[:5]
+
+        await follow(client, current_user, friend)
+        await follow(client, current_user, other_friend)
+        await follow(client, friend, popular_user)
+        await follow(client, other_friend, popular_user)
+        await follow(client, other_friend, other_user)
+        await follow(client, friend, current_user)
+
+        await SuggestionController().refresh(full=True)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": current_user.token.api_key},
+        )
+        response_json = response.json()
+
+        expected_users = [
+            {"id": popular_user.id, "name": popular_user.name},
+            {"id": other_user.id, "name": other_user.name},
+        ]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["result"] is True
+        assert response_json["users"] == expected_users
+
+    async def test_not_computed(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": user.token.api_key},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["users"] == []
+
+    async def test_unauthorised(self, client: AsyncClient) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestMeMentions:
+    URL = "/api/users/me/mentions"
+    _METHOD = "GET"
+
+    async def test_valid(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        current_user, author, other_user = users[:3]
+        name = f"Mentioned_{uuid4().hex}"
+
+        await session.execute(
+            update(User).where(User.id == current_user.id).values(name=name),
+        )
+        await session.commit()
+
+        contents = [
+            f"Hello @{name}",
+            f"Hello @{name} again",
+            f"Hello @{other_user.name}",
+            f"Bye @{name}",
+        ]
+        tweet_ids = []
+
+        for content in contents:
+            response: Response = await client.request(
+                method="POST",
+                url="/api/tweets",
+                headers={"api-key": author.token.api_key},
+                json={"tweet_data": content},
+            )
+            tweet_ids.append(response.json()["tweet_id"])
+
+        monkeypatch.setattr(settings, "TWEETS_ENTITIES_PAGE_SIZE", 2)
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": current_user.token.api_key},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [tweet["id"] for tweet in response_json["tweets"]] == [
+            tweet_ids[3],
+            tweet_ids[1],
+        ]
+        assert response_json["tweets"][0]["author"] == {
+            "id": author.id,
+            "name": author.name,
+        }
+
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": current_user.token.api_key},
+            params={"cursor": response_json["next_cursor"]},
+        )
+        response_json = response.json()
+
+        assert [tweet["id"] for tweet in response_json["tweets"]] == [tweet_ids[0]]
+        assert response_json["next_cursor"] is None
+
+    async def test_unauthorised(
+        self,
+        client: AsyncClient,
+    ) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestSearchUsers:
+    URL = "/api/users/search"
+    _METHOD = "GET"
+
+    async def test_valid(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+    ) -> None:
+        prefix = f"Typeahead{uuid4().hex}"
+        names = [f"{prefix}_b", f"{prefix}_A", f"{prefix}xc", f"{prefix}_deleted"]
+
+        for user, name in zip(users, names):
+            await session.execute(
+                update(User).where(User.id == user.id).values(name=name),
+            )
+
+        await session.execute(
+            update(User).where(User.id == users[3].id).values(deleted_at=func.now()),
+        )
+        await session.commit()
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": users[4].token.api_key},
+            params={"q": f" {prefix.upper()}_"},
+        )
+        response_json = response.json()
+
+        # `_` is not a wildcard, deleted users are skipped
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["users"] == [
+            {"id": users[1].id, "name": names[1]},
+            {"id": users[0].id, "name": names[0]},
+        ]
+
+    async def test_cache(
+        self,
+        client: AsyncClient,
+        users: List[User],
+        session: AsyncSession,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        prefix = f"Cached{uuid4().hex}"
+        headers = {"api-key": users[2].token.api_key}
+        monkeypatch.setattr(settings, "USERS_SEARCH_CACHE_PREFIX", len(prefix))
+
+        await session.execute(
+            update(User).where(User.id == users[0].id).values(name=f"{prefix}_a"),
+        )
+        await session.commit()
+
+        first: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            params={"q": prefix},
+        )
+
+        await session.execute(
+            update(User).where(User.id == users[1].id).values(name=f"{prefix}_b"),
+        )
+        await session.commit()
+
+        hits = UserController._search_cache.hits
+        second: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            params={"q": prefix},
+        )
+
+        # Served from the cache until the entry expires
+        assert second.json() == first.json()
+        assert [user["id"] for user in first.json()["users"]] == [users[0].id]
+        assert UserController._search_cache.hits == hits + 1
+
+        third: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            params={"q": f"{prefix}_"},
+        )
+
+        assert [user["id"] for user in third.json()["users"]] == [
+            users[0].id,
+            users[1].id,
+        ]
+
+    async def test_empty_query(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": choice(users).token.api_key},
+            params={"q": "  "},
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["error_message"] == "Empty query"
+
+    async def test_unauthorised(
+        self,
+        client: AsyncClient,
+    ) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+            params={"q": "user"},
+        )
+        assert result == "Missing `api-key` header"
+
+
+class TestBatchFollowUsers:
+    URL = "/api/users/follow:batch"
+    _METHOD = "POST"
+
+    async def test_valid_complex(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        current_user, *targets = users[:5]
+        headers = {"api-key": current_user.token.api_key}
+
+        await follow(client, current_user, targets[0])
+
+        data = {
+            "follow": [target.id for target in targets[1:]],
+            "unfollow": [targets[0].id],
+        }
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json=data,
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["result"] is True
+        assert response_json["followed"] == sorted(data["follow"])
+        assert response_json["unfollowed"] == data["unfollow"]
+
+        # Check my following
+        me_response: Response = await client.request(
+            method="GET",
+            url="/api/users/me",
+            headers=headers,
+        )
+
+        expected_following = [
+            {"id": target.id, "name": target.name} for target in targets[1:]
+        ]
+
+        following = me_response.json()["user"]["following"]
+        assert sorted(following, key=lambda item: item["id"]) == expected_following
+
+        # Check target user followers
+        user_response: Response = await client.request(
+            method="GET",
+            url=f"/api/users/{targets[1].id}",
+        )
+
+        expected_followers = [{"id": current_user.id, "name": current_user.name}]
+        assert user_response.json()["user"]["followers"] == expected_followers
+
+        # Repeated batch changes nothing
+        response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers=headers,
+            json=data,
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_json["followed"] == []
+        assert response_json["unfollowed"] == []
+
+    async def test_user_not_found(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        current_user, target_user = users[:2]
+        missing_user_id = max(user.id for user in users) + 1
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": current_user.token.api_key},
+            json={"follow": [target_user.id, missing_user_id]},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response_json["error_message"] == (
+            f"Users with ID [{missing_user_id}] not found"
+        )
+
+    async def test_follow_myself(
+        self,
+        client: AsyncClient,
+        users: List[User],
+    ) -> None:
+        user = choice(users)
+
+        response: Response = await client.request(
+            method=self._METHOD,
+            url=self.URL,
+            headers={"api-key": user.token.api_key},
+            json={"follow": [user.id]},
+        )
+        response_json = response.json()
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response_json["error_message"] == f"It's your user ID `{user.id}`"
+
+    async def test_unauthorised(self, client: AsyncClient) -> None:
+        result = await unauthorised(
+            method=self._METHOD,
+            url=self.URL,
+            client=client,
+        )
+        assert result == "Missing `api-key` header"
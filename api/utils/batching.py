@@ -0,0 +1,125 @@
+import asyncio
+from logging import getLogger
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, Generic, List, Set, Tuple, TypeVar
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Batcher(Generic[T, R]):
+    """
+    Collects items submitted within `window` seconds after the first one (or
+    until `max_size` items) and passes them to `func` at once. `func` returns
+    one result per item, in order; each `submit` call gets its own result.
+    If `func` fails, every call of the batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[List[T]], Awaitable[List[R]]],
+        window: float | int,
+        max_size: int,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.window = window
+        self.max_size = max_size
+
+        self.__pending: List[Tuple[T, asyncio.Future[R]]] = []
+        self.__timer: asyncio.TimerHandle | None = None
+        self.__opened_at: float = 0.0
+        self.__tasks: Set[asyncio.Task[None]] = set()
+
+        self.__batches: int = 0
+        self.__items: int = 0
+        self.__max_batch: int = 0
+        self.__last_latency: float | None = None
+        self.__max_latency: float = 0.0
+        self.__max_wait: float = 0.0  # From the first item of a batch to its commit start
+
+    def stats(self) -> Dict[str, int | float | None]:
+        return {
+            "pending": len(self.__pending),
+            "batches": self.__batches,
+            "items": self.__items,
+            "max_batch": self.__max_batch,
+            "last_latency": self.__last_latency,
+            "max_latency": self.__max_latency,
+            "max_wait": self.__max_wait,
+        }
+
+    async def submit(self, item: T) -> R:
+        future: asyncio.Future[R] = asyncio.get_running_loop().create_future()
+
+        if not self.__pending:
+            self.__opened_at = perf_counter()
+
+        self.__pending.append((item, future))
+
+        if len(self.__pending) >= self.max_size:
+            self.__flush()
+        elif self.__timer is None:
+            self.__timer = asyncio.get_running_loop().call_later(
+                self.window,
+                self.__flush,
+            )
+
+        return await future
+
+    def __flush(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+        if not self.__pending:
+            return
+
+        batch, self.__pending = self.__pending, []
+
+        task = asyncio.create_task(
+            self.__run(batch, perf_counter() - self.__opened_at),
+            name=self.name,
+        )
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def __run(self, batch: List[Tuple[T, asyncio.Future[R]]], wait: float) -> None:
+        started_at = perf_counter()
+
+        try:
+            results = await self.func([item for item, _ in batch])
+        except Exception as exc:  # noqa
+            logger.exception("(%s) Batch of %s items failed", self.name, len(batch))
+
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+            return
+
+        # Callers cancelled while waiting are skipped, their items are still saved
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+        latency = perf_counter() - started_at
+
+        self.__batches += 1
+        self.__items += len(batch)
+        self.__max_batch = max(self.__max_batch, len(batch))
+        self.__last_latency = latency
+        self.__max_latency = max(self.__max_latency, latency)
+        self.__max_wait = max(self.__max_wait, wait)
+
+        logger.debug("(%s) Batch: %s items, %.4f s", self.name, len(batch), latency)
+
+    async def stop(self) -> None:
+        """Pass pending items to `func` at once and wait for running batches."""
+        self.__flush()
+
+        if self.__tasks:
+            await asyncio.wait(self.__tasks)
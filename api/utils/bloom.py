@@ -0,0 +1,62 @@
+from hashlib import blake2b
+from math import ceil, log
+from typing import Hashable, Iterable, Iterator
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over a bytearray.
+
+    `capacity` and `error_rate` size the bit array and the number of hash
+    functions. Membership checks may return false positives but never false
+    negatives for added items.
+    """
+
+    def __init__(self, capacity: int = 1024, error_rate: float = 0.01) -> None:
+        capacity = max(capacity, 1)
+
+        self.size: int = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        self.hashes: int = max(round(self.size / capacity * log(2)), 1)
+
+        self._bits: bytearray = bytearray(ceil(self.size / 8))
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[Hashable],
+        error_rate: float = 0.01,
+        headroom: float = 2.0,
+    ) -> "BloomFilter":
+        """Filter sized for `items` with room for `headroom` times more."""
+        items = list(items)
+
+        bloom = cls(ceil(max(len(items), 512) * headroom), error_rate)
+        bloom.update(items)
+
+        return bloom
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def __positions(self, item: Hashable) -> Iterator[int]:
+        digest = blake2b(repr(item).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: Hashable) -> None:
+        for position in self.__positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, items: Iterable[Hashable]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self.__positions(item)
+        )
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable, Iterable, Set, Tuple
+
+
+class LRUCache:
+    """In-process LRU cache with optional time to live (seconds)."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and monotonic() - stored_at > self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+
+        if item is None or self._expired(item[0]):
+            if item is not None:
+                self.pop(key)
+
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (monotonic(), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            oldest, _ = self._data.popitem(last=False)
+            self._evicted(oldest)
+
+    def pop(self, key: Hashable) -> Any:
+        item = self._data.pop(key, None)
+
+        if item is None:
+            return None
+
+        self._evicted(key)
+        return item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def _evicted(self, key: Hashable) -> None:
+        """Hook for subclasses, called when `key` leaves the cache."""
+
+
+class TaggedLRUCache(LRUCache):
+    """LRU cache where entries can be invalidated by any of their tags."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float | None = None) -> None:
+        super().__init__(maxsize, ttl)
+        self._keys_by_tag: Dict[Hashable, Set[Hashable]] = {}
+        self._tags_by_key: Dict[Hashable, Tuple[Hashable, ...]] = {}
+
+    def set_tagged(self, key: Hashable, value: Any, tags: Iterable[Hashable]) -> None:
+        tags = tuple(tags)
+
+        self._tags_by_key[key] = tags
+
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        self.set(key, value)
+
+    def invalidate(self, *tags: Hashable) -> None:
+        for tag in tags:
+            for key in tuple(self._keys_by_tag.get(tag, ())):
+                self.pop(key)
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys_by_tag.clear()
+        self._tags_by_key.clear()
+
+    def _evicted(self, key: Hashable) -> None:
+        for tag in self._tags_by_key.pop(key, ()):
+            keys = self._keys_by_tag.get(tag)
+
+            if keys is None:
+                continue
+
+            keys.discard(key)
+
+            if not keys:
+                del self._keys_by_tag[tag]
@@ -0,0 +1,51 @@
+from logging import getLogger
+from random import randrange
+from typing import Hashable
+
+from utils.cache import LRUCache
+
+logger = getLogger(__name__)
+
+
+class CounterShards:
+    """
+    Number of shard rows used for each hot counter.
+
+    Counters start with a single shard. When a write is slower than
+    `contention_latency` seconds, the counter is treated as contended and its
+    shard count is doubled, up to `max_shards`. Counters that cool down are
+    dropped from the LRU and start with one shard again.
+    """
+
+    def __init__(
+        self,
+        max_shards: int = 16,
+        contention_latency: float = 0.05,
+        maxsize: int = 10_000,
+    ) -> None:
+        self.max_shards = max_shards
+        self.contention_latency = contention_latency
+
+        self._shards: LRUCache = LRUCache(maxsize)
+
+    def shards(self, key: Hashable) -> int:
+        return self._shards.get(key, 1)
+
+    def shard(self, key: Hashable) -> int:
+        return randrange(self.shards(key))
+
+    def report(self, key: Hashable, latency: float) -> bool:
+        """Record write latency for `key`, returns True if shard count was raised."""
+        if latency < self.contention_latency:
+            return False
+
+        shards = self.shards(key)
+
+        if shards >= self.max_shards:
+            return False
+
+        shards = min(shards * 2, self.max_shards)
+        self._shards.set(key, shards)
+
+        logger.info("Counter %s contended (%.4f s), shards: %s", key, latency, shards)
+        return True
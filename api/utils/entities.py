@@ -0,0 +1,37 @@
+import re
+from typing import List
+
+from settings import settings
+
+# Not preceded by a word character, so `a#b` and e-mails are not matched
+TAG_RE = re.compile(r"(?<!\w)#(\w+)")
+MENTION_RE = re.compile(r"(?<![\w@])@(\w+)")
+
+MAX_TAG_LENGTH = 100  # Length of tweet_tags.tag
+MAX_NAME_LENGTH = 200  # Length of users.name
+
+
+def extract_tags(text: str) -> List[str]:
+    """First `TWEETS_MAX_TAGS` distinct hashtags of `text`, lowercase, without `#`."""
+    tags = dict.fromkeys(
+        tag.lower() for tag in TAG_RE.findall(text) if len(tag) <= MAX_TAG_LENGTH
+    )
+    return list(tags)[: settings.TWEETS_MAX_TAGS]
+
+
+def extract_mentions(text: str) -> List[str]:
+    """First `TWEETS_MAX_MENTIONS` distinct user names in `text`, without `@`."""
+    names = dict.fromkeys(
+        name for name in MENTION_RE.findall(text) if len(name) <= MAX_NAME_LENGTH
+    )
+    return list(names)[: settings.TWEETS_MAX_MENTIONS]
+
+
+def normalize_tag(tag: str) -> str | None:
+    """Tag as stored, from `tag` with or without `#`; None if it is not a tag."""
+    match = re.fullmatch(r"#?(\w+)", tag)
+
+    if match is None or len(match[1]) > MAX_TAG_LENGTH:
+        return None
+
+    return match[1].lower()
@@ -0,0 +1,259 @@
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from logging import getLogger
+from operator import itemgetter
+from time import perf_counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+from settings import settings
+
+logger = getLogger(__name__)
+
+Edge = Tuple[int, int]
+
+
+class CSRGraph:
+    """
+    Directed adjacency in CSR layout.
+
+    `ids` holds sorted node ids, `offsets[i]:offsets[i + 1]` is the slice of
+    `neighbors` with sorted neighbours of `ids[i]`. Incremental changes are kept in
+    small overlay sets and merged into the arrays by `compact`.
+    """
+
+    TYPECODE: str = "q"  # int64
+
+    def __init__(self) -> None:
+        self.ids: array = array(self.TYPECODE)
+        self.offsets: array = array(self.TYPECODE, [0])
+        self.neighbors: array = array(self.TYPECODE)
+
+        self._added: Dict[int, Set[int]] = {}
+        self._removed: Dict[int, Set[int]] = {}
+        self._delta_size: int = 0
+
+    @property
+    def delta_size(self) -> int:
+        return self._delta_size
+
+    @property
+    def edges_count(self) -> int:
+        added = sum(len(items) for items in self._added.values())
+        removed = sum(len(items) for items in self._removed.values())
+        return len(self.neighbors) + added - removed
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.ids, self.offsets, self.neighbors)
+        size = sum(item.buffer_info()[1] * item.itemsize for item in arrays)
+
+        for overlay in (self._added, self._removed):
+            size += sys.getsizeof(overlay)
+            size += sum(sys.getsizeof(items) for items in overlay.values())
+
+        return size
+
+    def build(self, edges: Iterable[Edge]) -> None:
+        ids = array(self.TYPECODE)
+        offsets = array(self.TYPECODE, [0])
+        neighbors = array(self.TYPECODE)
+
+        for node, group in groupby(sorted(set(edges)), key=itemgetter(0)):
+            ids.append(node)
+            neighbors.extend(target for _, target in group)
+            offsets.append(len(neighbors))
+
+        self.ids, self.offsets, self.neighbors = ids, offsets, neighbors
+        self._added.clear()
+        self._removed.clear()
+        self._delta_size = 0
+
+    def __base_row(self, node: int) -> array:
+        index = bisect_left(self.ids, node)
+
+        if index == len(self.ids) or self.ids[index] != node:
+            return array(self.TYPECODE)
+
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.neighbors[start:end]
+
+    def __contains_base(self, node: int, target: int) -> bool:
+        row = self.__base_row(node)
+        index = bisect_left(row, target)
+        return index < len(row) and row[index] == target
+
+    def row(self, node: int) -> array:
+        row = self.__base_row(node)
+
+        added = self._added.get(node)
+        removed = self._removed.get(node)
+
+        if not added and not removed:
+            return row
+
+        merged = set(row)
+
+        if added:
+            merged |= added
+
+        if removed:
+            merged -= removed
+
+        return array(self.TYPECODE, sorted(merged))
+
+    def nodes(self) -> List[int]:
+        """Nodes with at least one outgoing edge."""
+        nodes = set(self.ids) | set(self._added)
+        return sorted(node for node in nodes if self.row(node))
+
+    def add(self, node: int, target: int) -> None:
+        removed = self._removed.get(node)
+
+        if removed and target in removed:
+            removed.discard(target)
+            self._delta_size -= 1
+            return
+
+        if self.__contains_base(node, target):
+            return
+
+        added = self._added.setdefault(node, set())
+
+        if target not in added:
+            added.add(target)
+            self._delta_size += 1
+
+    def remove(self, node: int, target: int) -> None:
+        added = self._added.get(node)
+
+        if added and target in added:
+            added.discard(target)
+            self._delta_size -= 1
+            return
+
+        if not self.__contains_base(node, target):
+            return
+
+        removed = self._removed.setdefault(node, set())
+
+        if target not in removed:
+            removed.add(target)
+            self._delta_size += 1
+
+    def compact(self) -> None:
+        if not self._delta_size:
+            return
+
+        edges = [(node, target) for node in self.nodes() for target in self.row(node)]
+        self.build(edges)
+
+
+class FollowGraphIndex:
+    """
+    Optional in-process index of follow edges.
+
+    Both directions (following and followers) are kept as CSR graphs, so the set
+    of accounts on either side of a user is a sorted int64 array slice.
+    """
+
+    def __init__(self, compact_threshold: int = 10_000) -> None:
+        self.compact_threshold = compact_threshold
+
+        self._following: CSRGraph = CSRGraph()
+        self._followers: CSRGraph = CSRGraph()
+
+        self._loaded: bool = False
+        self._rebuild_time: float | None = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def rebuild_time(self) -> float | None:
+        """Seconds spent on the last full (re)build."""
+        return self._rebuild_time
+
+    @property
+    def memory_footprint(self) -> int:
+        """Approximate size of the index in bytes."""
+        return self._following.nbytes + self._followers.nbytes
+
+    @property
+    def edges_count(self) -> int:
+        return self._following.edges_count
+
+    def stats(self) -> Dict[str, int | float | bool | None]:
+        return {
+            "loaded": self._loaded,
+            "edges": self.edges_count,
+            "memory_footprint": self.memory_footprint,
+            "rebuild_time": self._rebuild_time,
+        }
+
+    def load(self, edges: Iterable[Edge]) -> None:
+        """Build index from `(user_id, target_user_id)` follow edges."""
+        start = perf_counter()
+
+        edges = list(edges)
+
+        self._following.build(edges)
+        self._followers.build((target, user) for user, target in edges)
+
+        self._rebuild_time = perf_counter() - start
+        self._loaded = True
+
+        logger.info(
+            "Follow graph loaded: %s edges, %s bytes, %.4f s",
+            self.edges_count,
+            self.memory_footprint,
+            self._rebuild_time,
+        )
+
+    def clear(self) -> None:
+        self._following = CSRGraph()
+        self._followers = CSRGraph()
+        self._loaded = False
+
+    def follow(self, user_id: int, target_user_id: int) -> None:
+        self._following.add(user_id, target_user_id)
+        self._followers.add(target_user_id, user_id)
+        self.__maybe_compact()
+
+    def unfollow(self, user_id: int, target_user_id: int) -> None:
+        self._following.remove(user_id, target_user_id)
+        self._followers.remove(target_user_id, user_id)
+        self.__maybe_compact()
+
+    def following(self, user_id: int) -> array:
+        return self._following.row(user_id)
+
+    def followers(self, user_id: int) -> array:
+        return self._followers.row(user_id)
+
+    def users(self) -> List[int]:
+        """Users following at least one account."""
+        return self._following.nodes()
+
+    @staticmethod
+    def intersect(first: array, second: array) -> List[int]:
+        if len(first) > len(second):
+            first, second = second, first
+
+        return sorted(set(first).intersection(second))
+
+    def __maybe_compact(self) -> None:
+        for graph in (self._following, self._followers):
+            if graph.delta_size >= self.compact_threshold:
+                start = perf_counter()
+                graph.compact()
+
+                logger.debug(
+                    "Follow graph compacted in %.4f s",
+                    perf_counter() - start,
+                )
+
+
+follow_graph = FollowGraphIndex(settings.FOLLOW_GRAPH_COMPACT_THRESHOLD)
@@ -10,7 +10,16 @@ from fastapi.openapi.utils import get_openapi
 from starlette.routing import BaseRoute
 from starlette.staticfiles import StaticFiles
 
-from controllers import MediaController
+from controllers import (
+    IdempotencyController,
+    LikeController,
+    MediaController,
+    PartitionController,
+    SnowflakeController,
+    SuggestionController,
+    TweetController,
+    UserController,
+)
 from models.managers import db_session_manager
 from settings import settings
 
@@ -37,6 +46,38 @@ async def lifespan(application: FastAPI) -> AsyncIterator[None]:
 
     await db_session_manager.inspect()
 
+    # Before anything generates ids
+    await SnowflakeController.start_task()
+
+    if settings.PARTITIONS_MAINTENANCE:
+        # Before the first request, tables made by FORCE_INIT have no partitions
+        await PartitionController().maintain()
+        PartitionController.start_task()
+
+    if settings.FOLLOW_GRAPH_INDEX:
+        await UserController.load_follow_graph()
+
+    if settings.SUGGESTIONS:
+        SuggestionController.start_task()
+
+    if settings.LIKES_WRITE_BEHIND:
+        LikeController.start_task()
+
+    if settings.TWEETS_PURGE:
+        TweetController.start_purge_task()
+
+    if settings.TWEETS_GROUP_COMMIT:
+        TweetController.start_group_commit()
+
+    if settings.TWEETS_ARCHIVE:
+        TweetController.start_archive_task()
+
+    if settings.ACCOUNT_DELETION:
+        UserController.start_deletion_task()
+
+    if settings.IDEMPOTENCY_KEYS_PURGE:
+        IdempotencyController.start_task()
+
     if settings.DEBUG:
         application.mount(
             settings.STATIC_URL,
@@ -59,5 +100,14 @@ async def lifespan(application: FastAPI) -> AsyncIterator[None]:
 
     yield
 
+    await PartitionController.stop_task()
+    await IdempotencyController.stop_task()
+    await UserController.stop_deletion_task()
+    await TweetController.stop_purge_task()
+    await TweetController.stop_archive_task()
+    await TweetController.stop_group_commit()
+    await LikeController.stop_task()
+    await SuggestionController.stop_task()
     MediaController.stop_threads()
+    await SnowflakeController.stop_task()
     await db_session_manager.close()
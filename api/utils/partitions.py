@@ -0,0 +1,79 @@
+import re
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple
+
+from settings import settings
+from utils.snowflake import SnowflakeGenerator, snowflake
+
+# Partitioned table: partition key. Likes are split by tweet id with the same
+# bounds as tweets, so likes of a tweet are in the partition paired with its one.
+PARTITIONED_TABLES: Dict[str, str] = {"tweets": "id", "likes": "tweet_id"}
+
+PARTITION_NAME_RE = re.compile(
+    rf"({'|'.join(PARTITIONED_TABLES)})_(legacy|p\d{{8}})",
+)
+BOUND_RE = re.compile(r"FROM \((?P<lower>[^)]+)\) TO \((?P<upper>[^)]+)\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: int | None  # None for MINVALUE
+    upper: int | None  # None for MAXVALUE
+
+
+def parse_bound(value: str) -> int | None:
+    value = value.strip().strip("'")
+
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+
+    return int(value)
+
+
+def parse_partition(name: str, bound_expr: str) -> Partition:
+    """Partition from `pg_get_expr(relpartbound, oid)` of a range partition."""
+    match = BOUND_RE.search(bound_expr)
+
+    if match is None:
+        raise ValueError(f"Not a range partition bound: {bound_expr}")
+
+    return Partition(name, parse_bound(match["lower"]), parse_bound(match["upper"]))
+
+
+def is_partition_name(name: str) -> bool:
+    return PARTITION_NAME_RE.fullmatch(name) is not None
+
+
+class PartitionScheme:
+    """
+    Id ranges of partitions: each covers `days` days of ids of `generator`,
+    counted from its epoch, and is named by the first day it covers. Older
+    (sequence) ids below the first range are in the `legacy` partition.
+    """
+
+    def __init__(self, generator: SnowflakeGenerator, days: int) -> None:
+        if days < 1:
+            raise ValueError("Partition must cover at least one day")
+
+        self.generator = generator
+        self.period = days * 86_400_000  # Milliseconds
+
+    def next_bound(self, snowflake_id: int) -> int:
+        """First partition bound greater than `snowflake_id`."""
+        elapsed = self.generator.timestamp(snowflake_id) - self.generator.epoch
+        periods = max(elapsed, 0) // self.period + 1
+
+        return self.generator.min_id(self.generator.epoch + periods * self.period)
+
+    def partition_name(self, table_name: str, lower: int | None) -> str:
+        if lower is None:
+            return f"{table_name}_legacy"
+
+        day = datetime.fromtimestamp(
+            self.generator.timestamp(lower) / 1000,
+            timezone.utc,
+        )
+        return f"{table_name}_p{day:%Y%m%d}"
+
+
+partition_scheme = PartitionScheme(snowflake, settings.TWEETS_PARTITION_DAYS)
@@ -0,0 +1,120 @@
+import time
+from threading import Lock
+from typing import List
+
+from settings import settings
+
+
+class ClockSkewError(RuntimeError):
+    pass
+
+
+class WorkerIdError(RuntimeError):
+    pass
+
+
+class SnowflakeGenerator:
+    """
+    K-sortable 64-bit ids: milliseconds since `epoch`, then `worker_id`, then a
+    per-millisecond sequence. Ids of one worker grow monotonically; ids of
+    different workers are ordered by time up to a millisecond.
+
+    Each process generating ids needs its own worker id, set with `assign`
+    (optionally only for `valid_for` seconds, for a leased id); without it ids
+    are not generated.
+
+    The generator never waits, since it is called in the event loop: when the
+    sequence of a millisecond runs out, ids continue in the next millisecond,
+    ahead of the clock until it catches up. If the clock goes back by one
+    millisecond, ids continue from the last one; a larger step back raises
+    `ClockSkewError`.
+    """
+
+    def __init__(
+        self,
+        epoch: int,
+        worker_id: int | None,
+        worker_bits: int = 10,
+        sequence_bits: int = 12,
+    ) -> None:
+        self.epoch = epoch
+        self.worker_bits = worker_bits
+        self.sequence_bits = sequence_bits
+        self.worker_id: int | None = None
+
+        self.__timestamp_shift = worker_bits + sequence_bits
+        self.__sequence_mask = (1 << sequence_bits) - 1
+        self.__last_clock = -1
+        self.__last_timestamp = -1
+        self.__sequence = 0
+        self.__valid_until: float | None = None
+        self.__lock = Lock()
+
+        self.assign(worker_id)
+
+    def __now(self) -> int:
+        return time.time_ns() // 1_000_000 - self.epoch
+
+    def assign(self, worker_id: int | None, valid_for: float | None = None) -> None:
+        """Use `worker_id` (for `valid_for` seconds if set), None stops generating."""
+        if worker_id is not None and not 0 <= worker_id < 1 << self.worker_bits:
+            raise ValueError(f"Worker id must be in [0, {1 << self.worker_bits})")
+
+        with self.__lock:
+            self.worker_id = worker_id
+            self.__valid_until = None
+
+            if valid_for is not None:
+                self.__valid_until = time.monotonic() + valid_for
+
+    def next_id(self) -> int:
+        with self.__lock:
+            if self.worker_id is None:
+                raise WorkerIdError("Worker id is not assigned")
+
+            if self.__valid_until is not None and time.monotonic() > self.__valid_until:
+                raise WorkerIdError(f"Lease of worker id {self.worker_id} expired")
+
+            clock = self.__now()
+            skew = self.__last_clock - clock
+
+            if skew > 1:
+                raise ClockSkewError(f"Clock moved backwards by {skew} ms")
+
+            self.__last_clock = max(self.__last_clock, clock)
+            timestamp = max(clock, self.__last_timestamp)
+
+            if timestamp == self.__last_timestamp:
+                self.__sequence = (self.__sequence + 1) & self.__sequence_mask
+
+                if self.__sequence == 0:
+                    timestamp += 1
+            else:
+                self.__sequence = 0
+
+            self.__last_timestamp = timestamp
+
+            return (
+                timestamp << self.__timestamp_shift
+                | self.worker_id << self.sequence_bits
+                | self.__sequence
+            )
+
+    def next_ids(self, count: int) -> List[int]:
+        return [self.next_id() for _ in range(count)]
+
+    def timestamp(self, snowflake_id: int) -> int:
+        """Unix time of `snowflake_id` in milliseconds."""
+        return (snowflake_id >> self.__timestamp_shift) + self.epoch
+
+    def min_id(self, timestamp: int) -> int:
+        """Smallest id generated at or after unix time `timestamp` (milliseconds)."""
+        return max(timestamp - self.epoch, 0) << self.__timestamp_shift
+
+
+snowflake = SnowflakeGenerator(
+    settings.SNOWFLAKE_EPOCH,
+    settings.SNOWFLAKE_WORKER_ID,
+    settings.SNOWFLAKE_WORKER_BITS,
+    settings.SNOWFLAKE_SEQUENCE_BITS,
+)
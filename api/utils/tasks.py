@@ -0,0 +1,74 @@
+import asyncio
+from logging import getLogger
+from typing import Awaitable, Callable
+
+logger = getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs `func` in the event loop every `interval` seconds until stopped.
+    `wake` starts the next iteration early.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[None]],
+        interval: float | int,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.interval = interval
+
+        self.__stop_event: asyncio.Event | None = None
+        self.__wake_event: asyncio.Event | None = None
+        self.__task: asyncio.Task | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.__task is not None and not self.__task.done()
+
+    async def __run(self) -> None:
+        logger.debug("(%s) Start cycle", self.name)
+
+        while not self.__stop_event.is_set():
+            try:
+                await self.func()
+            except Exception:  # noqa
+                logger.exception("(%s) Iteration failed", self.name)
+
+            try:
+                await asyncio.wait_for(self.__wake_event.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self.__wake_event.clear()
+
+        logger.debug("(%s) Stop cycle", self.name)
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+
+        self.__stop_event = asyncio.Event()
+        self.__wake_event = asyncio.Event()
+        self.__task = asyncio.create_task(self.__run(), name=self.name)
+
+    def wake(self) -> None:
+        if self.is_running:
+            self.__wake_event.set()
+
+    async def stop(self, timeout: float | int = 10) -> None:
+        if not self.is_running:
+            return
+
+        self.__stop_event.set()
+        self.__wake_event.set()
+
+        try:
+            await asyncio.wait_for(self.__task, timeout)
+        except asyncio.TimeoutError:
+            self.__task.cancel()
+
+        logger.debug("(%s) Stopped", self.name)